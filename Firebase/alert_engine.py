@@ -0,0 +1,113 @@
+"""
+Per-vehicle low-RUL alert state machine.
+
+Each vehicle has at most one open alert, stored under a single key in
+/alerts and overwritten in place whenever its state changes, so alert
+writes scale with state changes rather than with messages:
+
+  open        RUL drops below enter_rul (critical if also below
+              critical_enter_rul)
+  escalate    an open warning drops below critical_enter_rul
+  deescalate  an open critical alert recovers to critical_exit_rul or above
+  close       RUL recovers to exit_rul or above
+  reopen      RUL drops below enter_rul again within cooldown_s of the
+              close; the previous alert record is reopened instead of a new
+              one being created
+
+The exit thresholds sit above the enter thresholds (hysteresis), so a
+prediction hovering around a threshold does not flap between states.
+Predictions that cause no transition write nothing.
+"""
+
+import time
+from datetime import datetime
+
+from firebase_writer import generate_push_id
+
+class VehicleAlert:
+    """The current (or most recently closed) alert of one vehicle"""
+
+    def __init__(self, key, record):
+        self.key = key
+        self.record = record
+        self.closed_at = None
+
+class AlertEngine:
+    """Turns a stream of per-vehicle RUL predictions into alert transitions"""
+
+    def __init__(self, enter_rul=100, exit_rul=110, critical_enter_rul=5,
+                 critical_exit_rul=7, cooldown_s=600):
+        if exit_rul < enter_rul or critical_exit_rul < critical_enter_rul:
+            raise ValueError("Alert exit thresholds must not be below their enter thresholds")
+        self.enter_rul = enter_rul
+        self.exit_rul = exit_rul
+        self.critical_enter_rul = critical_enter_rul
+        self.critical_exit_rul = critical_exit_rul
+        self.cooldown_s = cooldown_s
+        # vehicle id -> VehicleAlert
+        self.alerts = {}
+
+    def is_open(self, vehicle_id):
+        alert = self.alerts.get(vehicle_id)
+        return alert is not None and alert.closed_at is None
+
+    def observe(self, vehicle_id, rul, soh=None, now=None):
+        """Apply one prediction; returns (transition, key, alert record) or None
+
+        now is in epoch seconds (default: the current time); replays pass
+        the sample's own timestamp so cooldowns follow the recorded data.
+        """
+        if rul is None:
+            return None
+        if now is None:
+            now = time.time()
+        alert = self.alerts.get(vehicle_id)
+
+        if alert is None or alert.closed_at is not None:
+            if rul >= self.enter_rul:
+                return None
+            severity = 'critical' if rul < self.critical_enter_rul else 'warning'
+            if alert is not None and now - alert.closed_at < self.cooldown_s:
+                transition = 'reopen'
+                alert.closed_at = None
+                alert.record['reopened'] += 1
+                alert.record['closed_at'] = None
+            else:
+                transition = 'open'
+                alert = self.alerts[vehicle_id] = VehicleAlert(generate_push_id(), {
+                    'type': 'low_rul',
+                    'vehicle_id': vehicle_id,
+                    'opened_at': _iso(now),
+                    'closed_at': None,
+                    'reopened': 0
+                })
+        else:
+            severity = alert.record['severity']
+            if rul >= self.exit_rul:
+                transition = 'close'
+                alert.closed_at = now
+                alert.record['closed_at'] = _iso(now)
+            elif severity == 'warning' and rul < self.critical_enter_rul:
+                transition = 'escalate'
+                severity = 'critical'
+            elif severity == 'critical' and rul >= self.critical_exit_rul:
+                transition = 'deescalate'
+                severity = 'warning'
+            else:
+                return None
+
+        record = alert.record
+        record['status'] = 'closed' if transition == 'close' else 'open'
+        record['severity'] = severity
+        record['timestamp'] = _iso(now)
+        record['rul'] = float(rul)
+        record['soh'] = soh
+        if transition == 'close':
+            record['message'] = f'RUL recovered: {rul:.2f} cycles'
+        else:
+            record['message'] = f'Low RUL detected: {rul:.2f} cycles'
+        # The caller may queue the record; later transitions must not change it
+        return transition, alert.key, dict(record)
+
+def _iso(epoch_seconds):
+    return datetime.fromtimestamp(epoch_seconds).isoformat()
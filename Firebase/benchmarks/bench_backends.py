@@ -0,0 +1,98 @@
+"""
+Inference backend comparison on CPU: load time, batch-1 latency (one
+vehicle's incremental window) and batch-256 throughput (a full
+micro-batch) for each backend in inference.py, plus Keras model.predict
+as the reference the subscriber used before.
+
+Backends whose model file or runtime is missing are skipped; create the
+.tflite/.onnx files first with export_model.py.
+
+    python benchmarks/bench_backends.py
+    python benchmarks/bench_backends.py --backends keras tflite --threads 1
+"""
+
+import argparse
+import os
+import pickle
+import time
+import warnings
+warnings.filterwarnings('ignore')
+
+import numpy as np
+
+from payloads import FIREBASE_DIR, PREPROCESSING_PATH
+from inference import BACKENDS, load_backend
+
+MODEL_FILES = {
+    'keras': 'best_rul_model.keras',
+    'tflite': 'best_rul_model.tflite',
+    'onnx': 'best_rul_model.onnx',
+    'numpy': 'best_rul_model.npz'
+}
+
+def time_calls(fn, calls):
+    """Per-call durations in seconds"""
+    durations = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return np.array(durations)
+
+def report(name, load_seconds, single, batch, batch_size):
+    load = f"{load_seconds:8.2f} s" if load_seconds is not None else f"{'-':>10s}"
+    print(f"  {name:14s} {load} {np.median(single) * 1000:10.3f} "
+          f"{np.percentile(single, 99) * 1000:10.3f} ms {batch_size / np.median(batch):14,.0f}")
+
+def bench_backend(name, args, single_window, batch_windows):
+    path = os.path.join(FIREBASE_DIR, MODEL_FILES[name])
+    if not os.path.exists(path):
+        print(f"  {name:14s} ⚠ {MODEL_FILES[name]} not found (run export_model.py)")
+        return None
+    try:
+        start = time.perf_counter()
+        backend = load_backend(name, path, args.threads)
+        load_seconds = time.perf_counter() - start
+    except ImportError as e:
+        print(f"  {name:14s} ⚠ runtime not installed: {e}")
+        return None
+    for _ in range(3):
+        backend.predict(single_window)
+        backend.predict(batch_windows)
+    single = time_calls(lambda: backend.predict(single_window), args.single_calls)
+    batch = time_calls(lambda: backend.predict(batch_windows), args.batch_calls)
+    report(name, load_seconds, single, batch, len(batch_windows))
+    return backend
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare the RUL inference backends")
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument('--batch', type=int, default=256, help="windows per throughput call")
+    parser.add_argument('--single-calls', type=int, default=200, help="batch-1 calls timed")
+    parser.add_argument('--batch-calls', type=int, default=20, help="batch calls timed")
+    parser.add_argument('--threads', type=int, default=None, help="backend CPU threads")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    with open(PREPROCESSING_PATH, 'rb') as f:
+        preprocessing_data = pickle.load(f)
+    shape = (args.batch, preprocessing_data['seq_len'], len(preprocessing_data['feature_names']))
+    # Timings do not depend on the values; scaled features are roughly unit-sized
+    batch_windows = np.random.default_rng(0).standard_normal(shape).astype(np.float32)
+    single_window = batch_windows[:1].copy()
+
+    print(f"\n📊 Inference backends (batch-1 latency, batch-{args.batch} throughput)")
+    print(f"  {'backend':14s} {'load':>10s} {'p50':>10s} {'p99':>13s} {'windows/s':>14s}")
+    for name in args.backends:
+        backend = bench_backend(name, args, single_window, batch_windows)
+        if name == 'keras' and backend is not None:
+            # What the subscriber paid per micro-batch before the backends
+            keras_model = backend.keras_model
+            predict = lambda windows: keras_model.predict(windows, batch_size=len(windows), verbose=0)
+            single = time_calls(lambda: predict(single_window), max(1, args.single_calls // 10))
+            batch = time_calls(lambda: predict(batch_windows), args.batch_calls)
+            report('keras.predict', None, single, batch, len(batch_windows))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Micro-benchmark: payload size and decode + feature cost per row for each
+sensor_data encoding.
+
+Rows from Dataset/Streaming.csv are sent as one JSON object per message
+(feature rows built one by one) and as multi-row messages (packed records,
+JSON and MessagePack batch envelopes) decoded into a SampleBatch and
+projected as one 2-D array.
+
+    python benchmarks/bench_encodings.py [n_payloads] [rows_per_message]
+"""
+
+import json
+import sys
+import timeit
+
+import numpy as np
+
+from payloads import load_payloads, load_preprocessing
+import codec
+from codec import decode_binary, batch_from_envelope, encode_packed, build_envelope
+from features import FeatureProjector
+from json_stream import loads
+
+def per_row_us(fn, n_rows, repeat=5):
+    """Best-of-`repeat` cost of fn() in microseconds per row"""
+    best = min(timeit.repeat(fn, number=1, repeat=repeat))
+    return best / n_rows * 1e6
+
+def main():
+    n_payloads = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rows_per_message = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    payloads = load_payloads(n_payloads)
+    projector = FeatureProjector(load_preprocessing()['feature_names'])
+    row = np.empty(projector.n_features, dtype=np.float32)
+    groups = [payloads[i:i + rows_per_message] for i in range(0, len(payloads), rows_per_message)]
+
+    single = [json.dumps(payload).encode('utf-8') for payload in payloads]
+    packed = [encode_packed(group, 'ev-1') for group in groups]
+    json_envelopes = [json.dumps(build_envelope(group, 'ev-1')).encode('utf-8') for group in groups]
+    msgpack_envelopes = ([codec.msgpack.packb(build_envelope(group, 'ev-1')) for group in groups]
+                         if codec.msgpack is not None else None)
+
+    def run_single():
+        for message in single:
+            projector.project(loads(message), row)
+
+    def run_batches(messages, decode):
+        def run():
+            for message in messages:
+                batch = decode(message)
+                projector.project_batch(batch.columns, batch.values, batch.timestamps)
+        return run
+
+    # Every encoding must build the same features before timing them
+    expected = np.array([projector.project(payload) for payload in payloads])
+    decoders = [('Packed float32 records', packed, lambda m: decode_binary(m)[0]),
+                ('JSON batch envelope', json_envelopes, lambda m: batch_from_envelope(loads(m)))]
+    if msgpack_envelopes is not None:
+        decoders.append(('MessagePack batch envelope', msgpack_envelopes,
+                         lambda m: batch_from_envelope(decode_binary(m)[0])))
+    for label, messages, decode in decoders:
+        batches = [decode(message) for message in messages]
+        got = np.concatenate([projector.project_batch(b.columns, b.values, b.timestamps) for b in batches])
+        np.testing.assert_allclose(got, expected, rtol=1e-6, atol=1e-3)
+
+    print(f"📊 sensor_data encodings ({len(payloads)} rows, {rows_per_message} rows per batch message)")
+    print(f"  {'':34s} {'bytes/row':>10s} {'µs/row':>10s}")
+    print(f"  {'JSON object per row':34s} {sum(map(len, single)) / len(payloads):10.1f} "
+          f"{per_row_us(run_single, len(payloads)):10.2f}")
+    for label, messages, decode in decoders:
+        print(f"  {label:34s} {sum(map(len, messages)) / len(payloads):10.1f} "
+              f"{per_row_us(run_batches(messages, decode), len(payloads)):10.2f}")
+    if msgpack_envelopes is None:
+        print("⚠ msgpack not installed, MessagePack envelopes not measured")
+
+if __name__ == "__main__":
+    main()
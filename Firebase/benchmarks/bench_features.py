@@ -0,0 +1,124 @@
+"""
+Micro-benchmark: per-message feature building cost.
+
+Compares the original dict-based process_incoming_data with the compiled
+FeatureProjector, and pd.to_datetime with parse_timestamp, on payloads from
+Dataset/Streaming.csv.
+
+    python benchmarks/bench_features.py [n_payloads]
+"""
+
+import sys
+import timeit
+import warnings
+warnings.filterwarnings('ignore')
+
+import numpy as np
+import pandas as pd
+
+from payloads import load_payloads, load_preprocessing
+from features import FeatureProjector, TIMESTAMP_FORMAT, parse_timestamp
+
+def legacy_process_incoming_data(payload, feature_names):
+    """process_incoming_data as it was before the FeatureProjector"""
+    data_dict = {}
+    
+    feature_mapping = {
+        'soc': 'SoC',
+        'soh': 'SoH',
+        'battery_voltage': 'Battery_Voltage',
+        'battery_current': 'Battery_Current',
+        'battery_temperature': 'Battery_Temperature',
+        'charge_cycles': 'Charge_Cycles',
+        'motor_temperature': 'Motor_Temperature',
+        'motor_vibration': 'Motor_Vibration',
+        'motor_torque': 'Motor_Torque',
+        'motor_rpm': 'Motor_RPM',
+        'power_consumption': 'Power_Consumption',
+        'brake_pad_wear': 'Brake_Pad_Wear',
+        'brake_pressure': 'Brake_Pressure',
+        'reg_brake_efficiency': 'Reg_Brake_Efficiency',
+        'tire_pressure': 'Tire_Pressure',
+        'tire_temperature': 'Tire_Temperature',
+        'suspension_load': 'Suspension_Load',
+        'ambient_temperature': 'Ambient_Temperature',
+        'ambient_humidity': 'Ambient_Humidity',
+        'load_weight': 'Load_Weight',
+        'driving_speed': 'Driving_Speed',
+        'distance_traveled': 'Distance_Traveled',
+        'idle_time': 'Idle_Time',
+        'route_roughness': 'Route_Roughness'
+    }
+    
+    for payload_key, feature_name in feature_mapping.items():
+        if feature_name in feature_names:
+            value = payload.get(payload_key, 0.0)
+            if feature_name in ['SoC', 'SoH', 'Reg_Brake_Efficiency']:
+                value = value * 100
+            data_dict[feature_name] = value
+    
+    if 'Timestamp' in feature_names:
+        timestamp_str = payload.get('timestamp', '')
+        try:
+            if timestamp_str:
+                timestamp = pd.to_datetime(timestamp_str, format='%d-%m-%Y %H:%M', errors='coerce')
+                data_dict['Timestamp'] = timestamp.timestamp() if pd.notna(timestamp) else 0.0
+            else:
+                data_dict['Timestamp'] = 0.0
+        except:
+            data_dict['Timestamp'] = 0.0
+    
+    if 'Maintenance_Type' in feature_names:
+        data_dict['Maintenance_Type'] = 0
+    
+    for feature in feature_names:
+        if feature not in data_dict:
+            data_dict[feature] = 0.0
+    
+    feature_values = [data_dict[fname] for fname in feature_names]
+    
+    return np.array(feature_values)
+
+def per_message_us(fn, payloads, repeat=5):
+    """Best-of-`repeat` mean cost of fn(payload) in microseconds"""
+    def run():
+        for payload in payloads:
+            fn(payload)
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+    return best / len(payloads) * 1e6
+
+def main():
+    n_payloads = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    payloads = load_payloads(n_payloads)
+    feature_names = load_preprocessing()['feature_names']
+    projector = FeatureProjector(feature_names)
+    row = np.empty(projector.n_features, dtype=np.float32)
+
+    # Both paths must agree before their timings mean anything. The legacy
+    # Timestamp feature was raw epoch seconds, so that column is compared
+    # through the parser instead
+    other = [i for i, name in enumerate(feature_names) if name != 'Timestamp']
+    for payload in payloads[:100]:
+        expected = legacy_process_incoming_data(payload, feature_names)
+        np.testing.assert_allclose(projector.project(payload)[other], expected[other], rtol=1e-6)
+        legacy_ts = pd.to_datetime(payload['timestamp'], format=TIMESTAMP_FORMAT, errors='coerce')
+        assert parse_timestamp(payload['timestamp']) == legacy_ts.timestamp()
+
+    legacy = per_message_us(lambda p: legacy_process_incoming_data(p, feature_names), payloads)
+    compiled = per_message_us(lambda p: projector.project(p, row), payloads)
+    legacy_ts = per_message_us(
+        lambda p: pd.to_datetime(p['timestamp'], format=TIMESTAMP_FORMAT, errors='coerce').timestamp(),
+        payloads)
+    fast_ts = per_message_us(lambda p: parse_timestamp(p['timestamp']), payloads)
+
+    print(f"📊 Feature building ({len(payloads)} payloads, {len(feature_names)} features)")
+    print(f"  Legacy process_incoming_data: {legacy:8.2f} µs/message")
+    print(f"  FeatureProjector:             {compiled:8.2f} µs/message")
+    print(f"  Speed-up:                     {legacy / compiled:8.1f}x")
+    print(f"📊 Timestamp parsing")
+    print(f"  pd.to_datetime:               {legacy_ts:8.2f} µs/message")
+    print(f"  parse_timestamp:              {fast_ts:8.2f} µs/message")
+    print(f"  Speed-up:                     {legacy_ts / fast_ts:8.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+End-to-end fleet load test: simulated vehicles -> MQTT broker -> subscriber
+pipeline -> sink.
+
+Rows of Dataset/Streaming.csv are replayed as N vehicles (each starting at
+a different row) publishing at a per-vehicle rate with random jitter. By
+default an embedded LocalBroker is started and the subscriber writes to an
+in-memory LocalDatabase, so nothing leaves the machine. Every payload is
+stamped with its send time; the time it reaches store_record gives the
+on_message -> sink latency.
+
+    python benchmarks/bench_fleet.py --vehicles 100 --rate 1 --duration 30
+    python benchmarks/bench_fleet.py --broker localhost:1883   # e.g. Mosquitto
+"""
+
+import argparse
+import contextlib
+import heapq
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import warnings
+warnings.filterwarnings('ignore')
+
+import numpy as np
+import paho.mqtt.client as mqtt
+
+from payloads import load_payloads
+from local_broker import LocalBroker
+from local_db import LocalDatabase
+import mqtt_lstm_firebase as subscriber
+
+class Publisher:
+    """One MQTT connection publishing for a share of the simulated vehicles"""
+
+    def __init__(self, index, host, port, vehicles, rows, rate, jitter, seed):
+        self.client = mqtt.Client(client_id=f"fleet-loadgen-{index}", protocol=mqtt.MQTTv311)
+        self.client.max_inflight_messages_set(0)
+        self.client.max_queued_messages_set(0)
+        self.client.connect(host, port, 60)
+        self.client.loop_start()
+        self.vehicles = vehicles
+        self.rows = rows
+        self.interval = 1.0 / rate
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.sent = 0
+        self.failed = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=f"publisher-{index}", daemon=True)
+
+    def _next_delay(self):
+        return self.interval * (1 + self.rng.uniform(-self.jitter, self.jitter))
+
+    def _run(self):
+        now = time.monotonic()
+        # (due time, vehicle index, vehicle id, next row); start times are
+        # spread over one interval so vehicles do not publish in lockstep
+        schedule = [(now + self.rng.uniform(0, self.interval), i, vehicle_id, 0)
+                    for i, vehicle_id in enumerate(self.vehicles)]
+        heapq.heapify(schedule)
+        while self.running:
+            due, i, vehicle_id, sequence = schedule[0]
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(min(delay, 0.05))
+                continue
+            payload = dict(self.rows[(i * 997 + sequence) % len(self.rows)])
+            payload['vehicle_id'] = vehicle_id
+            payload['row_number'] = sequence
+            payload['sent_at'] = time.time()
+            info = self.client.publish(subscriber.MQTT_TOPIC, json.dumps(payload), qos=0)
+            if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                self.sent += 1
+            else:
+                self.failed += 1
+            heapq.heapreplace(schedule, (due + self._next_delay(), i, vehicle_id, sequence + 1))
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        self.client.loop_stop()
+        self.client.disconnect()
+
+class LatencyRecorder:
+    """Wraps store_record to record send -> sink latency per record"""
+
+    def __init__(self, upload):
+        self.upload = upload
+        self.lock = threading.Lock()
+        self.latencies = []
+
+    def __call__(self, payload, *args, **kwargs):
+        self.upload(payload, *args, **kwargs)
+        now = time.time()
+        sent_at = payload.get('sent_at')
+        if sent_at is not None:
+            with self.lock:
+                self.latencies.append(now - sent_at)
+
+    def count(self):
+        with self.lock:
+            return len(self.latencies)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--vehicles', type=int, default=50, help="simulated vehicles")
+    parser.add_argument('--rate', type=float, default=2.0, help="messages per second per vehicle")
+    parser.add_argument('--jitter', type=float, default=0.2,
+                        help="relative jitter of the publish interval (0.2 = +/-20%%)")
+    parser.add_argument('--duration', type=float, default=30.0, help="seconds of publishing")
+    parser.add_argument('--publishers', type=int, default=4, help="publisher connections")
+    parser.add_argument('--rows', type=int, default=5000, help="CSV rows to cycle through")
+    parser.add_argument('--broker', default=None,
+                        help="host:port of an existing broker (default: embedded LocalBroker)")
+    parser.add_argument('--drain-timeout', type=float, default=60.0,
+                        help="seconds to wait for in-flight messages after publishing stops")
+    parser.add_argument('--verbose', action='store_true', help="show the subscriber's log output")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    rows = load_payloads(args.rows)
+
+    broker = None
+    if args.broker:
+        host, port = args.broker.rsplit(':', 1)
+        port = int(port)
+    else:
+        broker = LocalBroker()
+        host, port = '127.0.0.1', broker.start()
+        print(f"✓ Embedded MQTT broker listening on {host}:{port}")
+
+    # Subscriber with an in-memory database and a throwaway spool
+    os.chdir(os.path.dirname(os.path.abspath(subscriber.__file__)))
+    if not subscriber.load_rul_model():
+        return
+    # Trace the model once so the first windows do not pay for it
+    subscriber.model.predict(np.zeros((1, subscriber.seq_len, len(subscriber.feature_names)),
+                                      dtype=np.float32))
+    subscriber.db = LocalDatabase()
+    subscriber.SPOOL_DIR = tempfile.mkdtemp(prefix='fleet-spool-')
+    recorder = LatencyRecorder(subscriber.store_record)
+    subscriber.store_record = recorder
+    received = [0]
+    handle_message = subscriber.on_message
+    def on_message(client, userdata, msg):
+        received[0] += 1
+        handle_message(client, userdata, msg)
+
+    log = None if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    if log is not None:
+        log.__enter__()
+    try:
+        subscriber.start_pipeline()
+        client = mqtt.Client(client_id="rul_prediction_subscriber", protocol=mqtt.MQTTv311)
+        client.max_queued_messages_set(0)
+        client.on_connect = subscriber.on_connect
+        client.on_message = on_message
+        client.connect(host, port, 60)
+        client.loop_start()
+        time.sleep(0.5)  # let the subscription settle
+
+        vehicle_ids = [f"ev-{i:04d}" for i in range(args.vehicles)]
+        publishers = [Publisher(i, host, port, vehicle_ids[i::args.publishers], rows,
+                                args.rate, args.jitter, seed=i)
+                      for i in range(min(args.publishers, args.vehicles))]
+        start = time.time()
+        for publisher in publishers:
+            publisher.thread.start()
+        time.sleep(args.duration)
+        for publisher in publishers:
+            publisher.running = False
+        publish_seconds = time.time() - start
+        for publisher in publishers:
+            publisher.stop()
+        sent = sum(publisher.sent for publisher in publishers)
+        completed_in_window = recorder.count()
+
+        # Wait for in-flight messages until the sink stops making progress
+        deadline = time.time() + args.drain_timeout
+        last = -1
+        while time.time() < deadline and recorder.count() < sent and recorder.count() != last:
+            last = recorder.count()
+            time.sleep(1.0)
+        client.loop_stop()
+        client.disconnect()
+        stage_drops = (subscriber.parse_stage.dropped() + subscriber.feature_stage.dropped()
+                       + subscriber.sink_stage.dropped())
+        subscriber.stop_pipeline()
+    finally:
+        if log is not None:
+            log.__exit__(None, None, None)
+        if broker is not None:
+            broker.stop()
+
+    latencies = np.array(recorder.latencies) * 1000.0
+    completed = len(latencies)
+    print(f"\n📊 Fleet load test: {args.vehicles} vehicles x {args.rate:g} msg/s "
+          f"(±{args.jitter:.0%} jitter) for {publish_seconds:.1f} s")
+    print(f"  Offered load:          {sent / publish_seconds:10,.1f} msgs/s ({sent} sent, "
+          f"{sum(p.failed for p in publishers)} publish errors)")
+    print(f"  Sustained throughput:  {completed_in_window / publish_seconds:10,.1f} msgs/s "
+          f"reached the sink while publishing")
+    if completed:
+        print(f"  Latency p50/p95/p99:   {np.percentile(latencies, 50):8.1f} / "
+              f"{np.percentile(latencies, 95):.1f} / {np.percentile(latencies, 99):.1f} ms "
+              f"(max {latencies.max():.1f} ms)")
+    print(f"  Received by on_message: {received[0]}")
+    if broker is not None:
+        print(f"  Broker dropped:         {broker.dropped}")
+    print(f"  Pipeline dropped:       {stage_drops}")
+    print(f"  Reached the sink:       {completed} ({sent - completed} lost)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Micro-benchmark: MQTT JSON parse throughput.
+
+Payloads from Dataset/Streaming.csv are serialized the way the device sends
+them and fed to the original reassembly (string buffer, json.loads of the
+whole buffer after every fragment) and to JsonStreamDecoder, delivered as
+whole messages and split into fixed-size fragments.
+
+    python benchmarks/bench_parse.py [n_payloads] [fragment_bytes]
+"""
+
+import json
+import sys
+import timeit
+
+from payloads import load_payloads
+import json_stream
+from json_stream import JsonStreamDecoder
+
+def legacy_feed(state, raw_bytes):
+    """The reassembly in on_message before JsonStreamDecoder (prints removed)"""
+    raw_message = raw_bytes.decode('utf-8', errors='ignore')
+    try:
+        payload = json.loads(raw_message)
+        state[0] = ""
+        return [payload]
+    except json.JSONDecodeError:
+        message_buffer = state[0] + raw_message
+        try:
+            payload = json.loads(message_buffer)
+            state[0] = ""
+            return [payload]
+        except json.JSONDecodeError:
+            state[0] = "" if len(message_buffer) > 5000 else message_buffer
+            return []
+
+def fragment(messages, size):
+    """Split every message into chunks of at most `size` bytes"""
+    chunks = []
+    for message in messages:
+        chunks.extend(message[i:i + size] for i in range(0, len(message), size))
+    return chunks
+
+def messages_per_second(make_feed, chunks, n_messages, repeat=5):
+    """Best-of-`repeat` throughput of feeding every chunk to a fresh parser"""
+    def run():
+        feed = make_feed()
+        parsed = 0
+        for chunk in chunks:
+            parsed += len(feed(chunk))
+        assert parsed == n_messages, parsed
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+    return n_messages / best
+
+def legacy_parser():
+    state = [""]
+    return lambda chunk: legacy_feed(state, chunk)
+
+def stream_parser():
+    return JsonStreamDecoder().feed
+
+def main():
+    n_payloads = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    fragment_bytes = int(sys.argv[2]) if len(sys.argv) > 2 else 128
+    payloads = load_payloads(n_payloads)
+    messages = [json.dumps(payload).encode('utf-8') for payload in payloads]
+    fragments = fragment(messages, fragment_bytes)
+    mean_size = sum(len(m) for m in messages) / len(messages)
+
+    # Both parsers must produce the same payloads before timing them
+    legacy, stream = legacy_parser(), stream_parser()
+    assert [p for c in fragments for p in legacy(c)] == payloads
+    assert [p for c in fragments for p in stream(c)] == payloads
+
+    orjson_module = json_stream.orjson
+    results = []
+    for label, chunks in (('whole messages', messages),
+                          (f'{fragment_bytes}-byte fragments', fragments)):
+        results.append((f'Legacy reassembly, {label}',
+                        messages_per_second(legacy_parser, chunks, len(messages))))
+        json_stream.orjson = None
+        results.append((f'JsonStreamDecoder (json), {label}',
+                        messages_per_second(stream_parser, chunks, len(messages))))
+        json_stream.orjson = orjson_module
+        if orjson_module is not None:
+            results.append((f'JsonStreamDecoder (orjson), {label}',
+                            messages_per_second(stream_parser, chunks, len(messages))))
+
+    print(f"📊 JSON parse throughput ({len(messages)} payloads, {mean_size:.0f} bytes mean, "
+          f"{len(fragments) / len(messages):.1f} fragments/message)")
+    for label, rate in results:
+        print(f"  {label:48s} {rate:12,.0f} msgs/s")
+    if orjson_module is None:
+        print("⚠ orjson not installed, fast path not measured")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Realistic MQTT payloads for the subscriber benchmarks.
+
+Rows are read from Dataset/Streaming.csv and converted to the same JSON
+payload the ESP32 sketch (MQTT/MQTT.ino) publishes. If the CSV is not
+available (e.g. a checkout without Git LFS), deterministic synthetic rows
+with the same keys are generated instead.
+"""
+
+import os
+import pickle
+import random
+import sys
+
+import pandas as pd
+
+FIREBASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(FIREBASE_DIR)
+STREAMING_CSV = os.path.join(REPO_DIR, 'Dataset', 'Streaming.csv')
+PREPROCESSING_PATH = os.path.join(FIREBASE_DIR, 'preprocessing_data.pkl')
+MODEL_PATH = os.path.join(FIREBASE_DIR, 'best_rul_model.keras')
+
+if FIREBASE_DIR not in sys.path:
+    sys.path.insert(0, FIREBASE_DIR)
+
+from features import PAYLOAD_KEYS
+
+# Payload keys in the column order of Streaming.csv (after Timestamp)
+CSV_PAYLOAD_KEYS = list(PAYLOAD_KEYS.values())
+
+def is_lfs_pointer(path):
+    """Whether a file is an un-fetched Git LFS pointer"""
+    with open(path, 'rb') as f:
+        return f.read(40).startswith(b'version https://git-lfs')
+
+def row_to_payload(values, row_number):
+    """Build the device's JSON payload from one CSV row (timestamp first)"""
+    payload = {'timestamp': str(values[0])}
+    for key, value in zip(CSV_PAYLOAD_KEYS, values[1:]):
+        payload[key] = float(value)
+    payload['row_number'] = row_number
+    payload['device_millis'] = row_number * 10000
+    return payload
+
+def synthetic_payloads(limit, seed=0):
+    """Deterministic payloads with realistic keys and value ranges"""
+    rng = random.Random(seed)
+    payloads = []
+    for i in range(limit):
+        values = [f'{1 + (i // 96) % 28:02d}-01-2024 {(i // 4) % 24:02d}:{(i % 4) * 15:02d}']
+        for key in CSV_PAYLOAD_KEYS:
+            if key in ('soc', 'soh', 'reg_brake_efficiency'):
+                values.append(rng.uniform(0.2, 1.0))
+            else:
+                values.append(rng.uniform(0, 500))
+        payloads.append(row_to_payload(values, i))
+    return payloads
+
+def load_payloads(limit=1000, path=STREAMING_CSV):
+    """Up to `limit` payloads from Streaming.csv (synthetic if unavailable)"""
+    if not os.path.exists(path) or is_lfs_pointer(path):
+        print(f"⚠ {path} not available, using synthetic payloads")
+        return synthetic_payloads(limit)
+    df = pd.read_csv(path, nrows=limit)
+    return [row_to_payload(values, i) for i, values in enumerate(df.itertuples(index=False))]
+
+def load_preprocessing(path=PREPROCESSING_PATH):
+    """The preprocessing dict saved by the training notebook"""
+    with open(path, 'rb') as f:
+        return pickle.load(f)
@@ -0,0 +1,325 @@
+"""
+Micro-benchmark suite for the subscriber hot path, with regression checks.
+
+Each benchmark runs one step in isolation on payloads from
+Dataset/Streaming.csv and the shipped best_rul_model.keras, and records:
+
+  best_us / median_us   time per call (best and median of the repeats)
+  alloc_bytes           peak Python memory allocated by one call (tracemalloc)
+
+Results are written as JSON. When a baseline exists, any benchmark whose
+best_us or alloc_bytes grew by more than the thresholds fails the run
+(exit status 1).
+
+    python benchmarks/run_benchmarks.py --save-baseline     # on the reference tree
+    python benchmarks/run_benchmarks.py                     # on the change
+    python benchmarks/run_benchmarks.py --only json_ features_projection
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import timeit
+import tracemalloc
+import warnings
+warnings.filterwarnings('ignore')
+
+import numpy as np
+
+from payloads import FIREBASE_DIR, load_payloads
+from local_db import LocalDatabase
+from firebase_writer import FirebaseBatchWriter
+from rollups import RollupAggregator
+from rolling_stats import RollingStats
+import mqtt_lstm_firebase as subscriber
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, 'baseline.json')
+RESULTS_PATH = os.path.join(BENCHMARK_DIR, 'results.json')
+
+# Records per writer_flush call: one live flush of the subscriber
+FLUSH_BATCH = subscriber.FIREBASE_FLUSH_RECORDS
+
+# Registered benchmarks: (name, setup, calls per timing run)
+BENCHMARKS = []
+
+def benchmark(name, number):
+    """Register setup(payloads) -> fn, where fn() performs one call"""
+    def register(setup):
+        BENCHMARKS.append((name, setup, number))
+        return setup
+    return register
+
+def cycle(items):
+    """Endless iterator over items, cheap enough to sit inside a timed call"""
+    while True:
+        yield from items
+
+# ==================== BENCHMARKS ====================
+
+@benchmark('features_projection', number=2000)
+def setup_features(payloads):
+    """process_incoming_data into a preallocated row"""
+    row = np.empty(len(subscriber.feature_names), dtype=np.float32)
+    items = cycle(payloads)
+    return lambda: subscriber.process_incoming_data(next(items), row)
+
+@benchmark('ring_buffer_commit', number=2000)
+def setup_ring_buffer(payloads):
+    """Feature row built in place, scaled and appended to a vehicle's buffer"""
+    state = subscriber.VehicleState('bench')
+    items = cycle(payloads)
+    def run():
+        subscriber.process_incoming_data(next(items), state.buffer.next_slot())
+        state.buffer.commit()
+    return run
+
+@benchmark('predict_single_window', number=20)
+def setup_predict_single(payloads):
+    """model.predict on one window (a lone vehicle's incremental request)"""
+    windows = scaled_windows(payloads, 1)
+    return lambda: subscriber.model.predict(windows)
+
+@benchmark('predict_micro_batch', number=5)
+def setup_predict_batch(payloads):
+    """model.predict on a full INFERENCE_MAX_BATCH micro-batch"""
+    n = subscriber.INFERENCE_MAX_BATCH
+    windows = scaled_windows(payloads, n)
+    return lambda: subscriber.model.predict(windows)
+
+@benchmark('rolling_stats_update', number=5000)
+def setup_rolling_stats(payloads):
+    """One window prediction pushed, old windows evicted, statistics computed"""
+    stats = RollingStats()
+    window = subscriber.BUFFER_SIZE - subscriber.seq_len + 1
+    preds = cycle(np.random.default_rng(0).uniform(50, 150, 1000).tolist())
+    index = [0]
+    def run():
+        end_index = index[0]
+        stats.push(end_index, next(preds))
+        stats.evict_before(end_index - window + 1)
+        index[0] += 1
+        return subscriber.compute_prediction_stats(stats)
+    return run
+
+@benchmark('health_status', number=20000)
+def setup_health_status(payloads):
+    """get_health_status over a spread of RUL/SoH values"""
+    cases = cycle([(rul, soh) for rul in (0.2, 0.8, 2.0, 4.0, 8.0, 150.0)
+                   for soh in (30.0, 50.0, 70.0, 90.0)])
+    def run():
+        rul, soh = next(cases)
+        return subscriber.get_health_status(rul, soh)
+    return run
+
+@benchmark('json_reassembly_whole', number=2000)
+def setup_json_whole(payloads):
+    """handle_raw_message on complete JSON messages"""
+    messages = cycle([json.dumps(payload).encode('utf-8') for payload in payloads])
+    return lambda: subscriber.handle_raw_message(('sensor_data', next(messages)))
+
+@benchmark('json_reassembly_fragmented', number=2000)
+def setup_json_fragmented(payloads):
+    """handle_raw_message on JSON messages split into 128-byte fragments"""
+    fragments = []
+    for payload in payloads:
+        message = json.dumps(payload).encode('utf-8')
+        fragments.extend(message[i:i + 128] for i in range(0, len(message), 128))
+    items = cycle(fragments)
+    return lambda: subscriber.handle_raw_message(('sensor_data', next(items)))
+
+@benchmark('store_record', number=2000)
+def setup_upload(payloads):
+    """store_record into the batched Firebase writer over an in-memory database"""
+    stats = RollingStats()
+    for i, pred in enumerate(np.linspace(140, 90, 71)):
+        stats.push(i, pred)
+    prediction_stats = subscriber.compute_prediction_stats(stats)
+    items = cycle(payloads)
+    return lambda: subscriber.store_record(next(items), 95.0, prediction_stats,
+                                           'bench', subscriber.BUFFER_SIZE)
+
+@benchmark('writer_flush', number=20)
+def setup_writer_flush(payloads):
+    """One flush of FLUSH_BATCH records (sharded history, alert, rollup bucket and
+    latest-node delta) as a multi-location update into an in-memory database"""
+    stats = RollingStats()
+    for i, pred in enumerate(np.linspace(140, 90, 71)):
+        stats.push(i, pred)
+    prediction_stats = subscriber.compute_prediction_stats(stats)
+    writer = FirebaseBatchWriter(LocalDatabase(), history_path=subscriber.FIREBASE_HISTORY_PATH,
+                                 latest_path=subscriber.FIREBASE_LATEST_PATH,
+                                 flush_records=10 ** 9, flush_interval_ms=10 ** 9, shard_history=True,
+                                 latest_tolerances=subscriber.LATEST_TOLERANCES)
+    rollups = RollupAggregator(subscriber.FIREBASE_ROLLUP_PATH, subscriber.ROLLUP_RESOLUTIONS)
+    alerts = subscriber.new_alert_engine()
+    # A few distinct batches so the latest node changes between flushes;
+    # reusing their keys keeps the database the same size
+    batches = []
+    for start in range(0, FLUSH_BATCH * 4, FLUSH_BATCH):
+        for i, payload in enumerate(payloads[start:start + FLUSH_BATCH]):
+            rul = 95.0 if i == 0 else 150.0
+            entry = subscriber.build_data_entry(payload, rul, prediction_stats, 'bench',
+                                                subscriber.BUFFER_SIZE)
+            change = alerts.observe('bench', rul, entry['battery']['soh'])
+            _, alert_key, alert = change or (None, None, None)
+            writer.add(entry, alert, alert_key)
+            rollups.add('bench', time.time(), (entry['battery']['soc'], entry['battery']['soh'],
+                                               entry['battery']['temperature'], rul))
+        writer.add_updates(rollups.close_all())
+        batches.append(writer.pending)
+        writer.pending = []
+    items = cycle(batches)
+    def run():
+        writer.pending = list(next(items))
+        writer.flush()
+    return run
+
+@benchmark('metrics_event', number=20000)
+def setup_metrics(payloads):
+    """One stage timing (two clock reads and a histogram record) plus a counter increment"""
+    histogram = subscriber.metrics.histogram('bench_latency_seconds', "benchmark")
+    counter = subscriber.metrics.counter('bench_events_total', "benchmark")
+    def run():
+        start = time.perf_counter_ns()
+        histogram.since(start)
+        counter.inc()
+    return run
+
+def scaled_windows(payloads, n_windows):
+    """n_windows consecutive model windows built from payloads"""
+    state = subscriber.VehicleState('bench-windows')
+    for payload in payloads[:n_windows + subscriber.seq_len - 1]:
+        subscriber.process_incoming_data(payload, state.buffer.next_slot())
+        state.buffer.commit()
+    last_end = state.buffer.count - 1
+    return np.ascontiguousarray(state.buffer.windows(last_end - n_windows + 1, last_end,
+                                                     subscriber.seq_len))
+
+# ==================== RUNNER ====================
+
+def prepare_subscriber():
+    """Load the model and point the subscriber's sinks at in-memory stand-ins"""
+    os.chdir(FIREBASE_DIR)
+    if not subscriber.load_rul_model():
+        sys.exit(1)
+    # Flushes are deferred to the end so the writer thread's work does not
+    # show up in the timings or traced allocations of store_record
+    subscriber.record_sink = FirebaseBatchWriter(LocalDatabase(), flush_records=10 ** 9,
+                                                 flush_interval_ms=10 ** 9, shard_history=True)
+    subscriber.alert_engine = subscriber.new_alert_engine()
+    subscriber.rollup_aggregator = RollupAggregator(subscriber.FIREBASE_ROLLUP_PATH,
+                                                    subscriber.ROLLUP_RESOLUTIONS)
+    # Parsed payloads stop at the parse stage; only reassembly is measured
+    subscriber.submit_payload = lambda payload: None
+    subscriber.json_decoders.clear()
+
+def measure(fn, number, repeat, alloc_calls):
+    """(best_us, median_us, alloc_bytes) for one benchmark callable"""
+    for _ in range(min(number, 50)):
+        fn()  # warm caches, lazily built state and traced functions
+    runs = timeit.repeat(fn, number=number, repeat=repeat)
+    per_call = [run / number * 1e6 for run in runs]
+
+    tracemalloc.start()
+    try:
+        peak = 0
+        for _ in range(alloc_calls):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            fn()
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return min(per_call), statistics.median(per_call), peak
+
+def compare(results, baseline, time_threshold, alloc_threshold):
+    """Regression messages for results against a baseline"""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        time_ratio = result['best_us'] / reference['best_us']
+        if time_ratio > 1 + time_threshold:
+            regressions.append(f"{name}: {reference['best_us']:.2f} -> {result['best_us']:.2f} µs "
+                               f"(+{time_ratio - 1:.0%})")
+        # Allocation sizes are small integers; ignore differences under 1 KiB
+        alloc_limit = reference['alloc_bytes'] * (1 + alloc_threshold) + 1024
+        if result['alloc_bytes'] > alloc_limit:
+            regressions.append(f"{name}: {reference['alloc_bytes']} -> {result['alloc_bytes']} bytes allocated")
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Subscriber hot-path micro-benchmarks")
+    parser.add_argument('--only', nargs='+', metavar='PREFIX',
+                        help="run only benchmarks whose name starts with one of these")
+    parser.add_argument('--payloads', type=int, default=2000, help="Streaming.csv rows to use")
+    parser.add_argument('--repeat', type=int, default=7, help="timing runs per benchmark")
+    parser.add_argument('--alloc-calls', type=int, default=20, help="calls traced for allocations")
+    parser.add_argument('--output', default=RESULTS_PATH, help=f"results file (default: {RESULTS_PATH})")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help=f"baseline file (default: {BASELINE_PATH})")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the baseline")
+    parser.add_argument('--time-threshold', type=float, default=0.25,
+                        help="allowed relative slow-down before failing (default: 0.25)")
+    parser.add_argument('--alloc-threshold', type=float, default=0.25,
+                        help="allowed relative allocation growth before failing (default: 0.25)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    payloads = load_payloads(args.payloads)
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        prepare_subscriber()
+        results = {}
+        for name, setup, number in BENCHMARKS:
+            if args.only and not any(name.startswith(prefix) for prefix in args.only):
+                continue
+            best, median, alloc = measure(setup(payloads), number, args.repeat, args.alloc_calls)
+            results[name] = {'best_us': round(best, 3), 'median_us': round(median, 3),
+                             'alloc_bytes': alloc, 'calls': number * args.repeat}
+            sys.stderr.write(f"  {name:28s} {best:12.2f} µs {alloc:10d} B\n")
+        subscriber.record_sink.stop()
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'payloads': len(payloads),
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"📊 Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"⚠ No baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    print(f"{'':28s} {'baseline µs':>12s} {'µs':>10s} {'change':>8s}")
+    for name, result in results.items():
+        if name in baseline:
+            change = result['best_us'] / baseline[name]['best_us'] - 1
+            print(f"{name:28s} {baseline[name]['best_us']:12.2f} {result['best_us']:10.2f} {change:+8.0%}")
+    regressions = compare(results, baseline, args.time_threshold, args.alloc_threshold)
+    if regressions:
+        print("✗ Performance regressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("✓ No regressions against the baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Compact and multi-row payload encodings for the sensor_data topic.
+
+Besides one JSON object per row, the subscriber accepts:
+
+  Packed records (version 1), little-endian:
+      header   '<2sBBH'  magic b'EV', version, len(vehicle_id), n_rows
+      vehicle_id         UTF-8, len(vehicle_id) bytes (may be empty)
+      n_rows x PACKED_ROW_DTYPE
+                         uint32 timestamp (epoch seconds, 0 if unknown),
+                         uint32 row_number, uint32 device_millis, then the
+                         24 sensor values as float32 in PACKED_KEYS order
+      A row is 108 bytes against roughly 900 for the JSON object.
+
+  MessagePack (if the msgpack package is installed): a map with the same
+  keys as the JSON payload, or a batch envelope.
+
+  Batch envelopes, as JSON or MessagePack:
+      {"vehicle_id": "ev-7", "columns": ["timestamp", "soc", ...],
+       "rows": [["01-01-2024 00:00", 0.81, ...], ...]}
+      Every key other than columns/rows applies to all rows.
+
+Multi-row messages decode into a SampleBatch, whose sensor values are one
+float32 2-D array that feature building and scaling consume as a whole.
+"""
+
+import struct
+import time
+
+import numpy as np
+
+from features import PAYLOAD_KEYS, TIMESTAMP_FORMAT, parse_timestamp
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+PACKED_MAGIC = b'EV'
+PACKED_VERSION = 1
+PACKED_HEADER = struct.Struct('<2sBBH')
+
+# Sensor values in the order of Streaming.csv and the device payload
+PACKED_KEYS = tuple(PAYLOAD_KEYS.values())
+PACKED_ROW_DTYPE = np.dtype([
+    ('timestamp', '<u4'),
+    ('row_number', '<u4'),
+    ('device_millis', '<u4'),
+    ('values', '<f4', (len(PACKED_KEYS),))
+])
+SENSOR_KEYS = frozenset(PACKED_KEYS)
+
+class PayloadError(ValueError):
+    """Raised for a binary payload or batch envelope that cannot be decoded"""
+
+# ==================== SAMPLE BATCHES ====================
+
+class SampleBatch:
+    """Several rows of one vehicle, with the sensor values as a 2-D array"""
+
+    def __init__(self, columns, values, timestamps, fields=None, meta=None, source_rows=None):
+        # Sensor payload keys, one per column of values
+        self.columns = tuple(columns)
+        self.column_index = {key: i for i, key in enumerate(self.columns)}
+        self.values = values
+        # float64 epoch seconds per row, NaN where missing/invalid
+        self.timestamps = timestamps
+        # Other per-row payload fields (row_number, device_millis, ...)
+        self.fields = fields or {}
+        # Keys shared by every row (vehicle_id, ...)
+        self.meta = meta or {}
+        # Original decoded rows, so uploads keep the values exactly as sent
+        self.source_rows = source_rows
+        self._timestamp_strings = None
+
+    def __len__(self):
+        return len(self.values)
+
+    def row(self, index):
+        """Payload-like view of one row (supports .get like the JSON dict)"""
+        return BatchRow(self, index)
+
+    def timestamp_string(self, index):
+        if self._timestamp_strings is None:
+            self._timestamp_strings = [format_timestamp(s) for s in self.timestamps]
+        return self._timestamp_strings[index]
+
+    def lookup(self, index, key, default=None):
+        column = self.column_index.get(key)
+        if column is not None:
+            if self.source_rows is not None:
+                return self.source_rows[index][column]
+            # Shortest decimal that round-trips the float32 (0.8, not 0.800000011920929)
+            return float(str(self.values[index, column]))
+        if key == 'timestamp' and 'timestamp' not in self.fields:
+            return self.timestamp_string(index)
+        if key in self.fields:
+            return self.fields[key][index]
+        return self.meta.get(key, default)
+
+class BatchRow:
+    """One row of a SampleBatch, read through the payload dict interface"""
+
+    __slots__ = ('batch', 'index')
+
+    def __init__(self, batch, index):
+        self.batch = batch
+        self.index = index
+
+    def get(self, key, default=None):
+        return self.batch.lookup(self.index, key, default)
+
+def format_timestamp(seconds):
+    """'dd-mm-YYYY HH:MM' for epoch seconds ('' if missing)"""
+    if not seconds == seconds or seconds <= 0:  # NaN or unknown
+        return ''
+    return time.strftime(TIMESTAMP_FORMAT, time.gmtime(seconds))
+
+# ==================== DECODING ====================
+
+def is_binary(data):
+    """Whether a message starts with a packed record or a MessagePack map
+
+    Only meaningful at a message boundary: JSON always starts with '{',
+    '[' or whitespace there.
+    """
+    if data[:2] == PACKED_MAGIC:
+        return True
+    first = data[0] if data else 0
+    return msgpack is not None and (0x80 <= first <= 0x8f or first in (0xde, 0xdf))
+
+def decode_binary(data):
+    """Decode a packed record or MessagePack message into payloads/batches"""
+    if data[:2] == PACKED_MAGIC:
+        return [decode_packed(data)]
+    try:
+        value = msgpack.unpackb(data, raw=False, strict_map_key=False)
+    except Exception as e:
+        raise PayloadError(f"Invalid MessagePack message: {e}")
+    if not isinstance(value, dict):
+        raise PayloadError("MessagePack message is not a map")
+    return [value]
+
+def decode_packed(data):
+    """SampleBatch from a packed record message"""
+    if len(data) < PACKED_HEADER.size:
+        raise PayloadError("Packed record shorter than its header")
+    magic, version, id_length, n_rows = PACKED_HEADER.unpack_from(data)
+    if version != PACKED_VERSION:
+        raise PayloadError(f"Unsupported packed record version {version}")
+    offset = PACKED_HEADER.size
+    expected = offset + id_length + n_rows * PACKED_ROW_DTYPE.itemsize
+    if len(data) != expected:
+        raise PayloadError(f"Packed record is {len(data)} bytes, expected {expected}")
+    vehicle_id = bytes(data[offset:offset + id_length]).decode('utf-8', errors='replace')
+    rows = np.frombuffer(data, dtype=PACKED_ROW_DTYPE, count=n_rows, offset=offset + id_length)
+
+    timestamps = rows['timestamp'].astype(np.float64)
+    timestamps[timestamps == 0] = np.nan
+    return SampleBatch(PACKED_KEYS, rows['values'], timestamps,
+                       fields={'row_number': rows['row_number'].tolist(),
+                               'device_millis': rows['device_millis'].tolist()},
+                       meta={'vehicle_id': vehicle_id} if vehicle_id else None)
+
+def is_envelope(payload):
+    """Whether a decoded dict is a multi-row batch envelope"""
+    return 'rows' in payload and 'columns' in payload
+
+def batch_from_envelope(envelope):
+    """SampleBatch from a decoded {"columns": [...], "rows": [[...], ...]} envelope"""
+    columns = envelope['columns']
+    rows = envelope['rows']
+    if not isinstance(columns, list) or not isinstance(rows, list):
+        raise PayloadError("Batch envelope columns and rows must be lists")
+    for row in rows:
+        if not isinstance(row, list) or len(row) != len(columns):
+            raise PayloadError("Batch envelope row does not match its columns")
+
+    # Sensor columns become the 2-D value array; the row lists are kept so
+    # uploads read back the values exactly as they were sent
+    sensor = [i for i, key in enumerate(columns) if key in SENSOR_KEYS]
+    if sensor == list(range(len(sensor))):
+        sensor_rows = [row[:len(sensor)] for row in rows]
+    else:
+        sensor_rows = [[row[i] for i in sensor] for row in rows]
+    try:
+        values = np.array(sensor_rows, dtype=np.float32).reshape(len(rows), len(sensor))
+    except (TypeError, ValueError) as e:
+        raise PayloadError(f"Non-numeric sensor value in batch envelope: {e}")
+
+    fields = {}
+    for i, key in enumerate(columns):
+        if key not in SENSOR_KEYS:
+            fields[key] = [row[i] for row in rows]
+    timestamps = np.array([parse_timestamp(s) if isinstance(s, str) else None
+                           for s in fields.get('timestamp', [None] * len(rows))],
+                          dtype=np.float64)
+
+    meta = {key: value for key, value in envelope.items() if key not in ('columns', 'rows')}
+    return SampleBatch([columns[i] for i in sensor], values, timestamps,
+                       fields=fields, meta=meta, source_rows=sensor_rows)
+
+# ==================== ENCODING ====================
+
+def encode_packed(payloads, vehicle_id=''):
+    """Packed record message for a list of payload dicts (device/test side)"""
+    rows = np.zeros(len(payloads), dtype=PACKED_ROW_DTYPE)
+    for i, payload in enumerate(payloads):
+        seconds = parse_timestamp(payload.get('timestamp', ''))
+        rows[i]['timestamp'] = seconds or 0
+        rows[i]['row_number'] = payload.get('row_number', 0)
+        rows[i]['device_millis'] = payload.get('device_millis', 0)
+        rows[i]['values'] = [payload.get(key, 0.0) for key in PACKED_KEYS]
+    vehicle_bytes = vehicle_id.encode('utf-8')
+    return (PACKED_HEADER.pack(PACKED_MAGIC, PACKED_VERSION, len(vehicle_bytes), len(payloads))
+            + vehicle_bytes + rows.tobytes())
+
+def build_envelope(payloads, vehicle_id=None):
+    """Batch envelope dict for a list of payload dicts (serialize as JSON or MessagePack)"""
+    columns = list(PACKED_KEYS) + ['timestamp', 'row_number', 'device_millis']
+    envelope = {'columns': columns,
+                'rows': [[payload.get(key, 0) for key in columns] for payload in payloads]}
+    if vehicle_id:
+        envelope['vehicle_id'] = vehicle_id
+    return envelope
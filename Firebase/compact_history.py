@@ -0,0 +1,339 @@
+"""
+Retention job: archive history records older than a horizon to Parquet and
+delete them from the store.
+
+Records are read from the store in pages (oldest first), written to
+compressed Parquet files partitioned by vehicle and month, and only then
+deleted, in batched multi-path updates (Firebase) or transactions (SQLite):
+
+    <archive>/vehicle=<vehicle>/month=<YYYY-MM>/part-<first key>.parquet
+
+Nested fields are flattened into columns named by their path
+(battery.soc, rul_prediction.value, ...), plus the record's key and its
+sample_time: the device timestamp as an ISO string, or the upload time for
+records without one. Months, the manifest's time ranges and queries all
+use sample_time, so recorded data uploaded later is archived with the
+month it was sampled in.
+
+Firebase history sharded by vehicle and day is archived a whole day at a
+time (days before the horizon); the legacy flat ev_battery_data list is
+archived by key, since push keys are ordered by time.
+
+The run is resumable: checkpoint-<store>.json in the archive records the
+horizon, the partitions already done and the keys of a page that was
+archived but not yet deleted, which a resumed run deletes first. File names
+depend only on the page contents, so a page archived again after a crash
+overwrites its own file. manifest.json lists every file with its vehicle,
+month, row count and key/sample-time range; query_archive() uses it to
+read only the files overlapping a query.
+
+    python compact_history.py --days 30
+    python compact_history.py --store sqlite --days 7
+    python compact_history.py --query EV_001 --start 2026-01-01 --end 2026-02-01
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from features import parse_timestamp
+from firebase_writer import PUSH_CHARS
+from rollups import firebase_key
+from sqlite_store import SqliteStore
+
+RETENTION_DAYS = 30
+ARCHIVE_DIR = "history_archive"
+LEGACY_HISTORY_PATH = "ev_battery_data"
+PAGE_RECORDS = 10000
+DELETE_BATCH_RECORDS = 1000
+PARQUET_COMPRESSION = "zstd"
+
+MANIFEST_FILE = "manifest.json"
+DAY_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+# ==================== STORES ====================
+
+def push_key_prefix(epoch_seconds):
+    """Time part of a push key; keys below it were generated before epoch_seconds"""
+    now = int(epoch_seconds * 1000)
+    time_chars = []
+    for _ in range(8):
+        time_chars.append(PUSH_CHARS[now % 64])
+        now //= 64
+    return ''.join(reversed(time_chars))
+
+class FirebaseHistory:
+    """History records before the horizon in the Realtime Database"""
+
+    def __init__(self, database, history_path, legacy_path, cutoff):
+        self.database = database
+        self.history_path = history_path
+        self.legacy_path = legacy_path
+        self.cutoff_day = cutoff.strftime('%Y-%m-%d')
+        self.cutoff_key = push_key_prefix(cutoff.timestamp())
+
+    def partitions(self):
+        """Day shards before the horizon, then the legacy flat list"""
+        paths = []
+        vehicles = self.database.reference(self.history_path).get(shallow=True)
+        for vehicle in sorted(vehicles if isinstance(vehicles, dict) else {}):
+            days = self.database.reference(f"{self.history_path}/{vehicle}").get(shallow=True)
+            paths.extend(f"{self.history_path}/{vehicle}/{day}"
+                         for day in sorted(days if isinstance(days, dict) else {})
+                         if DAY_PATTERN.match(day) and day < self.cutoff_day)
+        if self.legacy_path:
+            paths.append(self.legacy_path)
+        return paths
+
+    def page(self, partition, limit):
+        """[(id, key, record)] of the oldest records left in a partition"""
+        query = self.database.reference(partition).order_by_key()
+        if partition == self.legacy_path:
+            query = query.end_at(self.cutoff_key)
+        records = query.limit_to_first(limit).get() or {}
+        return [(key, key, record) for key, record in records.items() if isinstance(record, dict)]
+
+    def delete(self, partition, ids, batch_records):
+        ref = self.database.reference(partition)
+        for i in range(0, len(ids), batch_records):
+            ref.update({key: None for key in ids[i:i + batch_records]})
+
+class SqliteHistory:
+    """Records before the horizon in a local SQLite store, per vehicle"""
+
+    def __init__(self, store, cutoff):
+        self.store = store
+        self.before = cutoff.timestamp()
+
+    def partitions(self):
+        return sorted(self.store.vehicles())
+
+    def page(self, vehicle_id, limit):
+        return self.store.oldest(vehicle_id, self.before, limit)
+
+    def delete(self, vehicle_id, ids, batch_records):
+        for i in range(0, len(ids), batch_records):
+            self.store.delete_rows(ids[i:i + batch_records])
+
+# ==================== ARCHIVE ====================
+
+def read_json(path, default=None):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+def write_json(path, value):
+    """Replace path atomically with value"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(value, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def sample_time(record):
+    """ISO sample time of a record, falling back to its upload time ('' if neither)"""
+    seconds = parse_timestamp(record.get('timestamp'))
+    if seconds is None:
+        return str(record.get('upload_timestamp') or '')
+    return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None).isoformat()
+
+def write_page(archive_dir, records, source, compression=PARQUET_COMPRESSION):
+    """Write one page of records as Parquet, one file per vehicle and month;
+    returns their manifest entries"""
+    groups = {}
+    for _, key, record in records:
+        vehicle = firebase_key(record.get('vehicle_id') or 'default')
+        when = sample_time(record)
+        groups.setdefault((vehicle, when[:7] or 'unknown'), []).append((key, when, record))
+
+    files = {}
+    for (vehicle, month), rows in groups.items():
+        frame = pd.json_normalize([record for _, _, record in rows], sep='.')
+        frame.insert(0, 'key', [key for key, _, _ in rows])
+        frame.insert(1, 'sample_time', [when for _, when, _ in rows])
+        relative = f"vehicle={vehicle}/month={month}/part-{rows[0][0]}.parquet"
+        path = os.path.join(archive_dir, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        frame.to_parquet(tmp_path, engine='pyarrow', compression=compression, index=False)
+        # The records are deleted from the store next; the file must be on disk first
+        with open(tmp_path, 'r+b') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        timestamps = [when for _, when, _ in rows if when]
+        files[relative] = {
+            'vehicle': vehicle,
+            'month': month,
+            'rows': len(rows),
+            'first_key': rows[0][0],
+            'last_key': rows[-1][0],
+            'start': min(timestamps, default=''),
+            'end': max(timestamps, default=''),
+            'source': source,
+            'bytes': os.path.getsize(path)
+        }
+    return files
+
+def compact(history, archive_dir, checkpoint, checkpoint_path,
+            page_records=PAGE_RECORDS, delete_batch_records=DELETE_BATCH_RECORDS,
+            compression=PARQUET_COMPRESSION):
+    """Archive and delete every record of history's partitions, page by page"""
+    manifest_path = os.path.join(archive_dir, MANIFEST_FILE)
+    manifest = read_json(manifest_path, {'files': {}})
+    start = time.perf_counter()
+    archived = 0
+
+    pending = checkpoint.get('pending')
+    if pending:
+        print(f"♻ Deleting {len(pending['ids'])} records archived by the interrupted run")
+        history.delete(pending['partition'], pending['ids'], delete_batch_records)
+        checkpoint['archived'] += len(pending['ids'])
+        checkpoint['pending'] = None
+        write_json(checkpoint_path, checkpoint)
+
+    done = set(checkpoint['done'])
+    for partition in history.partitions():
+        if partition in done:
+            continue
+        while True:
+            records = history.page(partition, page_records)
+            if not records:
+                break
+            manifest['files'].update(write_page(archive_dir, records, partition, compression))
+            write_json(manifest_path, manifest)
+            ids = [record_id for record_id, _, _ in records]
+            checkpoint['pending'] = {'partition': partition, 'ids': ids}
+            write_json(checkpoint_path, checkpoint)
+
+            history.delete(partition, ids, delete_batch_records)
+            archived += len(records)
+            checkpoint['archived'] += len(records)
+            checkpoint['pending'] = None
+            write_json(checkpoint_path, checkpoint)
+            print(f"⏳ Archived {archived} records "
+                  f"({archived / (time.perf_counter() - start):,.0f} records/s)")
+        checkpoint['done'].append(partition)
+        write_json(checkpoint_path, checkpoint)
+
+    checkpoint['complete'] = True
+    write_json(checkpoint_path, checkpoint)
+    return archived
+
+def query_archive(archive_dir, vehicle_id, start=None, end=None):
+    """Archived records of a vehicle with start <= sample_time < end
+    (ISO strings, either may be None), oldest first"""
+    manifest = read_json(os.path.join(archive_dir, MANIFEST_FILE), {'files': {}})
+    vehicle = firebase_key(vehicle_id)
+    frames = []
+    for relative, info in manifest['files'].items():
+        if info['vehicle'] != vehicle:
+            continue
+        if (end is not None and info['start'] >= end) or (start is not None and info['end'] < start):
+            continue
+        frames.append(pd.read_parquet(os.path.join(archive_dir, relative)))
+    if not frames:
+        return pd.DataFrame()
+
+    frame = pd.concat(frames, ignore_index=True)
+    timestamps = frame['sample_time'].astype(str)
+    mask = pd.Series(True, index=frame.index)
+    if start is not None:
+        mask &= timestamps >= start
+    if end is not None:
+        mask &= timestamps < end
+    return frame[mask].sort_values(['sample_time', 'key'], kind='stable').reset_index(drop=True)
+
+# ==================== MAIN ====================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Archive old history records to Parquet and delete them")
+    parser.add_argument('--store', choices=('firebase', 'sqlite'), default='firebase',
+                        help="store to compact (default: firebase)")
+    parser.add_argument('--sqlite-path', default=None, help="database of --store sqlite")
+    parser.add_argument('--days', type=int, default=RETENTION_DAYS,
+                        help=f"keep this many days of history (default: {RETENTION_DAYS})")
+    parser.add_argument('--archive', default=ARCHIVE_DIR, help=f"archive directory (default: {ARCHIVE_DIR})")
+    parser.add_argument('--page-records', type=int, default=PAGE_RECORDS,
+                        help=f"records read per page (default: {PAGE_RECORDS})")
+    parser.add_argument('--delete-batch', type=int, default=DELETE_BATCH_RECORDS,
+                        help=f"records deleted per update (default: {DELETE_BATCH_RECORDS})")
+    parser.add_argument('--compression', default=PARQUET_COMPRESSION,
+                        help=f"Parquet codec (default: {PARQUET_COMPRESSION})")
+    parser.add_argument('--no-legacy', action='store_true',
+                        help=f"leave the flat {LEGACY_HISTORY_PATH} list alone")
+    parser.add_argument('--restart', action='store_true',
+                        help="ignore an unfinished checkpoint and start a new run")
+    parser.add_argument('--query', metavar='VEHICLE', help="read archived records instead of compacting")
+    parser.add_argument('--start', help="--query: first sample time (ISO)")
+    parser.add_argument('--end', help="--query: end sample time (ISO, exclusive)")
+    parser.add_argument('--output', help="--query: write the records to this CSV")
+    return parser.parse_args(argv)
+
+def run_query(args):
+    frame = query_archive(args.archive, args.query, args.start, args.end)
+    print(f"📊 {len(frame)} archived records of {args.query}")
+    if args.output:
+        frame.to_csv(args.output, index=False)
+        print(f"✓ Written to {args.output}")
+    elif len(frame):
+        print(frame[[c for c in ('sample_time', 'battery.soc', 'battery.soh', 'rul_prediction.value')
+                     if c in frame]].to_string(max_rows=20))
+
+def main():
+    args = parse_args()
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        print(f"✗ Parquet support is not installed: {e} (pip install pyarrow)")
+        sys.exit(1)
+    if args.query:
+        run_query(args)
+        return
+
+    import mqtt_lstm_firebase as subscriber
+
+    os.makedirs(args.archive, exist_ok=True)
+    checkpoint_path = os.path.join(args.archive, f"checkpoint-{args.store}.json")
+    checkpoint = read_json(checkpoint_path)
+    if checkpoint is None or checkpoint.get('complete') or args.restart:
+        cutoff = datetime.now() - timedelta(days=args.days)
+        checkpoint = {'cutoff': cutoff.isoformat(), 'done': [], 'pending': None,
+                      'archived': 0, 'complete': False}
+    else:
+        print(f"♻ Resuming the run with horizon {checkpoint['cutoff']} "
+              f"({checkpoint['archived']} records archived so far)")
+    cutoff = datetime.fromisoformat(checkpoint['cutoff'])
+
+    if args.store == 'sqlite':
+        store = SqliteStore(args.sqlite_path or subscriber.SQLITE_PATH)
+        history = SqliteHistory(store, cutoff)
+    else:
+        if not subscriber.initialize_firebase():
+            print("⚠ Firebase initialization failed. Exiting...")
+            sys.exit(1)
+        history = FirebaseHistory(subscriber.db, subscriber.FIREBASE_HISTORY_PATH,
+                                  None if args.no_legacy else LEGACY_HISTORY_PATH, cutoff)
+
+    print(f"🗄 Archiving {args.store} records from before {cutoff:%Y-%m-%d %H:%M} to {args.archive}")
+    try:
+        archived = compact(history, args.archive, checkpoint, checkpoint_path,
+                           args.page_records, args.delete_batch, args.compression)
+        print(f"✓ Archived and deleted {archived} records")
+    except Exception as e:
+        print(f"✗ Compaction error: {e} (rerun to resume from the checkpoint)")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Export best_rul_model.keras for the TFLite, ONNX and NumPy inference
+backends and verify that the exported models agree with Keras.
+
+The recurrent layers are rebuilt unrolled over the (fixed) sequence length
+before conversion, which turns each LSTM/GRU into plain matrix operations:
+the exported models then run with builtin TFLite/ONNX ops only and accept
+any batch size. The NumPy backend only needs the weights (numpy_engine.py).
+
+Parity is checked on held-out windows - the last rows of
+Dataset/Streaming.csv, which the model was not trained on - or on random
+scaled windows when the CSV is not available (Git LFS pointer).
+
+    python export_model.py                        # every format
+    python export_model.py --formats tflite --windows 2000
+"""
+
+import argparse
+import os
+import pickle
+import sys
+import warnings
+warnings.filterwarnings('ignore')
+
+import numpy as np
+import pandas as pd
+
+from features import FeatureProjector, DEFAULT_TIMESTAMP_ORIGIN, parse_timestamps
+from ring_buffer import fold_robust_scaler
+from codec import PACKED_KEYS
+from inference import load_backend
+from numpy_engine import extract_weights
+
+MODEL_PATH = "best_rul_model.keras"
+PREPROCESSING_PATH = "preprocessing_data.pkl"
+TFLITE_MODEL_PATH = "best_rul_model.tflite"
+ONNX_MODEL_PATH = "best_rul_model.onnx"
+NUMPY_MODEL_PATH = "best_rul_model.npz"
+HELD_OUT_CSV_PATH = "../Dataset/Streaming.csv"
+ONNX_OPSET = 13
+
+# Largest acceptable |exported - keras| prediction difference, in cycles
+PARITY_TOLERANCE = 0.01
+
+def unrolled_model(keras_model):
+    """Copy of keras_model with every recurrent layer unrolled"""
+    import tensorflow as tf
+
+    def clone_layer(layer):
+        config = layer.get_config()
+        if 'unroll' in config:
+            config['unroll'] = True
+        return layer.__class__.from_config(config)
+
+    unrolled = tf.keras.models.clone_model(keras_model, clone_function=clone_layer)
+    unrolled.set_weights(keras_model.get_weights())
+    return unrolled
+
+def export_tflite(unrolled, path):
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_keras_model(unrolled)
+    with open(path, 'wb') as f:
+        f.write(converter.convert())
+
+def export_onnx(unrolled, path):
+    import tensorflow as tf
+    try:
+        import tf2onnx
+    except ImportError as e:
+        raise ImportError(f"ONNX export needs tf2onnx: {e}") from e
+    _, seq_len, n_features = unrolled.input_shape
+    spec = tf.TensorSpec([None, seq_len, n_features], tf.float32, name='windows')
+    function = tf.function(lambda windows: unrolled(windows, training=False))
+    tf2onnx.convert.from_function(function, input_signature=[spec], opset=ONNX_OPSET,
+                                  output_path=path)
+
+EXPORTERS = {'tflite': export_tflite, 'onnx': export_onnx, 'numpy': extract_weights}
+
+def held_out_windows(csv_path, n_windows, seq_len, preprocessing_data):
+    """Scaled model windows from the end of csv_path, or random ones if unavailable"""
+    feature_names = preprocessing_data['feature_names']
+    try:
+        with open(csv_path, 'rb') as f:
+            if f.read(40).startswith(b'version https://git-lfs'):
+                raise OSError("Git LFS pointer")
+        chunk = pd.read_csv(csv_path, usecols=range(1 + len(PACKED_KEYS)))
+        chunk = chunk.iloc[-(n_windows + seq_len - 1):]
+    except OSError as e:
+        print(f"⚠ {csv_path} not available ({e}); checking parity on random windows")
+        rng = np.random.default_rng(0)
+        return rng.standard_normal((n_windows, seq_len, len(feature_names))).astype(np.float32)
+
+    projector = FeatureProjector(feature_names,
+                                 preprocessing_data.get('timestamp_origin', DEFAULT_TIMESTAMP_ORIGIN))
+    center, scale = fold_robust_scaler(preprocessing_data['scaler'], len(feature_names))
+    raw = projector.project_batch(PACKED_KEYS, chunk.iloc[:, 1:].to_numpy(dtype=np.float64),
+                                  parse_timestamps(chunk.iloc[:, 0].astype(str).tolist()))
+    rows = (raw - center) / scale
+    windows = np.lib.stride_tricks.sliding_window_view(rows, seq_len, axis=0).transpose(0, 2, 1)
+    print(f"✓ {len(windows)} held-out windows from {csv_path}")
+    return np.ascontiguousarray(windows, dtype=np.float32)
+
+def check_parity(name, path, windows, reference, tolerance):
+    """Score windows with an exported model and compare against Keras"""
+    backend = load_backend(name, path)
+    preds = backend.predict(windows, batch_size=256)
+    difference = np.abs(preds - reference)
+    passed = difference.max() <= tolerance
+    mark = '✓' if passed else '✗'
+    print(f"{mark} {name:7s} max |Δ| {difference.max():.2e} cycles, "
+          f"mean |Δ| {difference.mean():.2e} (tolerance {tolerance:g})")
+    return passed
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export the RUL model for the inference backends")
+    parser.add_argument('--model', default=MODEL_PATH, help=f"Keras model (default: {MODEL_PATH})")
+    parser.add_argument('--formats', nargs='+', choices=sorted(EXPORTERS), default=sorted(EXPORTERS))
+    parser.add_argument('--tflite-output', default=TFLITE_MODEL_PATH)
+    parser.add_argument('--onnx-output', default=ONNX_MODEL_PATH)
+    parser.add_argument('--numpy-output', default=NUMPY_MODEL_PATH)
+    parser.add_argument('--csv', default=HELD_OUT_CSV_PATH, help="CSV the held-out windows come from")
+    parser.add_argument('--windows', type=int, default=1000, help="held-out windows to compare on")
+    parser.add_argument('--tolerance', type=float, default=PARITY_TOLERANCE,
+                        help=f"largest acceptable prediction difference (default: {PARITY_TOLERANCE})")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    from tensorflow.keras.models import load_model
+
+    keras_model = load_model(args.model)
+    print(f"✓ Model loaded from {args.model}")
+    with open(PREPROCESSING_PATH, 'rb') as f:
+        preprocessing_data = pickle.load(f)
+    windows = held_out_windows(args.csv, args.windows, preprocessing_data['seq_len'],
+                               preprocessing_data)
+    reference = load_backend('keras', args.model).predict(windows, batch_size=256)
+    unrolled = unrolled_model(keras_model)
+
+    outputs = {'tflite': args.tflite_output, 'onnx': args.onnx_output, 'numpy': args.numpy_output}
+    failed = False
+    for name in args.formats:
+        path = outputs[name]
+        try:
+            EXPORTERS[name](unrolled, path)
+            print(f"✓ Exported {name} model to {path} ({os.path.getsize(path) / 1024:.0f} KiB)")
+            failed |= not check_parity(name, path, windows, reference, args.tolerance)
+        except ImportError as e:
+            print(f"⚠ Skipping {name}: {e} (pip install tf2onnx onnxruntime)")
+        except Exception as e:
+            failed = True
+            print(f"✗ {name} export error: {e}")
+            import traceback
+            traceback.print_exc()
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
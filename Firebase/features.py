@@ -0,0 +1,217 @@
+"""
+Feature building for the RUL subscriber.
+
+FeatureProjector is compiled once from the model's feature_names and maps
+MQTT payload dicts straight into a float32 feature row: payload keys,
+column indices, defaults and the per-feature scale (x100 for the
+percentage features sent as 0-1 fractions) are all precomputed. Multi-row
+messages are projected as one 2-D array with project_batch.
+
+Timestamps are parsed by a fixed-format parser instead of pd.to_datetime.
+The Timestamp feature reproduces the training notebook's transform:
+minutes since the first row of the dataset.
+"""
+
+from datetime import date, datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+# Model feature name -> MQTT payload key
+PAYLOAD_KEYS = {
+    'SoC': 'soc',
+    'SoH': 'soh',
+    'Battery_Voltage': 'battery_voltage',
+    'Battery_Current': 'battery_current',
+    'Battery_Temperature': 'battery_temperature',
+    'Charge_Cycles': 'charge_cycles',
+    'Motor_Temperature': 'motor_temperature',
+    'Motor_Vibration': 'motor_vibration',
+    'Motor_Torque': 'motor_torque',
+    'Motor_RPM': 'motor_rpm',
+    'Power_Consumption': 'power_consumption',
+    'Brake_Pad_Wear': 'brake_pad_wear',
+    'Brake_Pressure': 'brake_pressure',
+    'Reg_Brake_Efficiency': 'reg_brake_efficiency',
+    'Tire_Pressure': 'tire_pressure',
+    'Tire_Temperature': 'tire_temperature',
+    'Suspension_Load': 'suspension_load',
+    'Ambient_Temperature': 'ambient_temperature',
+    'Ambient_Humidity': 'ambient_humidity',
+    'Load_Weight': 'load_weight',
+    'Driving_Speed': 'driving_speed',
+    'Distance_Traveled': 'distance_traveled',
+    'Idle_Time': 'idle_time',
+    'Route_Roughness': 'route_roughness'
+}
+
+# Sent by the device as 0-1 fractions, trained on as 0-100 percentages
+PERCENT_FEATURES = ('SoC', 'SoH', 'Reg_Brake_Efficiency')
+
+TIMESTAMP_FORMAT = '%d-%m-%Y %H:%M'
+
+# Training converted Timestamp to minutes since the first row of the dataset
+# (January 2020); preprocessing_data can override this with 'timestamp_origin'
+DEFAULT_TIMESTAMP_ORIGIN = '01-01-2020 00:00'
+
+# ==================== TIMESTAMP PARSING ====================
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Epoch seconds at midnight, keyed by the 'dd-mm-YYYY' part of a timestamp;
+# consecutive readings almost always share it
+_date_cache = {}
+_DATE_CACHE_SIZE = 512
+
+# Whole years inside the range a nanosecond pandas Timestamp can hold
+# (1677-09-21 to 2262-04-11); dates outside it are treated as invalid
+MIN_YEAR = 1678
+MAX_YEAR = 2261
+
+def _digits(text, max_len):
+    return 0 < len(text) <= max_len and text.isdigit()
+
+def parse_timestamp(timestamp_str):
+    """Epoch seconds of a 'dd-mm-YYYY HH:MM' string, or None if invalid
+    
+    Matches pd.to_datetime(timestamp_str, format=TIMESTAMP_FORMAT).timestamp()
+    (the time is taken as UTC, like a timezone-naive pandas Timestamp). The
+    year must have exactly four digits and lie in MIN_YEAR..MAX_YEAR.
+    """
+    try:
+        if timestamp_str[:1].isspace() or timestamp_str[-1:].isspace():
+            return None
+        date_part, time_part = timestamp_str.split()
+        day_seconds = _date_cache.get(date_part)
+        if day_seconds is None:
+            day, month, year = date_part.split('-')
+            if not (_digits(day, 2) and _digits(month, 2) and len(year) == 4 and year.isdigit()):
+                return None
+            if not MIN_YEAR <= int(year) <= MAX_YEAR:
+                return None
+            day_seconds = (date(int(year), int(month), int(day)).toordinal() - _EPOCH_ORDINAL) * 86400
+            if len(_date_cache) >= _DATE_CACHE_SIZE:
+                _date_cache.clear()
+            _date_cache[date_part] = day_seconds
+        hour, minute = time_part.split(':')
+        if not (_digits(hour, 2) and _digits(minute, 2)):
+            return None
+        hour = int(hour)
+        minute = int(minute)
+        if hour > 23 or minute > 59:
+            return None
+        return float(day_seconds + hour * 3600 + minute * 60)
+    except (ValueError, AttributeError, TypeError):
+        return None
+
+def parse_timestamps(timestamp_strs):
+    """Vectorized parse_timestamp: float64 epoch seconds, NaN where invalid"""
+    parsed = pd.to_datetime(pd.Series(timestamp_strs, dtype=object),
+                            format=TIMESTAMP_FORMAT, errors='coerce')
+    # Newer pandas parses out-of-range years at a coarser resolution; they
+    # would overflow the nanosecond subtraction below
+    parsed = parsed.where(parsed.dt.year.between(MIN_YEAR, MAX_YEAR))
+    return (parsed - pd.Timestamp(0)).dt.total_seconds().to_numpy(dtype=np.float64)
+
+def sample_epoch(timestamp_str):
+    """Epoch seconds of a device timestamp read as local wall-clock time, or None
+
+    The device sends local time without a zone; rollup buckets and history
+    shards are laid out in local time as well.
+    """
+    seconds = parse_timestamp(timestamp_str)
+    if seconds is None:
+        return None
+    return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None).timestamp()
+
+def sample_day(timestamp_str):
+    """'YYYY-MM-DD' of a device timestamp, or None if invalid"""
+    seconds = parse_timestamp(timestamp_str)
+    if seconds is None:
+        return None
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime('%Y-%m-%d')
+
+class FeatureProjector:
+    """Maps payload dicts onto the model's feature vector"""
+
+    def __init__(self, feature_names, timestamp_origin=DEFAULT_TIMESTAMP_ORIGIN):
+        self.feature_names = list(feature_names)
+        self.n_features = len(self.feature_names)
+
+        indices = []
+        keys = []
+        self.defaults = np.zeros(self.n_features, dtype=np.float32)
+        self.scale = np.ones(self.n_features, dtype=np.float32)
+        for index, name in enumerate(self.feature_names):
+            if name in PAYLOAD_KEYS:
+                indices.append(index)
+                keys.append(PAYLOAD_KEYS[name])
+            if name in PERCENT_FEATURES:
+                self.scale[index] = 100.0
+        # Maintenance_Type and any feature the payload does not carry keep
+        # their default of 0
+
+        self.payload_keys = tuple(keys)
+        self.indices = np.array(indices, dtype=np.intp)
+        # Contiguous ascending columns can be filled with a single slice
+        # assignment instead of fancy indexing
+        if indices and indices == list(range(indices[0], indices[0] + len(indices))):
+            self.target = slice(indices[0], indices[0] + len(indices))
+        else:
+            self.target = self.indices
+        self.timestamp_index = (self.feature_names.index('Timestamp')
+                                if 'Timestamp' in self.feature_names else -1)
+        self.timestamp_origin = parse_timestamp(timestamp_origin)
+        if self.timestamp_origin is None:
+            raise ValueError(f"Invalid timestamp origin: {timestamp_origin!r}")
+        # (source columns, feature indices, scale) per batch column layout
+        self._batch_layouts = {}
+
+    def project(self, payload, out=None):
+        """Fill out (or a new float32 row) with the features of one payload"""
+        row = np.empty(self.n_features, dtype=np.float32) if out is None else out
+        row[:] = self.defaults
+        get = payload.get
+        row[self.target] = [get(key, 0.0) for key in self.payload_keys]
+        np.multiply(row, self.scale, out=row)
+        if self.timestamp_index >= 0:
+            row[self.timestamp_index] = self.timestamp_feature(payload.get('timestamp', ''))
+        return row
+
+    def project_batch(self, columns, values, timestamps, out=None):
+        """Feature rows for a whole batch at once
+        
+        values is an (n_rows, len(columns)) array of sensor values named by
+        the payload keys in columns, timestamps float64 epoch seconds (NaN
+        where missing). Fills out (or a new float32 array) of shape
+        (n_rows, n_features).
+        """
+        n_rows = len(values)
+        rows = np.empty((n_rows, self.n_features), dtype=np.float32) if out is None else out
+        rows[:] = self.defaults
+        source, target, scale = self._batch_layout(tuple(columns))
+        if len(target):
+            rows[:, target] = values[:, source] * scale
+        if self.timestamp_index >= 0:
+            minutes = (np.asarray(timestamps, dtype=np.float64) - self.timestamp_origin) / 60.0
+            rows[:, self.timestamp_index] = np.nan_to_num(minutes, nan=0.0)
+        return rows
+
+    def _batch_layout(self, columns):
+        layout = self._batch_layouts.get(columns)
+        if layout is None:
+            position = {key: i for i, key in enumerate(columns)}
+            pairs = [(position[key], index)
+                     for key, index in zip(self.payload_keys, self.indices) if key in position]
+            source = np.array([column for column, _ in pairs], dtype=np.intp)
+            target = np.array([index for _, index in pairs], dtype=np.intp)
+            layout = (source, target, self.scale[target])
+            self._batch_layouts[columns] = layout
+        return layout
+
+    def timestamp_feature(self, timestamp_str):
+        """Timestamp feature: minutes since the dataset origin (0 if missing/invalid)"""
+        seconds = parse_timestamp(timestamp_str) if timestamp_str else None
+        if seconds is None:
+            return 0.0
+        return (seconds - self.timestamp_origin) / 60.0
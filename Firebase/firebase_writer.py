@@ -0,0 +1,291 @@
+"""
+Batched Firebase Realtime Database writer for the RUL subscriber.
+
+Instead of push() + set() (+ push() for alerts) per sensor row, records are
+collected in memory and written with a single multi-location update() on the
+database root, flushed every FLUSH_RECORDS records or FLUSH_INTERVAL_MS
+milliseconds, whichever comes first. History keys are generated client-side
+in the same format as push(), so they keep chronological ordering. With
+shard_history, rows are stored under history_path/<vehicle>/<YYYY-MM-DD>/
+(the day of their sample timestamp, or of the upload when the sample has
+none) instead of one flat list. Other
+path -> value updates, such as closed rollup buckets, can be queued with
+add_updates() and are written in the same update().
+
+With latest_tolerances, the latest node is not rewritten whole on every
+flush: only the leaves that changed since the last successful write (beyond
+their tolerance, see snapshot_delta.py) are sent as latest_path/<leaf>
+paths, so the stored document keeps its shape.
+
+With a WriteAheadSpool attached, every record is appended to the spool
+before it is queued, and the spool is acknowledged only after Firebase
+accepts the update. When a write fails the writer switches to replay mode:
+in-memory records are discarded (they are already on disk), new records go
+to the spool only, and the backlog is drained from the spool in large
+batched updates until it catches up, after which live batching resumes.
+"""
+
+import random
+import threading
+import time
+
+from features import sample_day
+from rollups import firebase_key
+from snapshot_delta import SnapshotDelta
+
+# Firebase push-id alphabet (ordered by ASCII value)
+PUSH_CHARS = '-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz'
+
+_push_lock = threading.Lock()
+_last_push_time = 0
+_last_random_chars = [0] * 12
+
+def generate_push_id():
+    """Generate a chronologically ordered key, identical in format to ref.push()"""
+    global _last_push_time
+
+    with _push_lock:
+        now = int(time.time() * 1000)
+        duplicate_time = now <= _last_push_time
+        if duplicate_time:
+            # Same (or earlier) millisecond: keep the time and increment the
+            # random part so keys stay unique and ordered
+            now = _last_push_time
+            for i in range(11, -1, -1):
+                if _last_random_chars[i] != 63:
+                    _last_random_chars[i] += 1
+                    break
+                _last_random_chars[i] = 0
+        else:
+            for i in range(12):
+                _last_random_chars[i] = random.randrange(64)
+        _last_push_time = now
+
+        time_chars = []
+        for _ in range(8):
+            time_chars.append(PUSH_CHARS[now % 64])
+            now //= 64
+        return ''.join(reversed(time_chars)) + ''.join(PUSH_CHARS[c] for c in _last_random_chars)
+
+class FirebaseBatchWriter:
+    """Coalesces history rows, the latest node and alerts into one update()"""
+
+    def __init__(self, database, history_path='ev_battery_data',
+                 latest_path='ev_battery_data/latest', alerts_path='alerts',
+                 flush_records=50, flush_interval_ms=1000, spool=None,
+                 replay_batch_records=2000, replay_retry_ms=5000, flush_latency=None,
+                 shard_history=False, latest_tolerances=None):
+        self.database = database
+        self.history_path = history_path
+        self.shard_history = shard_history
+        self.latest_path = latest_path
+        # Last written latest document (None: rewrite it whole every flush)
+        self.latest_delta = SnapshotDelta(latest_tolerances) if latest_tolerances is not None else None
+        self.alerts_path = alerts_path
+        self.flush_records = flush_records
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.spool = spool
+        self.replay_batch_records = replay_batch_records
+        self.replay_retry = replay_retry_ms / 1000.0
+        # Optional metrics.LatencyHistogram timing each update() call
+        self.flush_latency = flush_latency
+
+        self.pending = []
+        self.pending_position = None
+        self.first_pending = 0.0
+        self.flushed_records = 0
+        self.flush_count = 0
+        self.errors = 0
+
+        # Start by draining anything a previous run left unacknowledged
+        self.replaying = spool is not None and spool.backlog()
+        if self.replaying:
+            print("⏳ Unsent records found in spool, replaying...")
+
+        self.running = True
+        self.condition = threading.Condition()
+        # Held from taking a batch until its update() returns, so batches
+        # flushed by flush() and by the writer thread land in order
+        self.write_lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name="firebase-writer", daemon=True)
+        self.thread.start()
+
+    def add(self, data_entry, alert=None, alert_key=None):
+        """Queue a history row (and optional alert); returns the row's key
+
+        An alert is written to alerts/<alert_key>, replacing what is there,
+        so an existing alert can be updated in place; without a key it is
+        added as a new alert.
+        """
+        record = {'key': generate_push_id(), 'entry': data_entry}
+        if alert is not None:
+            alert['data_key'] = record['key']
+            record['alert_key'] = alert_key or generate_push_id()
+            record['alert'] = alert
+        self._queue(record)
+        return record['key']
+
+    def _queue(self, record):
+        with self.condition:
+            position = self.spool.append(record) if self.spool is not None else None
+            if self.replaying:
+                # Already durable; the replay loop will pick it up from the spool
+                return
+            if not self.pending:
+                self.first_pending = time.monotonic()
+            self.pending.append(record)
+            self.pending_position = position
+            if len(self.pending) >= self.flush_records:
+                self.condition.notify()
+
+    def add_updates(self, updates):
+        """Queue a {path: value} update to be written with the next flush"""
+        self._queue({'updates': updates})
+
+    def flush(self):
+        """Write everything pending in a single multi-location update"""
+        with self.write_lock:
+            with self.condition:
+                records, position = self._take_pending()
+            self._write_live(records, position)
+
+    def stop(self):
+        """Flush what is pending and stop the background thread"""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+
+    def build_updates(self, records):
+        """Multi-location update for a list of records; latest is written once
+
+        Returns (updates, latest_changes); latest_changes is what to commit
+        to latest_delta once the update has been written.
+        """
+        updates = {}
+        latest = None
+        for record in records:
+            if 'updates' in record:
+                updates.update(record['updates'])
+                continue
+            latest = record['entry']
+            updates[self.history_key(record)] = latest
+            if 'alert' in record:
+                updates[f"{self.alerts_path}/{record['alert_key']}"] = record['alert']
+        latest_changes = None
+        if latest is not None:
+            if self.latest_delta is None:
+                updates[self.latest_path] = latest
+            else:
+                latest_changes = self.latest_delta.diff(latest)
+                for path, value in latest_changes.items():
+                    updates[f"{self.latest_path}/{path}" if path else self.latest_path] = value
+        return updates, latest_changes
+
+    def history_key(self, record):
+        """Database path of a record's history row"""
+        if not self.shard_history:
+            return f"{self.history_path}/{record['key']}"
+        entry = record['entry']
+        vehicle = firebase_key(entry.get('vehicle_id') or 'default')
+        day = (sample_day(entry.get('timestamp'))
+               or str(entry.get('upload_timestamp', ''))[:10] or 'unknown')
+        return f"{self.history_path}/{vehicle}/{day}/{record['key']}"
+
+    def _take_pending(self):
+        records, position = self.pending, self.pending_position
+        self.pending = []
+        self.pending_position = None
+        return records, position
+
+    def _write(self, records):
+        start = time.perf_counter_ns()
+        updates, latest_changes = self.build_updates(records)
+        self.database.reference('/').update(updates)
+        if latest_changes:
+            self.latest_delta.commit(latest_changes)
+        if self.flush_latency is not None:
+            self.flush_latency.since(start)
+        self.flushed_records += len(records)
+        self.flush_count += 1
+
+    def _write_live(self, records, position):
+        if not records:
+            return
+        try:
+            if self.spool is not None:
+                self.spool.sync()
+            self._write(records)
+            if self.spool is not None:
+                self.spool.ack(position)
+            print(f"✓ Flushed {len(records)} records to Firebase in one update")
+        except Exception as e:
+            self.errors += 1
+            print(f"✗ Firebase upload error: {e}")
+            if self.spool is not None:
+                print(f"⏳ Spooling records locally until Firebase is reachable again")
+                with self.condition:
+                    self.replaying = True
+                    # Pending records are already in the spool
+                    self.pending = []
+                    self.pending_position = None
+                    self.condition.notify()
+            else:
+                import traceback
+                traceback.print_exc()
+
+    def _replay_step(self):
+        """Send one batch of spooled records; returns False if the write failed"""
+        with self.write_lock:
+            return self._replay_batch()
+
+    def _replay_batch(self):
+        batch = self.spool.read(max_records=self.replay_batch_records)
+        if not batch:
+            with self.condition:
+                # Re-check under the lock so no concurrent add() slips between
+                # the last replayed record and the switch back to live mode
+                if not self.spool.read(max_records=1):
+                    self.replaying = False
+                    print("✓ Spool backlog drained, resuming live writes")
+            return True
+        try:
+            self._write([record for _, record in batch])
+            self.spool.ack(batch[-1][0])
+            print(f"✓ Replayed {len(batch)} spooled records to Firebase")
+            return True
+        except Exception as e:
+            self.errors += 1
+            print(f"✗ Spool replay error: {e}")
+            return False
+
+    def _run(self):
+        while True:
+            with self.condition:
+                # A failed flush() on another thread switches to replay mode
+                while self.running and not self.pending and not self.replaying:
+                    self.condition.wait()
+                while self.running and not self.replaying and len(self.pending) < self.flush_records:
+                    remaining = self.first_pending + self.flush_interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                replaying = self.replaying
+                running = self.running
+
+            if replaying:
+                if not self._replay_step():
+                    if not running:
+                        # Leave the backlog in the spool for the next start
+                        return
+                    with self.condition:
+                        self.condition.wait(self.replay_retry)
+                elif not running and not self.replaying:
+                    return
+            else:
+                with self.write_lock:
+                    with self.condition:
+                        records, position = self._take_pending()
+                    self._write_live(records, position)
+                if not running and not self.replaying:
+                    return
@@ -0,0 +1,36 @@
+"""
+Consistent hash ring for assigning vehicles to subscriber workers.
+
+Each node is placed on the ring at `replicas` pseudo-random points; a key
+belongs to the node owning the first point at or after the key's hash.
+Hashes come from BLAKE2b rather than hash(), which is salted per process
+and would give every worker a different ring. Adding or removing one of N
+nodes moves only about 1/N of the keys.
+"""
+
+import bisect
+import hashlib
+
+def stable_hash(text):
+    """64-bit hash of a string, identical in every process"""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big')
+
+class HashRing:
+    """Maps keys (vehicle ids) to nodes (worker indices)"""
+
+    def __init__(self, nodes, replicas=100):
+        points = sorted((stable_hash(f"{node}#{replica}"), node)
+                        for node in nodes for replica in range(replicas))
+        if not points:
+            raise ValueError("A hash ring needs at least one node")
+        self.hashes = [point for point, _ in points]
+        self.nodes = [node for _, node in points]
+        # Vehicles are looked up on every message; the fleet is bounded
+        self._owners = {}
+
+    def owner(self, key):
+        node = self._owners.get(key)
+        if node is None:
+            position = bisect.bisect_left(self.hashes, stable_hash(key)) % len(self.hashes)
+            node = self._owners[key] = self.nodes[position]
+        return node
@@ -0,0 +1,142 @@
+"""
+Inference backends for the RUL model.
+
+Every backend loads one exported form of best_rul_model.keras and scores
+scaled windows of shape (n_windows, seq_len, n_features):
+
+  keras   TensorFlow/Keras, called through a traced tf.function (avoids
+          model.predict's per-call setup, ~100 ms even for one window)
+  tflite  TensorFlow Lite interpreter (tflite_runtime if installed, else
+          tf.lite); XNNPACK-accelerated on CPU
+  onnx    ONNX Runtime, CPU execution provider
+  numpy   pure-NumPy LSTM/GRU forward pass (numpy_engine.py), no
+          TensorFlow at all
+
+Only the keras backend imports TensorFlow's full runtime. The .tflite,
+.onnx and .npz files are produced (and checked for parity against Keras)
+by export_model.py.
+
+    backend = load_backend('tflite', 'best_rul_model.tflite')
+    preds = backend.predict(windows)   # float32, one RUL per window
+"""
+
+import threading
+
+import numpy as np
+
+BACKENDS = ('keras', 'tflite', 'onnx', 'numpy')
+
+class KerasBackend:
+    """Keras model called directly in a traced tf.function"""
+
+    name = 'keras'
+
+    def __init__(self, model_path, threads=None):
+        import tensorflow as tf
+        from tensorflow.keras.models import load_model
+        if threads:
+            tf.config.threading.set_intra_op_parallelism_threads(threads)
+        self.keras_model = load_model(model_path)
+        _, seq_len, n_features = self.keras_model.input_shape
+        # One trace for every batch size
+        self._call = tf.function(lambda windows: self.keras_model(windows, training=False),
+                                 input_signature=[tf.TensorSpec([None, seq_len, n_features],
+                                                                tf.float32)])
+        self.input_shape = (seq_len, n_features)
+
+    def predict(self, windows, batch_size=None):
+        """RUL per window as a float32 array"""
+        return _in_batches(lambda batch: self._call(batch).numpy(), windows, batch_size)
+
+class TFLiteBackend:
+    """TensorFlow Lite interpreter, resized to each batch size on demand"""
+
+    name = 'tflite'
+
+    def __init__(self, model_path, threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+        self.interpreter = Interpreter(model_path=model_path, num_threads=threads)
+        self.input_index = self.interpreter.get_input_details()[0]['index']
+        self.output_index = self.interpreter.get_output_details()[0]['index']
+        self.input_shape = tuple(self.interpreter.get_input_details()[0]['shape'][1:])
+        self.batch_rows = 0
+        # The interpreter holds one set of tensors; calls are serialised
+        self.lock = threading.Lock()
+
+    def predict(self, windows, batch_size=None):
+        """RUL per window as a float32 array"""
+        return _in_batches(self._invoke, windows, batch_size)
+
+    def _invoke(self, batch):
+        with self.lock:
+            if len(batch) != self.batch_rows:
+                # Reallocating costs ~1 ms, so only on a change of batch size
+                self.interpreter.resize_tensor_input(self.input_index, [len(batch), *self.input_shape])
+                self.interpreter.allocate_tensors()
+                self.batch_rows = len(batch)
+            self.interpreter.set_tensor(self.input_index, np.ascontiguousarray(batch, dtype=np.float32))
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self.output_index).copy()
+
+class OnnxBackend:
+    """ONNX Runtime inference session on the CPU"""
+
+    name = 'onnx'
+
+    def __init__(self, model_path, threads=None):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError(f"The onnx backend needs ONNX Runtime (pip install onnxruntime): {e}") from e
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(model_path, options,
+                                                    providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_shape = tuple(model_input.shape[1:])
+
+    def predict(self, windows, batch_size=None):
+        """RUL per window as a float32 array"""
+        return _in_batches(
+            lambda batch: self.session.run(None, {self.input_name: batch})[0], windows, batch_size)
+
+class NumpyBackend:
+    """NumPy forward pass over weights extracted to an .npz file"""
+
+    name = 'numpy'
+
+    def __init__(self, model_path, threads=None):
+        from numpy_engine import NumpyRecurrentModel
+        # threads is left to NumPy's BLAS library (e.g. OMP_NUM_THREADS)
+        self.engine = NumpyRecurrentModel(model_path)
+        self.input_shape = self.engine.input_shape
+
+    def predict(self, windows, batch_size=None):
+        """RUL per window as a float32 array"""
+        return _in_batches(self.engine.predict, windows, batch_size)
+
+def _in_batches(run, windows, batch_size):
+    """run() over windows in slices of batch_size (all at once if None), flattened"""
+    windows = np.ascontiguousarray(windows, dtype=np.float32)
+    if batch_size is None or len(windows) <= batch_size:
+        return np.asarray(run(windows), dtype=np.float32).reshape(-1)
+    return np.concatenate([np.asarray(run(windows[start:start + batch_size]), dtype=np.float32).reshape(-1)
+                           for start in range(0, len(windows), batch_size)])
+
+def load_backend(name, model_path, threads=None):
+    """Load model_path with the named backend"""
+    if name == 'keras':
+        return KerasBackend(model_path, threads)
+    if name == 'tflite':
+        return TFLiteBackend(model_path, threads)
+    if name == 'onnx':
+        return OnnxBackend(model_path, threads)
+    if name == 'numpy':
+        return NumpyBackend(model_path, threads)
+    raise ValueError(f"Unknown inference backend: {name!r} (expected one of {', '.join(BACKENDS)})")
@@ -0,0 +1,138 @@
+"""
+Incremental JSON reassembly for MQTT payloads.
+
+Messages may arrive split across several MQTT publishes, or several JSON
+objects may arrive concatenated in one. JsonStreamDecoder keeps a byte
+buffer per stream and scans it forward from where the previous fragment
+stopped, jumping from bracket to bracket over complete strings with a
+single regex, so every complete top-level object is extracted as soon as
+its closing bracket arrives. Re-parsing the whole growing buffer after
+every fragment (quadratic in the number of fragments) is never needed.
+
+Complete objects are decoded with orjson when it is installed and with the
+standard json module otherwise (or when orjson rejects input json accepts,
+e.g. NaN or invalid UTF-8).
+"""
+
+import json
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Everything up to the next bracket, or up to a string that is not complete
+# yet: non-structural bytes and complete strings (escapes included), as
+# unrolled loops so a failing match never backtracks
+_SKIP = re.compile(rb'[^"{}\[\]]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"{}\[\]]*)*', re.DOTALL)
+_WHITESPACE = b' \t\r\n'
+
+def loads(data):
+    """Decode one JSON document from bytes (orjson fast path if available)"""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except ValueError:
+            pass
+    return json.loads(bytes(data).decode('utf-8', errors='ignore'))
+
+class JsonStreamDecoder:
+    """Extracts complete top-level JSON values from a stream of byte chunks"""
+
+    def __init__(self, max_buffer=5000):
+        self.max_buffer = max_buffer
+        self.buffer = bytearray()
+        self.errors = 0
+        self.overflows = 0
+        self._reset_scan()
+
+    def __len__(self):
+        """Bytes held for an incomplete value"""
+        return len(self.buffer)
+
+    def reset(self):
+        """Discard any partially received value"""
+        self.buffer.clear()
+        self._reset_scan()
+
+    def feed(self, data):
+        """Add a chunk; returns every value it completes, in order"""
+        # Fast path: a whole document in one message with nothing pending
+        if not self.buffer:
+            stripped = data.strip(_WHITESPACE)
+            if stripped[:1] == b'{' and stripped[-1:] == b'}':
+                try:
+                    return [loads(stripped)]
+                except ValueError:
+                    pass  # Fragment or several values: scan it
+
+        self.buffer += data
+        values = []
+        self._scan(values)
+        if len(self.buffer) > self.max_buffer:
+            self.overflows += 1
+            print(f"⚠ Buffer too large, resetting...")
+            self.reset()
+        return values
+
+    def _reset_scan(self):
+        self.position = 0     # next byte of the buffer to scan
+        self.start = -1       # start of the current value, -1 between values
+        self.depth = 0
+
+    def _scan(self, values):
+        position = self.position
+        if self.start < 0:
+            position = self._skip_to_value(position)
+            if position < 0:
+                return
+
+        while True:
+            position = _SKIP.match(self.buffer, position).end()
+            if position >= len(self.buffer) or self.buffer[position] == 0x22:
+                # End of data, or inside a string: resume from here (the
+                # string's opening quote) when more bytes arrive
+                break
+            if self.buffer[position] in b'{[':
+                self.depth += 1
+                position += 1
+            else:
+                self.depth -= 1
+                position += 1
+                if self.depth <= 0:
+                    self._emit(position, values)
+                    position = self._skip_to_value(0)
+                    if position < 0:
+                        return
+        self.position = position
+
+    def _skip_to_value(self, position):
+        """Drop bytes before the next '{' or '['; returns its index or -1"""
+        buffer = self.buffer
+        starts = [i for i in (buffer.find(b'{', position), buffer.find(b'[', position)) if i >= 0]
+        if not starts:
+            if buffer[position:].strip(_WHITESPACE):
+                self.errors += 1
+                print(f"⚠ Discarding {len(buffer) - position} bytes outside a JSON object")
+            self.reset()
+            return -1
+        start = min(starts)
+        if buffer[position:start].strip(_WHITESPACE):
+            self.errors += 1
+            print(f"⚠ Discarding {start - position} bytes outside a JSON object")
+        del buffer[:start]
+        self._reset_scan()
+        self.start = 0
+        return 0
+
+    def _emit(self, end, values):
+        """Decode buffer[:end] as one value and drop it from the buffer"""
+        document = bytes(self.buffer[:end])
+        del self.buffer[:end]
+        self._reset_scan()
+        try:
+            values.append(loads(document))
+        except ValueError as e:
+            self.errors += 1
+            print(f"✗ Invalid JSON message dropped: {e}")
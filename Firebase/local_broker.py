@@ -0,0 +1,290 @@
+"""
+Minimal embedded MQTT 3.1.1 broker for local load tests.
+
+Enough of the protocol for the subscriber and the fleet load generator to
+run without a network broker: CONNECT, PUBLISH (QoS 0/1/2 in, delivered at
+QoS 0), SUBSCRIBE/UNSUBSCRIBE with + and # wildcards, shared subscriptions
+($share/<group>/<filter>, one member per group gets each message, round
+robin), PINGREQ and DISCONNECT. No retained messages, sessions or auth.
+
+Each connection has a reader thread and a writer thread; messages waiting
+for a slow subscriber are dropped (and counted) once max_queued are queued.
+
+    broker = LocalBroker()
+    port = broker.start()
+    ...
+    broker.stop()
+"""
+
+import socket
+import struct
+import threading
+from collections import deque
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+def encode_length(length):
+    """MQTT variable-length 'remaining length' bytes"""
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        encoded.append(byte)
+        if not length:
+            return bytes(encoded)
+
+def encode_publish(topic, payload):
+    """QoS 0 PUBLISH packet"""
+    topic_bytes = topic.encode('utf-8')
+    body = struct.pack('>H', len(topic_bytes)) + topic_bytes + payload
+    return bytes([PUBLISH << 4]) + encode_length(len(body)) + body
+
+def topic_matches(topic_filter, topic):
+    """Whether a topic matches a subscription filter (+ and # wildcards)"""
+    filter_levels = topic_filter.split('/')
+    topic_levels = topic.split('/')
+    for i, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+        if i >= len(topic_levels) or (level != '+' and level != topic_levels[i]):
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+class ClientConnection:
+    """One connected client: reads packets, writes queued outbound packets"""
+
+    def __init__(self, broker, sock):
+        self.broker = broker
+        self.sock = sock
+        self.client_id = None
+        self.outbound = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.reader = threading.Thread(target=self._read_loop, name="broker-reader", daemon=True)
+        self.writer = threading.Thread(target=self._write_loop, name="broker-writer", daemon=True)
+
+    def start(self):
+        self.reader.start()
+        self.writer.start()
+
+    def send(self, packet, droppable=False):
+        """Queue a packet; returns False if it was dropped"""
+        with self.condition:
+            if self.closed:
+                return False
+            if droppable and len(self.outbound) >= self.broker.max_queued:
+                return False
+            self.outbound.append(packet)
+            self.condition.notify()
+        return True
+
+    def close(self):
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.condition.notify()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self.broker._remove(self)
+
+    # ---------- reading ----------
+
+    def _recv_exact(self, n):
+        data = bytearray()
+        while len(data) < n:
+            chunk = self.sock.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError("connection closed")
+            data += chunk
+        return bytes(data)
+
+    def _read_packet(self):
+        header = self._recv_exact(1)[0]
+        length = 0
+        multiplier = 1
+        while True:
+            byte = self._recv_exact(1)[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        return header >> 4, header & 0x0F, self._recv_exact(length) if length else b''
+
+    def _read_loop(self):
+        try:
+            while not self.closed:
+                packet_type, flags, body = self._read_packet()
+                if packet_type == DISCONNECT:
+                    break
+                self._handle(packet_type, flags, body)
+        except (ConnectionError, OSError, struct.error, IndexError):
+            pass
+        finally:
+            self.close()
+
+    def _handle(self, packet_type, flags, body):
+        if packet_type == CONNECT:
+            name_length = struct.unpack_from('>H', body)[0]
+            offset = 2 + name_length + 4  # protocol name, level, flags, keep-alive
+            id_length = struct.unpack_from('>H', body, offset)[0]
+            self.client_id = body[offset + 2:offset + 2 + id_length].decode('utf-8', errors='replace')
+            self.send(bytes([CONNACK << 4, 2, 0, 0]))
+        elif packet_type == PUBLISH:
+            qos = (flags >> 1) & 0x03
+            topic_length = struct.unpack_from('>H', body)[0]
+            topic = body[2:2 + topic_length].decode('utf-8', errors='replace')
+            offset = 2 + topic_length
+            if qos:
+                packet_id = body[offset:offset + 2]
+                offset += 2
+                ack = PUBACK if qos == 1 else PUBREC
+                self.send(bytes([ack << 4, 2]) + packet_id)
+            self.broker.publish(topic, body[offset:])
+        elif packet_type == PUBREL:
+            self.send(bytes([PUBCOMP << 4, 2]) + body[:2])
+        elif packet_type == SUBSCRIBE:
+            packet_id = body[:2]
+            offset = 2
+            granted = bytearray()
+            while offset < len(body):
+                filter_length = struct.unpack_from('>H', body, offset)[0]
+                topic_filter = body[offset + 2:offset + 2 + filter_length].decode('utf-8')
+                offset += 2 + filter_length + 1  # requested QoS
+                self.broker.subscribe(self, topic_filter)
+                granted.append(0)  # everything is delivered at QoS 0
+            self.send(bytes([SUBACK << 4]) + encode_length(2 + len(granted)) + packet_id + bytes(granted))
+        elif packet_type == UNSUBSCRIBE:
+            packet_id = body[:2]
+            offset = 2
+            while offset < len(body):
+                filter_length = struct.unpack_from('>H', body, offset)[0]
+                self.broker.unsubscribe(self, body[offset + 2:offset + 2 + filter_length].decode('utf-8'))
+                offset += 2 + filter_length
+            self.send(bytes([UNSUBACK << 4, 2]) + packet_id)
+        elif packet_type == PINGREQ:
+            self.send(bytes([PINGRESP << 4, 0]))
+
+    # ---------- writing ----------
+
+    def _write_loop(self):
+        try:
+            while True:
+                with self.condition:
+                    while not self.closed and not self.outbound:
+                        self.condition.wait()
+                    if self.closed:
+                        return
+                    packets = b''.join(self.outbound)
+                    self.outbound.clear()
+                self.sock.sendall(packets)
+        except OSError:
+            self.close()
+
+class LocalBroker:
+    """Threaded in-process MQTT broker bound to localhost"""
+
+    def __init__(self, host='127.0.0.1', port=0, max_queued=100000):
+        self.host = host
+        self.port = port
+        self.max_queued = max_queued
+        self.lock = threading.Lock()
+        self.connections = set()
+        # topic filter -> subscribed connections
+        self.subscriptions = {}
+        # (group, topic filter) -> [members, next member index]
+        self.shared = {}
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        """Start accepting connections; returns the bound port"""
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((self.host, self.port))
+        self.server.listen(128)
+        self.port = self.server.getsockname()[1]
+        self.thread = threading.Thread(target=self._accept_loop, name="broker-accept", daemon=True)
+        self.thread.start()
+        return self.port
+
+    def stop(self):
+        try:
+            self.server.close()
+        except OSError:
+            pass
+        with self.lock:
+            connections = list(self.connections)
+        for connection in connections:
+            connection.close()
+
+    def subscribe(self, connection, topic_filter):
+        with self.lock:
+            if topic_filter.startswith('$share/'):
+                _, group, shared_filter = topic_filter.split('/', 2)
+                members = self.shared.setdefault((group, shared_filter), [[], 0])[0]
+                if connection not in members:
+                    members.append(connection)
+            else:
+                self.subscriptions.setdefault(topic_filter, set()).add(connection)
+
+    def unsubscribe(self, connection, topic_filter):
+        with self.lock:
+            if topic_filter.startswith('$share/'):
+                _, group, shared_filter = topic_filter.split('/', 2)
+                entry = self.shared.get((group, shared_filter))
+                if entry and connection in entry[0]:
+                    entry[0].remove(connection)
+            else:
+                self.subscriptions.get(topic_filter, set()).discard(connection)
+
+    def publish(self, topic, payload):
+        """Deliver a message to every matching subscriber and one member per shared group"""
+        with self.lock:
+            self.received += 1
+            targets = set()
+            for topic_filter, connections in self.subscriptions.items():
+                if topic_matches(topic_filter, topic):
+                    targets.update(connections)
+            for (group, topic_filter), entry in self.shared.items():
+                members = entry[0]
+                if members and topic_matches(topic_filter, topic):
+                    targets.add(members[entry[1] % len(members)])
+                    entry[1] += 1
+        if not targets:
+            return
+        packet = encode_publish(topic, payload)
+        delivered = sum(connection.send(packet, droppable=True) for connection in targets)
+        with self.lock:
+            self.delivered += delivered
+            self.dropped += len(targets) - delivered
+
+    def _accept_loop(self):
+        while True:
+            try:
+                sock, _ = self.server.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection = ClientConnection(self, sock)
+            with self.lock:
+                self.connections.add(connection)
+            connection.start()
+
+    def _remove(self, connection):
+        with self.lock:
+            self.connections.discard(connection)
+            for connections in self.subscriptions.values():
+                connections.discard(connection)
+            for entry in self.shared.values():
+                if connection in entry[0]:
+                    entry[0].remove(connection)
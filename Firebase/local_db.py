@@ -0,0 +1,193 @@
+"""
+In-memory stand-in for firebase_admin.db.
+
+LocalDatabase mimics the subset of the Realtime Database reference API used
+by the subscriber (reference/child/get/set/update/push/delete and simple
+order_by_key queries), so the writer, spool replay and tools can run without
+network access. Writes can be made to fail on demand to simulate outages:
+
+    local = LocalDatabase()
+    local.fail_writes = True      # every write raises until reset
+    local.fail_next_writes(3)     # only the next three writes raise
+"""
+
+import json
+import threading
+
+from firebase_writer import generate_push_id
+
+class SimulatedOutage(ConnectionError):
+    """Raised by LocalDatabase writes while failures are enabled"""
+
+def _split(path):
+    return [part for part in path.strip('/').split('/') if part]
+
+def _clean(value):
+    """Copy a value the way Firebase stores it (JSON types, no null/empty children)"""
+    value = json.loads(json.dumps(value))
+    return _prune(value)
+
+def _prune(value):
+    if isinstance(value, dict):
+        pruned = {}
+        for key, child in value.items():
+            child = _prune(child)
+            if child is not None:
+                pruned[str(key)] = child
+        return pruned or None
+    if isinstance(value, list):
+        return _prune({str(i): v for i, v in enumerate(value)})
+    return value
+
+class LocalDatabase:
+    """Thread-safe in-memory JSON tree with Firebase write semantics"""
+
+    def __init__(self):
+        self.root = None
+        self.lock = threading.Lock()
+        self.fail_writes = False
+        self.failures_remaining = 0
+        self.write_count = 0
+
+    def reference(self, path='/'):
+        return LocalReference(self, _split(path))
+
+    def fail_next_writes(self, count):
+        """Make the next `count` writes raise SimulatedOutage"""
+        self.failures_remaining = count
+
+    # ---------- tree operations (callers hold self.lock) ----------
+
+    def _check_write(self):
+        if self.fail_writes:
+            raise SimulatedOutage("LocalDatabase: simulated outage")
+        if self.failures_remaining > 0:
+            self.failures_remaining -= 1
+            raise SimulatedOutage("LocalDatabase: simulated outage")
+        self.write_count += 1
+
+    def _get(self, parts):
+        node = self.root
+        for part in parts:
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+    def _set(self, parts, value):
+        value = _prune(value)
+        if not parts:
+            self.root = value
+            return
+        if not isinstance(self.root, dict):
+            self.root = {}
+        node = self.root
+        trail = []
+        for part in parts[:-1]:
+            if not isinstance(node.get(part), dict):
+                node[part] = {}
+            trail.append((node, part))
+            node = node[part]
+        if value is None:
+            node.pop(parts[-1], None)
+            # Remove parents left empty by the delete
+            for parent, part in reversed(trail):
+                if parent[part]:
+                    break
+                del parent[part]
+        else:
+            node[parts[-1]] = value
+        if not self.root:
+            self.root = None
+
+class LocalReference:
+    """Reference to a path in a LocalDatabase"""
+
+    def __init__(self, database, parts):
+        self.database = database
+        self.parts = parts
+
+    @property
+    def key(self):
+        return self.parts[-1] if self.parts else None
+
+    @property
+    def path(self):
+        return '/' + '/'.join(self.parts)
+
+    def child(self, path):
+        return LocalReference(self.database, self.parts + _split(path))
+
+    def get(self, shallow=False):
+        with self.database.lock:
+            value = json.loads(json.dumps(self.database._get(self.parts)))
+        if shallow and isinstance(value, dict):
+            return {key: True for key in value}
+        return value
+
+    def set(self, value):
+        value = _clean(value)
+        with self.database.lock:
+            self.database._check_write()
+            self.database._set(self.parts, value)
+
+    def update(self, value):
+        """Multi-location update: each key is a path relative to this reference"""
+        value = {key: _clean(child) for key, child in value.items()}
+        with self.database.lock:
+            self.database._check_write()
+            for key, child in value.items():
+                self.database._set(self.parts + _split(key), child)
+
+    def push(self, value=None):
+        ref = self.child(generate_push_id())
+        if value is not None:
+            ref.set(value)
+        return ref
+
+    def delete(self):
+        self.set(None)
+
+    def order_by_key(self):
+        return LocalQuery(self)
+
+class LocalQuery:
+    """order_by_key() query with start_at/end_at/limit_to_first/limit_to_last"""
+
+    def __init__(self, ref):
+        self.ref = ref
+        self.start = None
+        self.end = None
+        self.first = None
+        self.last = None
+
+    def start_at(self, key):
+        self.start = key
+        return self
+
+    def end_at(self, key):
+        self.end = key
+        return self
+
+    def limit_to_first(self, limit):
+        self.first = limit
+        return self
+
+    def limit_to_last(self, limit):
+        self.last = limit
+        return self
+
+    def get(self):
+        value = self.ref.get()
+        if not isinstance(value, dict):
+            return value
+        keys = sorted(value)
+        if self.start is not None:
+            keys = [key for key in keys if key >= self.start]
+        if self.end is not None:
+            keys = [key for key in keys if key <= self.end]
+        if self.first is not None:
+            keys = keys[:self.first]
+        if self.last is not None:
+            keys = keys[-self.last:] if self.last else []
+        return {key: value[key] for key in keys}
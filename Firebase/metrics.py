@@ -0,0 +1,250 @@
+"""
+Built-in instrumentation for the RUL subscriber, exposed in the Prometheus
+text format on a local /metrics endpoint.
+
+  Counter           monotonically increasing count (or read from a callback)
+  Gauge             value read from a callback when metrics are scraped
+  LatencyHistogram  durations in HDR-style log-linear buckets
+
+A LatencyHistogram groups nanosecond durations by power of two and splits
+each power of two into SUB_BUCKETS linear sub-buckets, so any value from
+1 ns to centuries is kept to within 1/SUB_BUCKETS (about 6%) in a fixed
+list of counts. Recording is a bit_length(), a shift and two integer
+additions; counters are a single addition. Neither takes a lock: each
+instrument is written by the worker threads of one stage, and a rare lost
+increment under the GIL is the price of keeping an event well under a
+microsecond. Gauges and callback counters cost nothing until scraped.
+
+    metrics = MetricsRegistry()
+    parse_latency = metrics.histogram('app_latency_seconds', "...", {'stage': 'parse'})
+    start = time.perf_counter_ns()
+    ...
+    parse_latency.since(start)
+    MetricsServer(metrics, port=9108).start()
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+# Prometheus 'le' bounds (seconds) the histograms are exported at
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+                   0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def bucket_index(value):
+    """Histogram bucket holding a non-negative integer value"""
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    if shift < 0:
+        return value
+    return (shift << SUB_BUCKET_BITS) + (value >> shift)
+
+def bucket_bounds(index):
+    """[low, high) range of the values in a histogram bucket"""
+    if index < 2 * SUB_BUCKETS:
+        return index, index + 1
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    mantissa = index - (shift << SUB_BUCKET_BITS)
+    return mantissa << shift, (mantissa + 1) << shift
+
+def format_labels(labels, extra=None):
+    """{name="value",...} for a series, or '' without labels"""
+    items = list(labels.items())
+    if extra:
+        items.extend(extra.items())
+    if not items:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in items)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(items, escaped)) + '}'
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+class Counter:
+    """Event count; with source, the count is read from source() instead"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=None, source=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self.source = source
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+    def get(self):
+        return self.source() if self.source is not None else self.value
+
+    def samples(self):
+        yield self.name, self.labels, self.get()
+
+class Gauge:
+    """Point-in-time value read from source() when scraped"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, source, labels=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self.source = source
+
+    def get(self):
+        return self.source()
+
+    def samples(self):
+        yield self.name, self.labels, self.get()
+
+class LatencyHistogram:
+    """Nanosecond durations in log-linear buckets, exported in seconds"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=None, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self.buckets = buckets
+        # Enough buckets for any 63-bit nanosecond value
+        self.counts = [0] * ((64 - SUB_BUCKET_BITS) << SUB_BUCKET_BITS)
+        self.total = 0
+        # Bucket index of each exported bound
+        self._bound_indices = [bucket_index(int(bound * 1e9)) for bound in buckets]
+
+    def record(self, nanoseconds):
+        """Add one duration in nanoseconds"""
+        shift = nanoseconds.bit_length() - SUB_BUCKET_BITS - 1
+        if shift < 0:
+            shift = 0
+        self.counts[(shift << SUB_BUCKET_BITS) + (nanoseconds >> shift)] += 1
+        self.total += nanoseconds
+
+    def since(self, start_ns):
+        """Record the time elapsed since a time.perf_counter_ns() reading"""
+        self.record(time.perf_counter_ns() - start_ns)
+
+    def count(self):
+        return sum(self.counts)
+
+    def percentile(self, q):
+        """Highest value (seconds) in the bucket holding the q-th percentile, 0 if empty"""
+        counts = list(self.counts)
+        total = sum(counts)
+        if not total:
+            return 0.0
+        target = max(1, q / 100.0 * total)
+        seen = 0
+        for index, n in enumerate(counts):
+            seen += n
+            if seen >= target:
+                return (bucket_bounds(index)[1] - 1) / 1e9
+        return (bucket_bounds(len(counts) - 1)[1] - 1) / 1e9
+
+    def samples(self):
+        # Copy first so buckets, sum and count come from one consistent view
+        counts = list(self.counts)
+        total_ns = self.total
+        cumulative = 0
+        position = 0
+        for bound, bound_index in zip(self.buckets, self._bound_indices):
+            # To bucket precision: a bucket counts once its range reaches the bound
+            cumulative += sum(counts[position:bound_index + 1])
+            position = bound_index + 1
+            yield self.name + '_bucket', self.labels, cumulative, {'le': format_value(bound)}
+        cumulative += sum(counts[position:])
+        yield self.name + '_bucket', self.labels, cumulative, {'le': '+Inf'}
+        yield self.name + '_sum', self.labels, total_ns / 1e9
+        yield self.name + '_count', self.labels, cumulative
+
+class MetricsRegistry:
+    """Instruments, grouped by metric name for the text exposition format"""
+
+    def __init__(self):
+        self.families = {}
+
+    def register(self, metric):
+        family = self.families.setdefault(metric.name, [])
+        if family and family[0].kind != metric.kind:
+            raise ValueError(f"Metric {metric.name} already registered as a {family[0].kind}")
+        family.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=None, source=None):
+        return self.register(Counter(name, help_text, labels, source))
+
+    def gauge(self, name, help_text, source, labels=None):
+        return self.register(Gauge(name, help_text, source, labels))
+
+    def histogram(self, name, help_text, labels=None, buckets=LATENCY_BUCKETS):
+        return self.register(LatencyHistogram(name, help_text, labels, buckets))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for name, family in self.families.items():
+            lines.append(f"# HELP {name} {family[0].help}")
+            lines.append(f"# TYPE {name} {family[0].kind}")
+            for metric in family:
+                try:
+                    for sample in metric.samples():
+                        extra = sample[3] if len(sample) > 3 else None
+                        lines.append(f"{sample[0]}{format_labels(sample[1], extra)} "
+                                     f"{format_value(sample[2])}")
+                except Exception as e:
+                    print(f"⚠ Metric {name} unavailable: {e}")
+        return '\n'.join(lines) + '\n'
+
+class MetricsServer:
+    """Serves a registry on http://host:port/metrics from a background thread"""
+
+    def __init__(self, registry, host='127.0.0.1', port=9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        """Start serving; returns the bound port"""
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes every few seconds would flood the console
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-server",
+                                       daemon=True)
+        self.thread.start()
+        return self.port
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
@@ -1,14 +1,37 @@
 import paho.mqtt.client as mqtt
 import json
 import numpy as np
-import pandas as pd
 from datetime import datetime
 import firebase_admin
 from firebase_admin import credentials, db
-from tensorflow.keras.models import load_model
 import pickle
 from collections import deque
+import threading
+import time
 import warnings
+import argparse
+import multiprocessing
+import os
+import signal
+import pandas as pd
+from pipeline import Stage, DROP_OLDEST
+from firebase_writer import FirebaseBatchWriter
+from spool import WriteAheadSpool
+from features import (FeatureProjector, DEFAULT_TIMESTAMP_ORIGIN, parse_timestamp, parse_timestamps,
+                      sample_epoch)
+from ring_buffer import ScaledRingBuffer, fold_robust_scaler
+from rolling_stats import RollingStats
+from json_stream import JsonStreamDecoder
+from codec import (SampleBatch, PayloadError, is_binary, decode_binary,
+                   is_envelope, batch_from_envelope, PACKED_KEYS)
+from sinks import JsonLinesSink, NullSink
+from sqlite_store import SqliteSink
+from metrics import MetricsRegistry, MetricsServer
+from inference import load_backend, BACKENDS
+from hash_ring import HashRing
+from inference_schedule import InferenceSchedule
+from alert_engine import AlertEngine
+from rollups import RollupAggregator
 warnings.filterwarnings('ignore')
 
 # ==================== CONFIGURATION ====================
@@ -19,26 +42,347 @@ MQTT_PORT = 8883
 MQTT_USER = "DigitalTwin-EVBattery"
 MQTT_PASS = "Group_07"
 MQTT_TOPIC = "sensor_data"
+# Plain TCP without credentials when the broker is overridden with --broker
+# (e.g. a local Mosquitto)
+MQTT_TLS = True
+
+# Besides one JSON object per row, sensor_data accepts packed float32
+# records, MessagePack and multi-row batch envelopes (see codec.py).
+# Partially received JSON messages larger than this are discarded
+MQTT_MAX_MESSAGE_BYTES = 256 * 1024
 
 # Firebase Configuration
 FIREBASE_CRED_PATH = r"C:\Users\SHREERAJ M\OneDrive\Desktop\DigitalTwin-EVBattery\Firebase\digitaltwin-evbattery-firebase-adminsdk-fbsvc-c087b8aebb.json"
 FIREBASE_DB_URL = "https://digitaltwin-evbattery-default-rtdb.firebaseio.com/"
 
+# History rows, the latest node and alerts are written together in one
+# multi-location update, flushed every FIREBASE_FLUSH_RECORDS records or
+# FIREBASE_FLUSH_INTERVAL_MS milliseconds
+FIREBASE_FLUSH_RECORDS = 50
+FIREBASE_FLUSH_INTERVAL_MS = 1000
+
+# Database layout: history rows are sharded as
+# FIREBASE_HISTORY_PATH/<vehicle>/<YYYY-MM-DD>/<key>, and the subscriber
+# keeps 1-minute, 15-minute and 1-hour rollups (min/max/mean/last of SoC,
+# SoH, battery temperature and RUL) per vehicle in memory, writing each
+# bucket once when it closes to
+# FIREBASE_ROLLUP_PATH/<vehicle>/<resolution>/<YYYY-MM-DD>/<HHMM>.
+# Buckets of vehicles that stopped sending are closed every ROLLUP_SWEEP_S.
+FIREBASE_HISTORY_PATH = "ev_battery_history"
+FIREBASE_LATEST_PATH = "ev_battery_data/latest"
+FIREBASE_ROLLUP_PATH = "ev_battery_rollups"
+ROLLUP_RESOLUTIONS = {'1m': 60, '15m': 15 * 60, '1h': 60 * 60}
+ROLLUP_SWEEP_S = 10
+
+# The latest node is updated leaf by leaf: each flush only sends the fields
+# that changed since the last write, numeric fields only once they moved by
+# more than their tolerance below (in stored units; SoC/SoH in percent).
+# Scale-out workers share the node, so they rewrite it whole instead.
+LATEST_DELTA_ENABLED = True
+LATEST_TOLERANCES = {
+    'battery/soc': 0.05,
+    'battery/soh': 0.05,
+    'battery/voltage': 0.05,
+    'battery/current': 0.05,
+    'battery/temperature': 0.1,
+    'motor/temperature': 0.1,
+    'motor/vibration': 0.01,
+    'motor/torque': 0.5,
+    'motor/rpm': 5,
+    'braking/pad_wear': 0.01,
+    'braking/pressure': 0.1,
+    'braking/regen_efficiency': 0.05,
+    'tires/pressure': 0.05,
+    'tires/temperature': 0.1,
+    'vehicle/power_consumption': 0.05,
+    'vehicle/suspension_load': 0.5,
+    'vehicle/load_weight': 0.5,
+    'vehicle/driving_speed': 0.1,
+    'vehicle/distance_traveled': 0.01,
+    'vehicle/idle_time': 0.5,
+    'environment/ambient_temperature': 0.1,
+    'environment/ambient_humidity': 0.5,
+    'environment/route_roughness': 0.01,
+    'rul_prediction/value': 0.01,
+    'rul_prediction/statistics/current_rul': 0.01,
+    'rul_prediction/statistics/mean_rul': 0.01,
+    'rul_prediction/statistics/min_rul': 0.01,
+    'rul_prediction/statistics/max_rul': 0.01,
+    'rul_prediction/statistics/std_rul': 0.01,
+    'rul_prediction/statistics/trend_slope': 0.0001
+}
+
+# Where finished records go: "firebase" (the Realtime Database layout
+# above) or "sqlite", a local time-series database at SQLITE_PATH that the
+# dashboard can read with EV_DATA_SOURCE=sqlite. SQLite rows are appended
+# in one transaction every SQLITE_FLUSH_RECORDS records or
+# SQLITE_FLUSH_INTERVAL_MS milliseconds; it keeps no spool and no rollups
+# (the dashboard downsamples with a query instead).
+RECORD_SINK = "firebase"
+RECORD_SINKS = ('firebase', 'sqlite')
+SQLITE_PATH = "ev_battery.sqlite"
+SQLITE_FLUSH_RECORDS = 5000
+SQLITE_FLUSH_INTERVAL_MS = 1000
+
+# Write-ahead spool: every outgoing record is appended to a local segment
+# file first and only acknowledged once Firebase accepts it, so records
+# survive Firebase outages and restarts and are replayed in large batches
+SPOOL_ENABLED = True
+SPOOL_DIR = "firebase_spool"
+SPOOL_SEGMENT_BYTES = 64 * 1024 * 1024
+SPOOL_FSYNC_RECORDS = 500
+SPOOL_FSYNC_INTERVAL_MS = 1000
+SPOOL_REPLAY_BATCH_RECORDS = 2000
+SPOOL_REPLAY_RETRY_MS = 5000
+
 # Model Configuration
 MODEL_PATH = "best_rul_model.keras"
 PREPROCESSING_PATH = "preprocessing_data.pkl"
 
+# Inference backend: "keras" (full TensorFlow), "tflite", "onnx" or "numpy"
+# (see inference.py); the .tflite/.onnx/.npz models are created with
+# export_model.py.
+# INFERENCE_THREADS limits the backend's CPU threads (None: its default)
+INFERENCE_BACKEND = "keras"
+TFLITE_MODEL_PATH = "best_rul_model.tflite"
+ONNX_MODEL_PATH = "best_rul_model.onnx"
+NUMPY_MODEL_PATH = "best_rul_model.npz"
+INFERENCE_THREADS = None
+
+# RUL scoring mode: "incremental" scores only the newly completed window and
+# reuses cached predictions for the older windows, "full" rescores every
+# window in the buffer (as one batched predict call) on each message
+SCORING_MODE = "incremental"
+
+# Adaptive scheduling (incremental mode): RUL moves by charge cycles, not by
+# 10 s sample, so once a vehicle has a prediction a new sample is only
+# scored every INFERENCE_EVERY_SAMPLES samples, once the sample timestamps
+# are INFERENCE_MAX_STALE_S seconds past the last scored sample's (so live
+# and --replay agree; the dataset's samples are 15 minutes apart), or as
+# soon as its features move: the RMS change of the scaled features exceeds
+# INFERENCE_MAX_DISTANCE (in interquartile ranges), or a feature in
+# INFERENCE_FEATURE_DELTAS changes by more than its threshold (in model
+# units: SoH in percent). Other samples reuse the last prediction and are
+# uploaded with statistics.reused = True. INFERENCE_EVERY_SAMPLES = 1
+# scores every sample.
+INFERENCE_EVERY_SAMPLES = 6
+INFERENCE_MAX_STALE_S = 2 * 60 * 60
+INFERENCE_MAX_DISTANCE = 1.0
+INFERENCE_FEATURE_DELTAS = {'Charge_Cycles': 1.0, 'SoH': 0.5}
+
+# Offline replay (python mqtt_lstm_firebase.py --replay <csv>): the CSV is
+# read REPLAY_CHUNK_ROWS rows at a time and the windows the inference
+# schedule picks are scored REPLAY_PREDICT_BATCH at a time, as in the live
+# subscriber; Firebase output is flushed every
+# REPLAY_FLUSH_RECORDS records
+REPLAY_CSV_PATH = "../Dataset/Streaming.csv"
+REPLAY_OUTPUT_PATH = "replay_records.jsonl"
+REPLAY_CHUNK_ROWS = 20000
+REPLAY_PREDICT_BATCH = 2048
+REPLAY_FLUSH_RECORDS = 2000
+
+# Fleet Configuration
+# Payload keys checked (in order) for the vehicle/device id; payloads without
+# one are treated as coming from DEFAULT_VEHICLE_ID
+VEHICLE_ID_KEYS = ('vehicle_id', 'device_id')
+DEFAULT_VEHICLE_ID = "default"
+BUFFER_SIZE = 100
+# Extra ring-buffer rows per vehicle so windows waiting in a micro-batch are
+# not overwritten when a burst of newer samples arrives before scoring
+BUFFER_HEADROOM = 400
+# Multi-row messages are built, scaled and scored in chunks of at most this
+# many rows (kept well below BUFFER_HEADROOM)
+BATCH_CHUNK_ROWS = 128
+
+# Micro-batching: ready windows from all vehicles are scored together in one
+# model.predict call once INFERENCE_MAX_BATCH windows are pending or the
+# oldest pending window has waited INFERENCE_MAX_WAIT_MS
+INFERENCE_MAX_BATCH = 256
+INFERENCE_MAX_WAIT_MS = 50
+
+# Pipeline Configuration
+# on_message only hands (topic, bytes) to the parse stage; parsing, feature
+# building, inference and Firebase writes each run on their own workers,
+# connected by bounded queues with these policies when full:
+#   parse, feature  drop the oldest queued telemetry
+#   inference       block, so backpressure reaches the feature stage instead
+#                   of silently breaking a vehicle's window cache
+#   sink            drop the oldest telemetry record, but never a record that
+#                   raises a low-RUL alert (those wait for space instead)
+# Parse work is partitioned by topic and feature/inference/sink work by
+# vehicle id, so each vehicle's messages stay in order at every stage.
+PARSE_WORKERS = 1
+PARSE_QUEUE_SIZE = 1000
+FEATURE_WORKERS = 1
+FEATURE_QUEUE_SIZE = 1000
+INFERENCE_WORKERS = 1
+INFERENCE_QUEUE_SIZE = 4096  # pending windows per inference worker
+SINK_WORKERS = 1
+SINK_QUEUE_SIZE = 1000
+
+# Scale-out (python mqtt_lstm_firebase.py --workers N): a supervisor starts N
+# worker processes, each with its own model and pipeline, consuming
+# $share/WORKER_GROUP/sensor_data. Vehicles are assigned to workers by a
+# consistent hash ring (WORKER_RING_REPLICAS points per worker); a worker
+# that receives another worker's vehicle forwards the message to
+# WORKER_TOPIC_PREFIX/<owner>, so each vehicle's window lives in exactly one
+# worker. A worker that exits is restarted after WORKER_RESTART_DELAY_S;
+# only its own vehicles' windows are lost. Worker i serves metrics on
+# METRICS_PORT + 1 + i and spools to SPOOL_DIR/worker-<i>.
+WORKER_GROUP = "rul_workers"
+WORKER_TOPIC_PREFIX = "sensor_data/worker"
+WORKER_RING_REPLICAS = 100
+WORKER_RESTART_DELAY_S = 5
+WORKER_STOP_TIMEOUT_S = 30
+
+# Metrics: per-stage latency histograms, counters and gauges, served in the
+# Prometheus text format on http://METRICS_HOST:METRICS_PORT/metrics
+METRICS_ENABLED = True
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+
+# Alert Configuration
+# One alert record per vehicle, opened when RUL drops below
+# LOW_RUL_THRESHOLD and closed once it recovers to ALERT_EXIT_RUL; it is
+# critical below CRITICAL_RUL_THRESHOLD until RUL recovers to
+# CRITICAL_EXIT_RUL. A vehicle that drops again within ALERT_COOLDOWN_S of
+# a close reopens the same record. Alerts are only written on these
+# transitions (see alert_engine.py).
+LOW_RUL_THRESHOLD = 100
+ALERT_EXIT_RUL = 110
+CRITICAL_RUL_THRESHOLD = 5
+CRITICAL_EXIT_RUL = 7
+ALERT_COOLDOWN_S = 600
+
 # ==================== GLOBAL VARIABLES ====================
 
+# Inference backend holding the RUL model (see inference.py)
 model = None
 scaler = None
 feature_names = []
 seq_len = 10
 label_encoder = None
-data_buffer = deque(maxlen=100)
+feature_projector = None
+# RobustScaler center_/scale_ folded into float32 arrays (see load_rul_model)
+scaler_center = None
+scaler_scale = None
+
+# Per-vehicle sliding windows, keyed by vehicle id
+vehicle_states = {}
+
+# Pipeline stages (created in start_pipeline)
+parse_stage = None
+feature_stage = None
+sink_stage = None
+inference_batchers = []
+record_sink = None
+firebase_spool = None
+alert_engine = None
+rollup_aggregator = None
+next_rollup_sweep = 0.0
+
+# Incremental JSON reassembly state, per topic
+json_decoders = {}
+
+metrics_server = None
+
+# Scale-out worker state (run_worker); None in a single-process subscriber
+mqtt_client = None
+worker_index = None
+worker_ring = None
+
+# ==================== METRICS ====================
+
+metrics = MetricsRegistry()
 
-# Store incomplete messages
-message_buffer = ""
+# Time per item in each stage: parse = reassembling/decoding one MQTT
+# message, feature = building and scaling one payload or batch, inference =
+# one model.predict micro-batch, sink = building and queueing one record,
+# writer_flush = one write of the record sink (Firebase update() or SQLite
+# transaction)
+STAGE_LATENCY = 'evbattery_stage_latency_seconds'
+STAGE_LATENCY_HELP = "Time spent per item in each pipeline stage"
+parse_latency = metrics.histogram(STAGE_LATENCY, STAGE_LATENCY_HELP, {'stage': 'parse'})
+feature_latency = metrics.histogram(STAGE_LATENCY, STAGE_LATENCY_HELP, {'stage': 'feature'})
+inference_latency = metrics.histogram(STAGE_LATENCY, STAGE_LATENCY_HELP, {'stage': 'inference'})
+sink_latency = metrics.histogram(STAGE_LATENCY, STAGE_LATENCY_HELP, {'stage': 'sink'})
+flush_latency = metrics.histogram(STAGE_LATENCY, STAGE_LATENCY_HELP, {'stage': 'writer_flush'})
+
+messages_received = metrics.counter('evbattery_mqtt_messages_total', "MQTT messages received")
+PARSE_FAILURES = 'evbattery_parse_failures_total'
+PARSE_FAILURES_HELP = "Messages or JSON values that could not be decoded"
+parse_failures = metrics.counter(PARSE_FAILURES, PARSE_FAILURES_HELP, {'reason': 'message'})
+metrics.counter(PARSE_FAILURES, PARSE_FAILURES_HELP, {'reason': 'json'},
+                source=lambda: sum(decoder.errors for decoder in list(json_decoders.values())))
+# json: oversized partial messages discarded; window: a vehicle's cached
+# predictions thrown away because its windows were overwritten or failed to score
+BUFFER_RESETS = 'evbattery_buffer_resets_total'
+BUFFER_RESETS_HELP = "Buffers discarded and rebuilt"
+metrics.counter(BUFFER_RESETS, BUFFER_RESETS_HELP, {'buffer': 'json'},
+                source=lambda: sum(decoder.overflows for decoder in list(json_decoders.values())))
+window_resets = metrics.counter(BUFFER_RESETS, BUFFER_RESETS_HELP, {'buffer': 'window'})
+windows_scored = metrics.counter('evbattery_windows_scored_total', "Model windows scored")
+predictions_made = metrics.counter('evbattery_predictions_total', "Records given a RUL prediction")
+# Why each record was scored (cold: every window of the vehicle rescored) or
+# that it reused the previous prediction (see INFERENCE_EVERY_SAMPLES)
+schedule_decisions = {
+    reason: metrics.counter('evbattery_schedule_decisions_total',
+                            "Inference scheduling decisions per record", {'decision': reason})
+    for reason in ('cold', 'first', 'interval', 'stale', 'change', 'reused')
+}
+alerts_raised = metrics.counter('evbattery_alerts_total', "Low-RUL alerts raised")
+rollups_closed = metrics.counter('evbattery_rollups_total', "Rollup buckets closed and queued for Firebase")
+alert_transitions = {
+    transition: metrics.counter('evbattery_alert_transitions_total',
+                                "Alert state changes, each written to Firebase once",
+                                {'transition': transition})
+    for transition in ('open', 'reopen', 'escalate', 'deescalate', 'close')
+}
+messages_forwarded = metrics.counter('evbattery_forwarded_total',
+                                     "Messages forwarded to the worker owning their vehicle")
+UPLOAD_ERRORS = 'evbattery_upload_errors_total'
+UPLOAD_ERRORS_HELP = "Records that could not be queued, or record sink writes that failed"
+upload_errors = metrics.counter(UPLOAD_ERRORS, UPLOAD_ERRORS_HELP, {'source': 'record'})
+metrics.counter(UPLOAD_ERRORS, UPLOAD_ERRORS_HELP, {'source': 'flush'},
+                source=lambda: record_sink.errors if record_sink is not None else 0)
+
+# Gauges and counters with a source are only read when metrics are scraped
+QUEUE_DEPTH = 'evbattery_queue_depth'
+QUEUE_DEPTH_HELP = "Items (inference: windows) waiting in each pipeline queue"
+DROPPED = 'evbattery_dropped_total'
+DROPPED_HELP = "Telemetry items dropped under backpressure"
+
+def _depth(stage):
+    return stage.depth() if stage is not None else 0
+
+def _dropped(stage):
+    return stage.dropped() if stage is not None else 0
+
+metrics.gauge(QUEUE_DEPTH, QUEUE_DEPTH_HELP, lambda: _depth(parse_stage), {'stage': 'parse'})
+metrics.gauge(QUEUE_DEPTH, QUEUE_DEPTH_HELP, lambda: _depth(feature_stage), {'stage': 'feature'})
+metrics.gauge(QUEUE_DEPTH, QUEUE_DEPTH_HELP,
+              lambda: sum(batcher.pending_windows for batcher in inference_batchers),
+              {'stage': 'inference'})
+metrics.gauge(QUEUE_DEPTH, QUEUE_DEPTH_HELP, lambda: _depth(sink_stage), {'stage': 'sink'})
+metrics.gauge(QUEUE_DEPTH, QUEUE_DEPTH_HELP,
+              lambda: len(record_sink.pending) if record_sink is not None else 0,
+              {'stage': 'writer'})
+metrics.counter(DROPPED, DROPPED_HELP, {'stage': 'parse'}, source=lambda: _dropped(parse_stage))
+metrics.counter(DROPPED, DROPPED_HELP, {'stage': 'feature'}, source=lambda: _dropped(feature_stage))
+metrics.counter(DROPPED, DROPPED_HELP, {'stage': 'sink'}, source=lambda: _dropped(sink_stage))
+
+def buffer_fill_ratio():
+    """Mean fraction of BUFFER_SIZE held in the vehicles' sliding windows"""
+    states = list(vehicle_states.values())
+    if not states:
+        return 0.0
+    return sum(len(state.buffer) for state in states) / (BUFFER_SIZE * len(states))
+
+metrics.gauge('evbattery_vehicles', "Vehicles with a sliding window", lambda: len(vehicle_states))
+metrics.gauge('evbattery_buffer_fill_ratio', "Mean sliding-window fill across vehicles",
+              buffer_fill_ratio)
+metrics.gauge('evbattery_vehicles_warming_up', "Vehicles with fewer samples than seq_len",
+              lambda: sum(len(state.buffer) < seq_len for state in list(vehicle_states.values())))
 
 # ==================== INITIALIZATION ====================
 
@@ -57,16 +401,20 @@ def initialize_firebase():
 
 def load_rul_model():
     """Load the trained RUL LSTM model and preprocessing data"""
-    global model, scaler, feature_names, seq_len, label_encoder
+    global model, scaler, feature_names, seq_len, label_encoder, feature_projector
+    global scaler_center, scaler_scale
     
     try:
+        model_path = {'keras': MODEL_PATH, 'tflite': TFLITE_MODEL_PATH,
+                      'onnx': ONNX_MODEL_PATH, 'numpy': NUMPY_MODEL_PATH}.get(INFERENCE_BACKEND, MODEL_PATH)
         try:
-            model = load_model(MODEL_PATH)
-            print(f"✓ Model loaded from {MODEL_PATH}")
+            model = load_backend(INFERENCE_BACKEND, model_path, INFERENCE_THREADS)
         except:
-            model_h5 = MODEL_PATH.replace('.keras', '.h5')
-            model = load_model(model_h5)
-            print(f"✓ Model loaded from {model_h5}")
+            if INFERENCE_BACKEND != 'keras':
+                raise
+            model_path = MODEL_PATH.replace('.keras', '.h5')
+            model = load_backend(INFERENCE_BACKEND, model_path, INFERENCE_THREADS)
+        print(f"✓ Model loaded from {model_path} ({INFERENCE_BACKEND} backend)")
         
         with open(PREPROCESSING_PATH, 'rb') as f:
             preprocessing_data = pickle.load(f)
@@ -75,6 +423,9 @@ def load_rul_model():
         feature_names = preprocessing_data['feature_names']
         seq_len = preprocessing_data['seq_len']
         label_encoder = preprocessing_data.get('label_encoder', None)
+        feature_projector = FeatureProjector(
+            feature_names, preprocessing_data.get('timestamp_origin', DEFAULT_TIMESTAMP_ORIGIN))
+        scaler_center, scaler_scale = fold_robust_scaler(scaler, len(feature_names))
         
         print(f"✓ Preprocessing data loaded")
         print(f"  Sequence length: {seq_len}")
@@ -92,82 +443,166 @@ def on_connect(client, userdata, flags, rc):
     """Callback when connected to MQTT broker"""
     if rc == 0:
         print("✓ Connected to HiveMQ Cloud MQTT Broker")
-        client.subscribe(MQTT_TOPIC)
-        print(f"✓ Subscribed to topic: {MQTT_TOPIC}")
+        if worker_index is None:
+            client.subscribe(MQTT_TOPIC)
+            print(f"✓ Subscribed to topic: {MQTT_TOPIC}")
+        else:
+            topics = [f"$share/{WORKER_GROUP}/{MQTT_TOPIC}", f"{WORKER_TOPIC_PREFIX}/{worker_index}"]
+            client.subscribe([(topic, 0) for topic in topics])
+            print(f"✓ Worker {worker_index} subscribed to topics: {', '.join(topics)}")
     else:
         print(f"✗ Connection failed with code {rc}")
 
 def on_message(client, userdata, msg):
-    """Callback when message is received"""
-    global message_buffer
+    """Callback when message is received; only hands the bytes to the pipeline"""
+    messages_received.inc()
+    parse_stage.put((msg.topic, msg.payload))
+
+def handle_raw_message(item):
+    """Parse stage: reassemble JSON from raw MQTT bytes"""
+    topic, raw_bytes = item
+    decoder = json_decoders.get(topic)
+    if decoder is None:
+        decoder = json_decoders[topic] = JsonStreamDecoder(MQTT_MAX_MESSAGE_BYTES)
     
+    start = time.perf_counter_ns()
     try:
-        # Get raw message
-        raw_message = msg.payload.decode('utf-8', errors='ignore')
+        pending = len(decoder)
+        # Binary encodings are only recognised at a message boundary, never
+        # in the middle of a fragmented JSON message
+        if not pending and is_binary(raw_bytes):
+            payloads = decode_binary(raw_bytes)
+        else:
+            # Every complete object in this fragment (plus what was buffered)
+            payloads = decoder.feed(raw_bytes)
+        parse_latency.since(start)
         
-        # Try to parse as complete JSON first
-        try:
-            payload = json.loads(raw_message)
-            message_buffer = ""  # Clear buffer on success
-            process_payload(payload)
-            return
-        except json.JSONDecodeError:
-            # Message might be incomplete, try buffering
-            message_buffer += raw_message
-            
-            # Try to parse buffered message
-            try:
-                payload = json.loads(message_buffer)
-                message_buffer = ""  # Clear buffer on success
-                process_payload(payload)
-            except json.JSONDecodeError as e:
-                # Still incomplete
-                if len(message_buffer) > 5000:  # Reset if too large
-                    print(f"⚠ Buffer too large, resetting...")
-                    message_buffer = ""
+        # Scale-out workers route messages from the shared subscription;
+        # forwarded messages are always for this worker
+        route = worker_ring is not None and topic == MQTT_TOPIC
+        whole_message = not pending and not len(decoder) and len(payloads) == 1
+        for payload in payloads:
+            if isinstance(payload, (dict, SampleBatch)):
+                owner = worker_ring.owner(get_vehicle_id(payload)) if route else worker_index
+                if owner == worker_index:
+                    submit_payload(payload)
                 else:
-                    print(f"⏳ Buffering message... (size: {len(message_buffer)})")
+                    forward_payload(payload, owner, raw_bytes if whole_message else None)
+            else:
+                parse_failures.inc()
+                print(f"⚠ Ignoring non-object JSON message")
+        
+        if len(decoder):
+            # Still incomplete
+            print(f"⏳ Buffering message... (size: {len(decoder)})")
                 
     except Exception as e:
+        parse_failures.inc()
         print(f"✗ Message processing error: {e}")
         import traceback
         traceback.print_exc()
-        message_buffer = ""  # Reset on error
+        decoder.reset()  # Reset on error
+
+def forward_payload(payload, owner, raw_bytes=None):
+    """Publish a payload to the worker that owns its vehicle
+    
+    The original message is forwarded unchanged when it held just this
+    payload; objects from multi-object or fragmented JSON are re-encoded.
+    Binary messages always decode to a single payload, so they are never
+    re-encoded.
+    """
+    if raw_bytes is None:
+        raw_bytes = json.dumps(payload).encode('utf-8')
+    mqtt_client.publish(f"{WORKER_TOPIC_PREFIX}/{owner}", raw_bytes, qos=0)
+    messages_forwarded.inc()
+
+def submit_payload(payload):
+    """Hand a parsed payload (or batch of rows) to the feature stage"""
+    if isinstance(payload, dict) and is_envelope(payload):
+        try:
+            payload = batch_from_envelope(payload)
+        except PayloadError as e:
+            parse_failures.inc()
+            print(f"✗ Invalid batch message dropped: {e}")
+            return
+    feature_stage.put(payload)
 
 def process_payload(payload):
-    """Process a complete JSON payload"""
+    """Feature stage: process a complete JSON payload"""
+    if isinstance(payload, SampleBatch):
+        process_batch(payload)
+        return
+    
     try:
+        vehicle_id = get_vehicle_id(payload)
+        
         print(f"\n{'='*60}")
         print(f"📥 Received data at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"Row: {payload.get('row_number', 'N/A')}")
+        print(f"Vehicle: {vehicle_id}, Row: {payload.get('row_number', 'N/A')}")
         
         # FIX: Display SoC and SoH correctly (multiply by 100 for display)
         soc_display = payload.get('soc', 0) * 100
         soh_display = payload.get('soh', 0) * 100
         print(f"SoC: {soc_display:.2f}%, SoH: {soh_display:.2f}%")
         
-        # Process the data
-        processed_data = process_incoming_data(payload)
+        # Build the features straight into this vehicle's ring buffer, where
+        # they are scaled once on arrival
+        state = get_vehicle_state(vehicle_id)
+        wait_for_buffer_room(state, 1)
+        start = time.perf_counter_ns()
+        process_incoming_data(payload, state.buffer.next_slot())
+        state.buffer.commit()
+        feature_latency.since(start)
         
-        # Add to buffer
-        data_buffer.append(processed_data)
+        # Queue a RUL prediction if we have enough data; the batcher queues
+        # the record for upload once its micro-batch has been scored
+        if len(state.buffer) >= seq_len:
+            submit_inference(build_inference_request(state, [(payload, state.buffer.count - 1)]))
+        else:
+            print(f"⏳ Buffering data for {vehicle_id}... ({len(state.buffer)}/{seq_len})")
+            queue_upload(payload, None, None, vehicle_id, len(state.buffer))
         
-        # Make RUL prediction if we have enough data
-        rul_prediction = None
-        prediction_stats = None
+    except Exception as e:
+        print(f"✗ Payload processing error: {e}")
+        import traceback
+        traceback.print_exc()
+
+def process_batch(batch):
+    """Feature stage: process a multi-row message as 2-D arrays"""
+    try:
+        vehicle_id = get_vehicle_id(batch)
         
-        if len(data_buffer) >= seq_len:
-            rul_prediction, prediction_stats = predict_rul()
-            if rul_prediction is not None:
-                print(f"🔮 Predicted RUL: {rul_prediction:.2f} cycles")
-        else:
-            print(f"⏳ Buffering data... ({len(data_buffer)}/{seq_len})")
+        print(f"\n{'='*60}")
+        print(f"📥 Received batch of {len(batch)} rows at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"Vehicle: {vehicle_id}")
         
-        # Upload to Firebase
-        upload_to_firebase(payload, rul_prediction, prediction_stats)
+        state = get_vehicle_state(vehicle_id)
+        for start in range(0, len(batch), BATCH_CHUNK_ROWS):
+            stop = min(start + BATCH_CHUNK_ROWS, len(batch))
+            wait_for_buffer_room(state, stop - start)
+            # Feature building and scaling for the whole chunk at once
+            build_start = time.perf_counter_ns()
+            state.buffer.extend(feature_projector.project_batch(
+                batch.columns, batch.values[start:stop], batch.timestamps[start:stop]))
+            feature_latency.since(build_start)
+            
+            # Rows that completed a window are scored together; rows before
+            # the first full window are uploaded without a prediction
+            first_row = state.buffer.count - (stop - start)
+            rows = []
+            for i in range(start, stop):
+                end_index = first_row + i - start
+                if end_index >= seq_len - 1:
+                    rows.append((batch.row(i), end_index))
+                else:
+                    queue_upload(batch.row(i), None, None, vehicle_id, buffer_size_at(end_index))
+            if rows:
+                submit_inference(build_inference_request(state, rows))
+            else:
+                print(f"⏳ Buffering data for {vehicle_id}... ({len(state.buffer)}/{seq_len})")
         
     except Exception as e:
-        print(f"✗ Payload processing error: {e}")
+        print(f"✗ Batch processing error: {e}")
         import traceback
         traceback.print_exc()
 
@@ -178,205 +613,580 @@ def on_disconnect(client, userdata, rc):
 
 # ==================== DATA PROCESSING ====================
 
-def process_incoming_data(payload):
-    """Process incoming MQTT data to match model's expected format"""
-    
-    data_dict = {}
-    
-    feature_mapping = {
-        'soc': 'SoC',
-        'soh': 'SoH',
-        'battery_voltage': 'Battery_Voltage',
-        'battery_current': 'Battery_Current',
-        'battery_temperature': 'Battery_Temperature',
-        'charge_cycles': 'Charge_Cycles',
-        'motor_temperature': 'Motor_Temperature',
-        'motor_vibration': 'Motor_Vibration',
-        'motor_torque': 'Motor_Torque',
-        'motor_rpm': 'Motor_RPM',
-        'power_consumption': 'Power_Consumption',
-        'brake_pad_wear': 'Brake_Pad_Wear',
-        'brake_pressure': 'Brake_Pressure',
-        'reg_brake_efficiency': 'Reg_Brake_Efficiency',
-        'tire_pressure': 'Tire_Pressure',
-        'tire_temperature': 'Tire_Temperature',
-        'suspension_load': 'Suspension_Load',
-        'ambient_temperature': 'Ambient_Temperature',
-        'ambient_humidity': 'Ambient_Humidity',
-        'load_weight': 'Load_Weight',
-        'driving_speed': 'Driving_Speed',
-        'distance_traveled': 'Distance_Traveled',
-        'idle_time': 'Idle_Time',
-        'route_roughness': 'Route_Roughness'
+def process_incoming_data(payload, out=None):
+    """Process incoming MQTT data to match model's expected format
+    
+    The percentage features (SoC, SoH, Reg_Brake_Efficiency) arrive as 0-1
+    fractions and are scaled to the 0-100 range the model was trained on;
+    Timestamp becomes minutes since the start of the training data.
+    """
+    return feature_projector.project(payload, out)
+
+# ==================== VEHICLE STATE & BATCHING ====================
+
+class VehicleState:
+    """Sliding window and cached window predictions for one vehicle"""
+    
+    def __init__(self, vehicle_id):
+        self.vehicle_id = vehicle_id
+        # Scaled feature rows; buffer.count is the number of samples seen
+        # since start-up and ties cached predictions to absolute positions
+        self.buffer = ScaledRingBuffer(BUFFER_SIZE, len(feature_names),
+                                       scaler_center, scaler_scale, BUFFER_HEADROOM)
+        # Last window end index handed to the batcher (scored or pending)
+        self.scheduled_end = -1
+        # Which new samples are scored rather than reusing the last prediction
+        self.schedule = new_inference_schedule()
+        # Samples since the last scored one, as of the last completed record
+        self.prediction_age = 0
+        # O(1) rolling statistics over the window predictions in the buffer,
+        # indexed by window end
+        self.rul_stats = RollingStats()
+        # First buffer row needed by each request still being scored, oldest
+        # first; new rows wait rather than overwrite them
+        self.inflight = deque()
+        self.condition = threading.Condition()
+
+class InferenceRequest:
+    """Windows of one vehicle waiting to be scored, plus the records to upload
+    
+    rows holds (payload, end_index) for each record, in sample order; a
+    single JSON message has one, a batch message one per row. ends lists the
+    window end indices to score, ascending; records whose window is not in
+    ends reuse the previous prediction, and a request may score no windows.
+    """
+    
+    def __init__(self, state, rows, first_end, ends, cold):
+        self.state = state
+        self.rows = rows
+        self.first_end = first_end
+        self.ends = ends
+        self.n_windows = len(ends)
+        self.cold = cold
+        if ends:
+            self.start_end = ends[0]
+            self.last_end = ends[-1]
+            # Positions within start_end..last_end, unless those are all scored
+            contiguous = self.last_end - self.start_end + 1 == len(ends)
+            self.offsets = None if contiguous else np.subtract(ends, self.start_end)
+            self.first_row = self.start_end - seq_len + 1
+        else:
+            self.first_row = rows[-1][1]
+
+def get_vehicle_id(payload):
+    """Return the vehicle/device id carried by a payload"""
+    if isinstance(payload, SampleBatch):
+        payload = payload.meta
+    for key in VEHICLE_ID_KEYS:
+        vehicle_id = payload.get(key)
+        if vehicle_id not in (None, ''):
+            return str(vehicle_id)
+    return DEFAULT_VEHICLE_ID
+
+def get_vehicle_state(vehicle_id):
+    """Return the VehicleState for a vehicle, creating it on first use"""
+    state = vehicle_states.get(vehicle_id)
+    if state is None:
+        state = vehicle_states[vehicle_id] = VehicleState(vehicle_id)
+    return state
+
+def buffer_size_at(end_index):
+    """Logical buffer length right after sample end_index was added"""
+    return min(end_index + 1, BUFFER_SIZE)
+
+def first_window_end(end_index):
+    """End index of the oldest window in the buffer right after sample end_index"""
+    return end_index + 1 - buffer_size_at(end_index) + seq_len - 1
+
+def wait_for_buffer_room(state, n_rows):
+    """Block until n_rows can be appended without overwriting queued windows"""
+    with state.condition:
+        while state.inflight and not state.buffer.holds(state.inflight[0] - n_rows):
+            state.condition.wait()
+
+def release_inference_request(request):
+    """Mark a request as scored (or failed) so its rows may be overwritten"""
+    state = request.state
+    with state.condition:
+        state.inflight.popleft()
+        state.condition.notify_all()
+
+def new_inference_schedule():
+    """InferenceSchedule for a new vehicle, from the INFERENCE_* settings"""
+    feature_deltas = {}
+    for name, delta in INFERENCE_FEATURE_DELTAS.items():
+        if name in feature_names:
+            index = feature_names.index(name)
+            # Thresholds are in model units; the schedule compares scaled rows
+            feature_deltas[index] = delta / scaler_scale[index]
+    return InferenceSchedule(INFERENCE_EVERY_SAMPLES, INFERENCE_MAX_STALE_S,
+                             INFERENCE_MAX_DISTANCE, feature_deltas)
+
+def build_inference_request(state, rows):
+    """Work out which windows of a vehicle still need scoring"""
+    # Absolute sample indices of the last row of the oldest window (as of the
+    # first record) and of the newest window
+    first_end = first_window_end(rows[0][1])
+    last_end = rows[-1][1]
+    
+    # Incremental mode only scores windows not already cached or pending, and
+    # of those only the ones the schedule picks; anything else is a cold
+    # recompute of every window in the buffer
+    cold = SCORING_MODE != "incremental" or state.scheduled_end < first_end - 1
+    if cold:
+        ends = list(range(first_end, last_end + 1))
+        state.schedule.scored(state.buffer.rows(last_end, last_end)[0],
+                              parse_timestamp(rows[-1][0].get('timestamp')))
+        schedule_decisions['cold'].inc(len(rows))
+    else:
+        ends = []
+        for payload, end_index in rows:
+            reason = state.schedule.decide(state.buffer.rows(end_index, end_index)[0],
+                                           parse_timestamp(payload.get('timestamp')))
+            schedule_decisions[reason or 'reused'].inc()
+            if reason is not None:
+                ends.append(end_index)
+    state.scheduled_end = last_end
+    
+    return InferenceRequest(state, rows, first_end, ends, cold)
+
+def compute_prediction_stats(rul_stats, prediction_age=0):
+    """Summary statistics over the window predictions in a vehicle's buffer
+    
+    trend is the sign of the least-squares slope of the predictions against
+    window position (trend_slope, in cycles per sample). A record whose
+    window was not scored reuses the last prediction: reused is set and
+    prediction_age counts the samples since the scored one.
+    """
+    slope = rul_stats.slope()
+    return {
+        'reused': prediction_age > 0,
+        'prediction_age': prediction_age,
+        'current_rul': rul_stats.last(),
+        'mean_rul': rul_stats.mean(),
+        'min_rul': rul_stats.min(),
+        'max_rul': rul_stats.max(),
+        'std_rul': rul_stats.std(),
+        'trend': 'decreasing' if len(rul_stats) > 1 and slope < 0 else 'stable',
+        'trend_slope': slope
     }
+
+def complete_inference_request(request, preds):
+    """Add a request's window predictions to the rolling stats and upload its records"""
+    state = request.state
+    rul_stats = state.rul_stats
     
-    # CRITICAL FIX: Scale percentage values from 0-1 to 0-100
-    for payload_key, feature_name in feature_mapping.items():
-        if feature_name in feature_names:
-            value = payload.get(payload_key, 0.0)
-            
-            # Convert percentage features from 0-1 scale to 0-100 scale
-            # This matches what the model was trained on
-            if feature_name in ['SoC', 'SoH', 'Reg_Brake_Efficiency']:
-                value = value * 100  # Convert 0.88 to 88
-            
-            data_dict[feature_name] = value
+    if request.cold:
+        rul_stats.reset()
+    ends = request.ends
+    scored = 0
+    for payload, end_index in request.rows:
+        # Windows up to this record's sample, as they were when it arrived
+        while scored < len(ends) and ends[scored] <= end_index:
+            rul_stats.push(ends[scored], preds[scored])
+            scored += 1
+        
+        if scored and ends[scored - 1] == end_index:
+            state.prediction_age = 0
+        elif len(rul_stats):
+            # Not scored: the window holds the previous prediction
+            state.prediction_age += 1
+            rul_stats.push(end_index, rul_stats.last())
+        else:
+            # Nothing to reuse (the vehicle's last scoring failed)
+            queue_upload(payload, None, None, state.vehicle_id, buffer_size_at(end_index))
+            continue
+        
+        # Forget windows that had scrolled out of the buffer for this record
+        rul_stats.evict_before(first_window_end(end_index))
+        
+        rul_prediction = rul_stats.last()
+        prediction_stats = compute_prediction_stats(rul_stats, state.prediction_age)
+        predictions_made.inc()
+        if state.prediction_age:
+            print(f"♻ Reusing RUL for {state.vehicle_id}: {rul_prediction:.2f} cycles "
+                  f"({state.prediction_age} samples old)")
+        else:
+            print(f"🔮 Predicted RUL for {state.vehicle_id}: {rul_prediction:.2f} cycles")
+        
+        queue_upload(payload, rul_prediction, prediction_stats,
+                     state.vehicle_id, buffer_size_at(end_index))
+
+class InferenceBatcher:
+    """Collects ready windows from many vehicles into one model.predict call"""
+    
+    def __init__(self, max_batch=INFERENCE_MAX_BATCH, max_wait_ms=INFERENCE_MAX_WAIT_MS,
+                 max_pending=INFERENCE_QUEUE_SIZE):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_pending = max_pending
+        # Preallocated model input; a single cold request may exceed max_batch
+        capacity = max(max_batch, BUFFER_SIZE - seq_len + BATCH_CHUNK_ROWS)
+        self.batch_input = np.empty((capacity, seq_len, len(feature_names)), dtype=np.float32)
+        self.pending = deque()
+        self.pending_windows = 0
+        self.oldest_submit = 0.0
+        self.running = True
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+        self.thread.start()
+    
+    def submit(self, request):
+        """Queue a request; the batch is flushed on size or deadline
+        
+        Blocks while max_pending windows are already queued, pushing
+        backpressure onto the caller rather than dropping windows.
+        """
+        with self.condition:
+            while self.running and self.pending and self.pending_windows >= self.max_pending:
+                self.condition.wait()
+            if not self.pending:
+                self.oldest_submit = time.monotonic()
+            self.pending.append(request)
+            self.pending_windows += request.n_windows
+            if len(self.pending) == 1 or self.pending_windows >= self.max_batch:
+                self.condition.notify_all()
+    
+    def stop(self):
+        """Score anything still pending and stop the batching thread"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.thread.join()
+    
+    def _take_batch(self):
+        """Pop requests totalling at most max_batch windows (at least one request)"""
+        batch = []
+        n_windows = 0
+        while self.pending:
+            size = self.pending[0].n_windows
+            if batch and n_windows + size > self.max_batch:
+                break
+            batch.append(self.pending.popleft())
+            n_windows += size
+        self.pending_windows -= n_windows
+        if self.pending:
+            self.oldest_submit = time.monotonic()
+        self.condition.notify_all()  # wake producers waiting for space
+        return batch
+    
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait()
+                while self.running and self.pending_windows < self.max_batch:
+                    remaining = self.oldest_submit + self.max_wait - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                if not self.pending:
+                    return
+                batch = self._take_batch()
+            self._score(batch)
     
-    if 'Timestamp' in feature_names:
-        timestamp_str = payload.get('timestamp', '')
+    def _gather(self, batch):
+        """Copy each request's (already scaled) windows into the batch input
+        
+        Returns the requests whose windows were still intact in their ring
+        buffer; the rest have been overwritten by newer samples.
+        """
+        ready = []
+        offset = 0
+        for request in batch:
+            if not request.n_windows:
+                # Every record reuses the previous prediction
+                ready.append(request)
+                continue
+            buffer = request.state.buffer
+            first_row = request.first_row
+            if buffer.holds(first_row):
+                target = self.batch_input[offset:offset + request.n_windows]
+                windows = buffer.windows(request.start_end, request.last_end, seq_len)
+                if request.offsets is None:
+                    np.copyto(target, windows)
+                else:
+                    np.take(windows, request.offsets, axis=0, out=target)
+                # Re-check: the feature stage may have wrapped the ring during the copy
+                if buffer.holds(first_row):
+                    ready.append(request)
+                    offset += request.n_windows
+                    continue
+            print(f"⚠ Windows for {request.state.vehicle_id} were overwritten before scoring")
+            self._fail(request)
+        return ready, offset
+    
+    def _fail(self, request):
+        """Upload a request's records without a prediction"""
+        release_inference_request(request)
+        window_resets.inc()
+        # Force a cold recompute for the vehicle on its next sample
+        request.state.scheduled_end = -1
+        for payload, end_index in request.rows:
+            queue_upload(payload, None, None,
+                         request.state.vehicle_id, buffer_size_at(end_index))
+    
+    def _score(self, batch):
+        """Score a micro-batch, then complete each request in order"""
         try:
-            if timestamp_str:
-                timestamp = pd.to_datetime(timestamp_str, format='%d-%m-%Y %H:%M', errors='coerce')
-                data_dict['Timestamp'] = timestamp.timestamp() if pd.notna(timestamp) else 0.0
+            batch, n_windows = self._gather(batch)
+            if not batch:
+                return
+            if n_windows:
+                start = time.perf_counter_ns()
+                preds = model.predict(self.batch_input[:n_windows])
+                inference_latency.since(start)
+                windows_scored.inc(n_windows)
             else:
-                data_dict['Timestamp'] = 0.0
-        except:
-            data_dict['Timestamp'] = 0.0
-    
-    if 'Maintenance_Type' in feature_names:
-        data_dict['Maintenance_Type'] = 0
+                preds = np.empty(0, dtype=np.float32)
+        except Exception as e:
+            print(f"✗ RUL prediction error: {e}")
+            import traceback
+            traceback.print_exc()
+            for request in batch:
+                self._fail(request)
+            return
+        
+        offset = 0
+        for request in batch:
+            n = request.n_windows
+            release_inference_request(request)
+            try:
+                complete_inference_request(request, preds[offset:offset + n])
+            except Exception as e:
+                print(f"✗ RUL prediction error: {e}")
+                import traceback
+                traceback.print_exc()
+            offset += n
+
+# ==================== PIPELINE ====================
+
+def submit_inference(request):
+    """Route an inference request to the batcher that owns its vehicle"""
+    batcher = inference_batchers[hash(request.state.vehicle_id) % len(inference_batchers)]
+    state = request.state
+    with state.condition:
+        state.inflight.append(request.first_row)
+    batcher.submit(request)
+
+def is_alert(rul_prediction):
+    """Whether a record with this prediction raises a low-RUL alert"""
+    return rul_prediction is not None and rul_prediction < LOW_RUL_THRESHOLD
+
+def queue_upload(payload, rul_prediction, prediction_stats, vehicle_id, buffer_size):
+    """Hand a finished record to the sink stage
     
-    for feature in feature_names:
-        if feature not in data_dict:
-            data_dict[feature] = 0.0
+    Low-RUL records, and any record of a vehicle with an open alert (which
+    may close it), are never dropped.
+    """
+    record = (payload, rul_prediction, prediction_stats, vehicle_id, buffer_size)
+    droppable = not is_alert(rul_prediction) and not alert_engine.is_open(vehicle_id)
+    sink_stage.put(record, droppable=droppable)
+
+def upload_record(record):
+    """Sink stage: write one finished record to the record sink"""
+    store_record(*record)
+
+def start_pipeline():
+    """Create the parse, feature, inference and sink stages"""
+    global parse_stage, feature_stage, sink_stage, inference_batchers
+    global record_sink, firebase_spool, alert_engine, rollup_aggregator
     
-    feature_values = [data_dict[fname] for fname in feature_names]
+    alert_engine = new_alert_engine()
+    if RECORD_SINK == 'sqlite':
+        record_sink = SqliteSink(SQLITE_PATH, SQLITE_FLUSH_RECORDS, SQLITE_FLUSH_INTERVAL_MS,
+                                 flush_latency=flush_latency)
+        print(f"📝 Writing records to {SQLITE_PATH}")
+    else:
+        rollup_aggregator = RollupAggregator(FIREBASE_ROLLUP_PATH, ROLLUP_RESOLUTIONS)
+        if SPOOL_ENABLED:
+            firebase_spool = WriteAheadSpool(SPOOL_DIR, SPOOL_SEGMENT_BYTES,
+                                             SPOOL_FSYNC_RECORDS, SPOOL_FSYNC_INTERVAL_MS)
+        record_sink = FirebaseBatchWriter(db, history_path=FIREBASE_HISTORY_PATH,
+                                          latest_path=FIREBASE_LATEST_PATH,
+                                          flush_records=FIREBASE_FLUSH_RECORDS,
+                                          flush_interval_ms=FIREBASE_FLUSH_INTERVAL_MS,
+                                          spool=firebase_spool,
+                                          replay_batch_records=SPOOL_REPLAY_BATCH_RECORDS,
+                                          replay_retry_ms=SPOOL_REPLAY_RETRY_MS,
+                                          flush_latency=flush_latency,
+                                          shard_history=True,
+                                          latest_tolerances=LATEST_TOLERANCES if LATEST_DELTA_ENABLED else None)
+    # Stages are created downstream-first so every stage's consumer exists
+    sink_stage = Stage("sink", upload_record, SINK_WORKERS, SINK_QUEUE_SIZE,
+                       DROP_OLDEST, partition_key=lambda record: record[3])
+    inference_batchers = [
+        InferenceBatcher(INFERENCE_MAX_BATCH, INFERENCE_MAX_WAIT_MS, INFERENCE_QUEUE_SIZE)
+        for _ in range(max(1, INFERENCE_WORKERS))
+    ]
+    feature_stage = Stage("feature", process_payload, FEATURE_WORKERS, FEATURE_QUEUE_SIZE,
+                          DROP_OLDEST, partition_key=get_vehicle_id)
+    parse_stage = Stage("parse", handle_raw_message, PARSE_WORKERS, PARSE_QUEUE_SIZE,
+                        DROP_OLDEST, partition_key=lambda item: item[0])
+
+def stop_pipeline():
+    """Drain every stage in order, upstream first"""
+    parse_stage.stop()
+    feature_stage.stop()
+    for batcher in inference_batchers:
+        batcher.stop()
+    sink_stage.stop()
+    # Partial buckets are written as they are; a restart within the same
+    # bucket overwrites them with the records it sees
+    if rollup_aggregator is not None:
+        queue_rollups(rollup_aggregator.close_all())
+    record_sink.stop()
+    if firebase_spool is not None:
+        firebase_spool.close()
     
-    return np.array(feature_values)
+    dropped = parse_stage.dropped() + feature_stage.dropped() + sink_stage.dropped()
+    if dropped:
+        print(f"⚠ Pipeline dropped {dropped} telemetry items under backpressure")
+    print_latency_summary()
+
+def print_latency_summary():
+    """Per-stage p50/p99 latencies recorded since start-up"""
+    histograms = [histogram for histogram in metrics.families[STAGE_LATENCY] if histogram.count()]
+    if not histograms:
+        return
+    print("📊 Stage latency (p50 / p99):")
+    for histogram in histograms:
+        print(f"  {histogram.labels['stage']:15s} {histogram.percentile(50) * 1000:9.3f} / "
+              f"{histogram.percentile(99) * 1000:.3f} ms ({histogram.count()} items)")
 
-def predict_rul():
-    """Make RUL prediction using the buffered data"""
+def start_metrics_server():
+    """Serve the metrics registry on METRICS_HOST:METRICS_PORT"""
+    global metrics_server
     try:
-        recent_data = list(data_buffer)[-seq_len:]
-        
-        if len(recent_data) < seq_len:
-            return None, None
-        
-        data_array = np.array(recent_data)
-        data_scaled = scaler.transform(data_array)
-        X_seq = data_scaled.reshape(1, seq_len, len(feature_names))
-        
-        prediction = model.predict(X_seq, verbose=0)
-        rul_value = float(prediction[0][0])
-        
-        all_buffer_data = np.array(list(data_buffer))
-        buffer_scaled = scaler.transform(all_buffer_data)
-        
-        recent_predictions = []
-        for i in range(len(buffer_scaled) - seq_len + 1):
-            seq = buffer_scaled[i:i+seq_len].reshape(1, seq_len, len(feature_names))
-            pred = model.predict(seq, verbose=0)[0][0]
-            recent_predictions.append(pred)
-        
-        stats = {
-            'current_rul': rul_value,
-            'mean_rul': float(np.mean(recent_predictions)) if recent_predictions else rul_value,
-            'min_rul': float(np.min(recent_predictions)) if recent_predictions else rul_value,
-            'max_rul': float(np.max(recent_predictions)) if recent_predictions else rul_value,
-            'std_rul': float(np.std(recent_predictions)) if recent_predictions else 0.0,
-            'trend': 'decreasing' if len(recent_predictions) > 1 and recent_predictions[-1] < recent_predictions[0] else 'stable'
-        }
+        metrics_server = MetricsServer(metrics, METRICS_HOST, METRICS_PORT)
+        port = metrics_server.start()
+        print(f"📊 Metrics available at http://{METRICS_HOST}:{port}/metrics")
+    except OSError as e:
+        metrics_server = None
+        print(f"⚠ Metrics endpoint could not be started: {e}")
+
+# ==================== RECORD STORAGE ====================
+
+def store_record(payload, rul_prediction, prediction_stats,
+                 vehicle_id=DEFAULT_VEHICLE_ID, buffer_size=0):
+    """Queue sensor data and RUL prediction for the batched record sink"""
+    start = time.perf_counter_ns()
+    try:
+        data_entry = build_data_entry(payload, rul_prediction, prediction_stats,
+                                      vehicle_id, buffer_size)
+        change = alert_engine.observe(vehicle_id, rul_prediction, data_entry['battery']['soh'])
+        transition, alert_key, alert = change or (None, None, None)
         
-        return rul_value, stats
+        key = record_sink.add(data_entry, alert, alert_key)
+        if rollup_aggregator is not None:
+            update_rollups(vehicle_id, data_entry)
+        sink_latency.since(start)
+        print(f"✓ Data queued for {RECORD_SINK} with key: {key}")
+        if transition is not None:
+            alert_transitions[transition].inc()
+            if transition in ('open', 'reopen'):
+                alerts_raised.inc()
+            print(f"⚠ Alert {alert_key} {transition}: {alert['severity']}, "
+                  f"RUL {rul_prediction:.2f}")
         
     except Exception as e:
-        print(f"✗ RUL prediction error: {e}")
+        upload_errors.inc()
+        print(f"✗ Record upload error: {e}")
         import traceback
         traceback.print_exc()
-        return None, None
 
-# ==================== FIREBASE OPERATIONS ====================
+def update_rollups(vehicle_id, data_entry):
+    """Add a record to its vehicle's rollups and queue any buckets that closed
+    
+    The record is bucketed by its sample timestamp (its arrival time if it
+    has none); expiry sweeps run on the arrival clock.
+    """
+    global next_rollup_sweep
+    now = time.time()
+    sample_time = sample_epoch(data_entry.get('timestamp'))
+    closed = rollup_aggregator.add(vehicle_id, now if sample_time is None else sample_time, (
+        data_entry['battery']['soc'], data_entry['battery']['soh'],
+        data_entry['battery']['temperature'], data_entry['rul_prediction']['value']), now)
+    if now >= next_rollup_sweep:
+        next_rollup_sweep = now + ROLLUP_SWEEP_S
+        closed.update(rollup_aggregator.close_expired(now))
+    queue_rollups(closed)
 
-def upload_to_firebase(payload, rul_prediction, prediction_stats):
-    """Upload sensor data and RUL prediction to Firebase Realtime Database"""
-    try:
-        ref = db.reference('ev_battery_data')
+def queue_rollups(closed):
+    """Write closed rollup buckets with the next Firebase flush"""
+    if closed:
+        record_sink.add_updates(closed)
+        rollups_closed.inc(len(closed))
+
+def build_data_entry(payload, rul_prediction, prediction_stats, vehicle_id, buffer_size):
+    """The history row stored for one sensor payload"""
+    # Convert SoC and SoH to percentage for storage (multiply by 100)
+    soc_percent = payload.get('soc', 0) * 100
+    soh_percent = payload.get('soh', 0) * 100
+    
+    return {
+        'vehicle_id': vehicle_id,
+        'timestamp': payload.get('timestamp', ''),
+        'device_timestamp': payload.get('device_millis', 0),
+        'upload_timestamp': datetime.now().isoformat(),
+        'row_number': payload.get('row_number', 0),
         
-        # Convert SoC and SoH to percentage for storage (multiply by 100)
-        soc_percent = payload.get('soc', 0) * 100
-        soh_percent = payload.get('soh', 0) * 100
+        'battery': {
+            'soc': soc_percent,  # Store as percentage
+            'soh': soh_percent,  # Store as percentage
+            'voltage': payload.get('battery_voltage', 0),
+            'current': payload.get('battery_current', 0),
+            'temperature': payload.get('battery_temperature', 0),
+            'charge_cycles': payload.get('charge_cycles', 0)
+        },
         
-        data_entry = {
-            'timestamp': payload.get('timestamp', ''),
-            'device_timestamp': payload.get('device_millis', 0),
-            'upload_timestamp': datetime.now().isoformat(),
-            'row_number': payload.get('row_number', 0),
-            
-            'battery': {
-                'soc': soc_percent,  # Store as percentage
-                'soh': soh_percent,  # Store as percentage
-                'voltage': payload.get('battery_voltage', 0),
-                'current': payload.get('battery_current', 0),
-                'temperature': payload.get('battery_temperature', 0),
-                'charge_cycles': payload.get('charge_cycles', 0)
-            },
-            
-            'motor': {
-                'temperature': payload.get('motor_temperature', 0),
-                'vibration': payload.get('motor_vibration', 0),
-                'torque': payload.get('motor_torque', 0),
-                'rpm': payload.get('motor_rpm', 0)
-            },
-            
-            'braking': {
-                'pad_wear': payload.get('brake_pad_wear', 0),
-                'pressure': payload.get('brake_pressure', 0),
-                'regen_efficiency': payload.get('reg_brake_efficiency', 0) * 100  # Convert to percentage
-            },
-            
-            'tires': {
-                'pressure': payload.get('tire_pressure', 0),
-                'temperature': payload.get('tire_temperature', 0)
-            },
-            
-            'vehicle': {
-                'power_consumption': payload.get('power_consumption', 0),
-                'suspension_load': payload.get('suspension_load', 0),
-                'load_weight': payload.get('load_weight', 0),
-                'driving_speed': payload.get('driving_speed', 0),
-                'distance_traveled': payload.get('distance_traveled', 0),
-                'idle_time': payload.get('idle_time', 0)
-            },
-            
-            'environment': {
-                'ambient_temperature': payload.get('ambient_temperature', 0),
-                'ambient_humidity': payload.get('ambient_humidity', 0),
-                'route_roughness': payload.get('route_roughness', 0)
-            },
-            
-            'rul_prediction': {
-                'value': rul_prediction if rul_prediction is not None else None,
-                'buffer_size': len(data_buffer),
-                'required_sequence_length': seq_len,
-                'model_type': 'LSTM_RUL',
-                'statistics': prediction_stats if prediction_stats else None,
-                'health_status': get_health_status(rul_prediction, soh_percent) if rul_prediction else None
-            }
-        }
+        'motor': {
+            'temperature': payload.get('motor_temperature', 0),
+            'vibration': payload.get('motor_vibration', 0),
+            'torque': payload.get('motor_torque', 0),
+            'rpm': payload.get('motor_rpm', 0)
+        },
         
-        new_ref = ref.push(data_entry)
-        print(f"✓ Data uploaded to Firebase with key: {new_ref.key}")
-        
-        latest_ref = db.reference('ev_battery_data/latest')
-        latest_ref.set(data_entry)
-        
-        if rul_prediction is not None and rul_prediction < 100:
-            alert_ref = db.reference('alerts')
-            alert_ref.push({
-                'timestamp': datetime.now().isoformat(),
-                'type': 'low_rul',
-                'severity': 'critical' if rul_prediction < 5 else 'warning',
-                'message': f'Low RUL detected: {rul_prediction:.2f} cycles',
-                'rul': rul_prediction,
-                'soh': soh_percent,
-                'data_key': new_ref.key
-            })
-            print(f"⚠ Alert created for low RUL: {rul_prediction:.2f}")
+        'braking': {
+            'pad_wear': payload.get('brake_pad_wear', 0),
+            'pressure': payload.get('brake_pressure', 0),
+            'regen_efficiency': payload.get('reg_brake_efficiency', 0) * 100  # Convert to percentage
+        },
         
-    except Exception as e:
-        print(f"✗ Firebase upload error: {e}")
-        import traceback
-        traceback.print_exc()
+        'tires': {
+            'pressure': payload.get('tire_pressure', 0),
+            'temperature': payload.get('tire_temperature', 0)
+        },
+        
+        'vehicle': {
+            'power_consumption': payload.get('power_consumption', 0),
+            'suspension_load': payload.get('suspension_load', 0),
+            'load_weight': payload.get('load_weight', 0),
+            'driving_speed': payload.get('driving_speed', 0),
+            'distance_traveled': payload.get('distance_traveled', 0),
+            'idle_time': payload.get('idle_time', 0)
+        },
+        
+        'environment': {
+            'ambient_temperature': payload.get('ambient_temperature', 0),
+            'ambient_humidity': payload.get('ambient_humidity', 0),
+            'route_roughness': payload.get('route_roughness', 0)
+        },
+        
+        'rul_prediction': {
+            'value': rul_prediction if rul_prediction is not None else None,
+            'buffer_size': buffer_size,
+            'required_sequence_length': seq_len,
+            'model_type': 'LSTM_RUL',
+            'statistics': prediction_stats if prediction_stats else None,
+            'health_status': get_health_status(rul_prediction, soh_percent) if rul_prediction else None
+        }
+    }
+
+def new_alert_engine():
+    """AlertEngine with the configured thresholds"""
+    return AlertEngine(LOW_RUL_THRESHOLD, ALERT_EXIT_RUL, CRITICAL_RUL_THRESHOLD,
+                       CRITICAL_EXIT_RUL, ALERT_COOLDOWN_S)
 
 def get_health_status(rul, soh):
     """Determine health status based on RUL and SoH"""
@@ -394,15 +1204,189 @@ def get_health_status(rul, soh):
     else:
         return 'critical'
 
-# ==================== MAIN FUNCTION ====================
+# ==================== OFFLINE REPLAY ====================
 
-def main():
-    """Main function to run the MQTT subscriber"""
-    print("\n" + "="*60)
-    print("🚗 EV Battery Digital Twin - RUL Prediction System")
-    print("="*60 + "\n")
+def replay_csv(csv_path, sink, vehicle_id=DEFAULT_VEHICLE_ID, limit=None, alerts=True):
+    """Score a CSV with the device's schema without MQTT, writing every record to sink
+    
+    Columns are read by position like MQTT.ino does: Timestamp, then the 24
+    sensor values. Each row gets the same prediction, statistics and health
+    status as if it had been streamed through the subscriber: in incremental
+    mode the vehicle's InferenceSchedule picks the scored samples (staleness
+    measured on the recorded timestamps) and the others reuse the last
+    prediction, with statistics.reused set. Returns the number of rows
+    replayed.
+    """
+    n_columns = 1 + len(PACKED_KEYS)
+    rul_stats = RollingStats()
+    schedule = new_inference_schedule() if SCORING_MODE == "incremental" else None
+    prediction_age = 0
+    replay_alerts = new_alert_engine()
+    # Last seq_len - 1 scaled rows of the previous chunk, for windows that
+    # straddle two chunks
+    tail = np.empty((0, len(feature_names)), dtype=np.float32)
+    row_index = 0
+    predict_seconds = 0.0
+    start = time.perf_counter()
     
-    if not initialize_firebase():
+    reader = pd.read_csv(csv_path, usecols=range(n_columns), chunksize=REPLAY_CHUNK_ROWS,
+                         nrows=limit)
+    for chunk in reader:
+        n_rows = len(chunk)
+        timestamps = chunk.iloc[:, 0].astype(str).tolist()
+        values = chunk.iloc[:, 1:].to_numpy(dtype=np.float64)
+        batch = SampleBatch(PACKED_KEYS, values, parse_timestamps(timestamps),
+                            fields={'timestamp': timestamps,
+                                    'row_number': range(row_index, row_index + n_rows)},
+                            source_rows=values.tolist())
+        
+        # Features and scaling for the whole chunk, then the windows ending in
+        # it as one sliding-window view
+        raw = feature_projector.project_batch(batch.columns, batch.values, batch.timestamps)
+        block = np.concatenate([tail, (raw - scaler_center) / scaler_scale])
+        first_end = row_index - len(tail) + seq_len - 1
+        tail = block[-(seq_len - 1):].copy()
+        
+        # Windows to score, as the live subscriber would pick them
+        ends = []
+        for i in range(max(0, seq_len - 1 - row_index), n_rows):
+            end_index = row_index + i
+            if schedule is not None:
+                sample_time = batch.timestamps[i]
+                reason = schedule.decide(block[end_index - first_end + seq_len - 1],
+                                         None if np.isnan(sample_time) else sample_time)
+                if reason is None:
+                    continue
+            ends.append(end_index)
+        scored = {}
+        if ends:
+            windows = np.lib.stride_tricks.sliding_window_view(block, seq_len, axis=0).transpose(0, 2, 1)
+            predict_start = time.perf_counter()
+            preds = model.predict(windows[np.subtract(ends, first_end)], batch_size=REPLAY_PREDICT_BATCH)
+            predict_seconds += time.perf_counter() - predict_start
+            scored = dict(zip(ends, preds))
+        
+        for i in range(n_rows):
+            end_index = row_index + i
+            rul_prediction = prediction_stats = None
+            if end_index >= seq_len - 1:
+                if end_index in scored:
+                    prediction_age = 0
+                    rul_stats.push(end_index, scored[end_index])
+                else:
+                    # Not scored: the window holds the previous prediction
+                    prediction_age += 1
+                    rul_stats.push(end_index, rul_stats.last())
+                rul_stats.evict_before(first_window_end(end_index))
+                rul_prediction = rul_stats.last()
+                prediction_stats = compute_prediction_stats(rul_stats, prediction_age)
+            
+            data_entry = build_data_entry(batch.row(i), rul_prediction, prediction_stats,
+                                          vehicle_id, buffer_size_at(end_index))
+            change = None
+            if alerts:
+                # Cooldowns follow the recorded timestamps, not the replay's speed
+                sample_time = batch.timestamps[i]
+                change = replay_alerts.observe(vehicle_id, rul_prediction, data_entry['battery']['soh'],
+                                               None if np.isnan(sample_time) else sample_time)
+            if change is not None:
+                sink.add(data_entry, change[2], change[1])
+            else:
+                sink.add(data_entry)
+        
+        row_index += n_rows
+        elapsed = time.perf_counter() - start
+        print(f"⏳ Replayed {row_index} rows ({row_index / elapsed:,.0f} rows/s)")
+    
+    sink.flush()
+    elapsed = time.perf_counter() - start
+    if row_index:
+        print(f"\n📊 Replayed {row_index} rows in {elapsed:.1f} s: {row_index / elapsed:,.0f} rows/s "
+              f"({predict_seconds:.1f} s in model.predict)")
+    return row_index
+
+def run_replay(args):
+    """Replay entry point: load the model, open the sink and replay the CSV"""
+    if not load_rul_model():
+        print("⚠ RUL model loading failed. Exiting...")
+        return
+    
+    try:
+        with open(args.replay, 'rb') as f:
+            if f.read(40).startswith(b'version https://git-lfs'):
+                print(f"✗ {args.replay} is a Git LFS pointer; run 'git lfs pull' first")
+                return
+    except OSError as e:
+        print(f"✗ Cannot open {args.replay}: {e}")
+        return
+    
+    if args.sink == 'firebase':
+        if not initialize_firebase():
+            print("⚠ Firebase initialization failed. Exiting...")
+            return
+        sink = FirebaseBatchWriter(db, history_path=FIREBASE_HISTORY_PATH,
+                                   latest_path=FIREBASE_LATEST_PATH,
+                                   flush_records=REPLAY_FLUSH_RECORDS,
+                                   flush_interval_ms=FIREBASE_FLUSH_INTERVAL_MS,
+                                   shard_history=True,
+                                   latest_tolerances=LATEST_TOLERANCES if LATEST_DELTA_ENABLED else None)
+    elif args.sink == 'sqlite':
+        sink = SqliteSink(args.output or SQLITE_PATH, flush_records=REPLAY_FLUSH_RECORDS)
+        print(f"📝 Writing records to {args.output or SQLITE_PATH}")
+    elif args.sink == 'jsonl':
+        sink = JsonLinesSink(args.output or REPLAY_OUTPUT_PATH)
+        print(f"📝 Writing records to {args.output or REPLAY_OUTPUT_PATH}")
+    else:
+        sink = NullSink()
+    
+    print(f"🔄 Replaying {args.replay} as vehicle {args.vehicle_id}...")
+    try:
+        replay_csv(args.replay, sink, args.vehicle_id, args.limit, alerts=not args.no_alerts)
+    except Exception as e:
+        print(f"✗ Replay error: {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        sink.stop()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="EV Battery Digital Twin - RUL prediction subscriber")
+    parser.add_argument('--backend', choices=BACKENDS, default=None,
+                        help=f"inference backend (default: {INFERENCE_BACKEND})")
+    parser.add_argument('--replay', nargs='?', const=REPLAY_CSV_PATH, metavar='CSV',
+                        help="score a CSV offline instead of subscribing to MQTT "
+                             f"(default: {REPLAY_CSV_PATH})")
+    parser.add_argument('--sink', choices=('firebase', 'sqlite', 'jsonl', 'none'), default='jsonl',
+                        help="where replayed records go (default: jsonl)")
+    parser.add_argument('--output', default=None,
+                        help=f"file for --sink jsonl or sqlite (default: {REPLAY_OUTPUT_PATH} "
+                             f"or {SQLITE_PATH})")
+    parser.add_argument('--vehicle-id', default=DEFAULT_VEHICLE_ID,
+                        help="vehicle id recorded for replayed rows")
+    parser.add_argument('--limit', type=int, default=None, help="replay at most this many rows")
+    parser.add_argument('--no-alerts', action='store_true', help="do not write low-RUL alerts")
+    parser.add_argument('--workers', type=int, default=0, metavar='N',
+                        help="run N subscriber processes sharing the fleet (default: one process)")
+    parser.add_argument('--broker', metavar='HOST:PORT', default=None,
+                        help="plain-TCP MQTT broker instead of HiveMQ Cloud")
+    parser.add_argument('--store', choices=RECORD_SINKS, default=None,
+                        help=f"where live records go (default: {RECORD_SINK})")
+    return parser.parse_args(argv)
+
+# ==================== MAIN FUNCTION ====================
+
+def apply_broker(broker):
+    """Use a plain-TCP broker given as HOST:PORT (or HOST, port 1883)"""
+    global MQTT_BROKER, MQTT_PORT, MQTT_TLS
+    host, _, port = broker.partition(':')
+    MQTT_BROKER = host
+    MQTT_PORT = int(port) if port else 1883
+    MQTT_TLS = False
+
+def run_subscriber(client_id="rul_prediction_subscriber"):
+    """Connect to the broker and score incoming messages until interrupted"""
+    global mqtt_client
+    if RECORD_SINK == 'firebase' and not initialize_firebase():
         print("⚠ Firebase initialization failed. Exiting...")
         return
     
@@ -410,17 +1394,23 @@ def main():
         print("⚠ RUL model loading failed. Exiting...")
         return
     
+    start_pipeline()
+    if METRICS_ENABLED:
+        start_metrics_server()
+    
     # Increase max packet size for MQTT
-    client = mqtt.Client(client_id="rul_prediction_subscriber", protocol=mqtt.MQTTv311)
+    client = mqtt.Client(client_id=client_id, protocol=mqtt.MQTTv311)
     client.max_inflight_messages_set(20)
     client.max_queued_messages_set(0)
     
-    client.username_pw_set(MQTT_USER, MQTT_PASS)
-    client.tls_set()
+    if MQTT_TLS:
+        client.username_pw_set(MQTT_USER, MQTT_PASS)
+        client.tls_set()
     
     client.on_connect = on_connect
     client.on_message = on_message
     client.on_disconnect = on_disconnect
+    mqtt_client = client
     
     print(f"🔌 Connecting to {MQTT_BROKER}:{MQTT_PORT}...")
     try:
@@ -432,9 +1422,107 @@ def main():
     except KeyboardInterrupt:
         print("\n⏹ Stopping subscriber...")
         client.disconnect()
+        stop_pipeline()
+        if metrics_server is not None:
+            metrics_server.stop()
         print("✓ Disconnected successfully")
     except Exception as e:
         print(f"✗ Connection error: {e}")
 
+def _stop_on_sigterm(signum, frame):
+    # Only the first SIGTERM interrupts; a graceful stop is not interrupted again
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    raise KeyboardInterrupt
+
+def run_worker(index, n_workers, backend=None, broker=None, store=None):
+    """Entry point of scale-out worker process `index` (started by run_supervisor)"""
+    global INFERENCE_BACKEND, RECORD_SINK, SPOOL_DIR, METRICS_PORT, LATEST_DELTA_ENABLED
+    global worker_index, worker_ring
+    if backend:
+        INFERENCE_BACKEND = backend
+    if store:
+        RECORD_SINK = store
+    if broker:
+        apply_broker(broker)
+    # Each worker keeps its own spool and metrics endpoint
+    SPOOL_DIR = os.path.join(SPOOL_DIR, f"worker-{index}")
+    METRICS_PORT += 1 + index
+    # Other workers write the latest node too, so a local snapshot of it is wrong
+    LATEST_DELTA_ENABLED = False
+    worker_index = index
+    worker_ring = HashRing(range(n_workers), WORKER_RING_REPLICAS)
+    
+    # Ctrl+C reaches the whole process group; the supervisor decides when to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _stop_on_sigterm)
+    print(f"👷 Worker {index}/{n_workers} starting (pid {os.getpid()})")
+    run_subscriber(f"rul_prediction_subscriber-{index}")
+
+def run_supervisor(n_workers, backend=None, broker=None, store=None):
+    """Run n_workers subscriber processes, restarting any that exit"""
+    context = multiprocessing.get_context('spawn')
+    
+    def start_worker(index):
+        process = context.Process(target=run_worker,
+                                  args=(index, n_workers, backend, broker, store),
+                                  name=f"rul-worker-{index}")
+        process.start()
+        return process
+    
+    signal.signal(signal.SIGTERM, _stop_on_sigterm)
+    workers = {index: start_worker(index) for index in range(n_workers)}
+    restart_at = {}
+    print(f"✓ Supervisor started {n_workers} workers (shared group '{WORKER_GROUP}')")
+    try:
+        while True:
+            time.sleep(1)
+            now = time.monotonic()
+            for index, process in workers.items():
+                if process.is_alive():
+                    continue
+                if index not in restart_at:
+                    print(f"⚠ Worker {index} exited with code {process.exitcode}; "
+                          f"restarting in {WORKER_RESTART_DELAY_S}s")
+                    restart_at[index] = now + WORKER_RESTART_DELAY_S
+                elif now >= restart_at[index]:
+                    del restart_at[index]
+                    workers[index] = start_worker(index)
+                    print(f"✓ Worker {index} restarted")
+    except KeyboardInterrupt:
+        print("\n⏹ Stopping workers...")
+        for process in workers.values():
+            if process.is_alive():
+                process.terminate()
+        for index, process in workers.items():
+            process.join(WORKER_STOP_TIMEOUT_S)
+            if process.is_alive():
+                print(f"⚠ Worker {index} did not stop in {WORKER_STOP_TIMEOUT_S}s; killing it")
+                process.kill()
+                process.join()
+        print("✓ All workers stopped")
+
+def main():
+    """Main function to run the MQTT subscriber"""
+    global INFERENCE_BACKEND, RECORD_SINK
+    args = parse_args()
+    if args.backend:
+        INFERENCE_BACKEND = args.backend
+    if args.store:
+        RECORD_SINK = args.store
+    if args.broker:
+        apply_broker(args.broker)
+    if args.replay:
+        run_replay(args)
+        return
+    
+    print("\n" + "="*60)
+    print("🚗 EV Battery Digital Twin - RUL Prediction System")
+    print("="*60 + "\n")
+    
+    if args.workers > 0:
+        run_supervisor(args.workers, args.backend, args.broker, args.store)
+    else:
+        run_subscriber()
+
 if __name__ == "__main__":
-    main()  
\ No newline at end of file
+    main()
@@ -0,0 +1,205 @@
+"""
+TensorFlow-free forward pass for the recurrent RUL models.
+
+extract_weights() runs once, wherever TensorFlow is available, and saves a
+Keras model's architecture and weights to an .npz file. NumpyRecurrentModel
+loads that file with nothing but NumPy and scores a batch of windows:
+
+  LSTM   the input projection of every timestep is one matrix multiply;
+         each step then does one fused h @ U for all four gates (Keras gate
+         order i, f, c, o)
+  GRU    same, with Keras' gate order z, r, h; both reset_after=True (the
+         Keras 2.x/3 default) and reset_after=False are supported
+  Dense  matrix multiply plus relu/linear/tanh/sigmoid
+  Dropout is the identity at inference time
+
+This covers the stacked LSTM(128) -> LSTM(64) -> LSTM(32) -> Dense(16) ->
+Dense(1) model and the GRU variant trained in EV_Model_Comparison.ipynb.
+Sigmoids are evaluated as 0.5 * (1 + tanh(x / 2)), which cannot overflow.
+
+    python numpy_engine.py best_rul_model.keras best_rul_model.npz
+"""
+
+import json
+import sys
+
+import numpy as np
+
+# Windows scored per forward pass; bounds the (windows, seq_len, 4 * units)
+# input projection to a few tens of MB
+MAX_BATCH = 1024
+
+def _sigmoid(x, out=None):
+    out = np.multiply(x, 0.5, out=out)
+    np.tanh(out, out=out)
+    out += 1.0
+    out *= 0.5
+    return out
+
+def _relu(x, out=None):
+    return np.maximum(x, 0.0, out=out)
+
+def _linear(x, out=None):
+    if out is None:
+        return x
+    out[...] = x
+    return out
+
+def _tanh(x, out=None):
+    return np.tanh(x, out=out)
+
+ACTIVATIONS = {'tanh': _tanh, 'sigmoid': _sigmoid, 'relu': _relu, 'linear': _linear}
+
+# ==================== WEIGHT EXTRACTION ====================
+
+def extract_weights(keras_model, path):
+    """Save a Sequential Keras model's layers and weights for NumpyRecurrentModel"""
+    layers = []
+    arrays = {}
+    for layer in keras_model.layers:
+        kind = type(layer).__name__
+        config = layer.get_config()
+        if kind == 'Dropout' or kind == 'InputLayer':
+            continue
+        if kind not in ('LSTM', 'GRU', 'Dense'):
+            raise ValueError(f"Layer {layer.name} ({kind}) is not supported by the NumPy engine")
+        spec = {'type': kind.lower(), 'units': config['units'],
+                'activation': config['activation']}
+        if kind != 'Dense':
+            spec['recurrent_activation'] = config['recurrent_activation']
+            spec['return_sequences'] = config['return_sequences']
+            if config.get('go_backwards') or config.get('stateful'):
+                raise ValueError(f"Layer {layer.name}: go_backwards/stateful RNNs are not supported")
+        if kind == 'GRU':
+            spec['reset_after'] = config.get('reset_after', True)
+        for name in [spec['activation'], spec.get('recurrent_activation', 'linear')]:
+            if name not in ACTIVATIONS:
+                raise ValueError(f"Layer {layer.name}: unsupported activation {name!r}")
+
+        index = len(layers)
+        weights = layer.get_weights()
+        arrays[f'{index}/kernel'] = weights[0].astype(np.float32)
+        if kind == 'Dense':
+            bias = weights[1] if len(weights) > 1 else np.zeros(spec['units'])
+        else:
+            arrays[f'{index}/recurrent_kernel'] = weights[1].astype(np.float32)
+            bias = weights[2] if len(weights) > 2 else np.zeros(weights[1].shape[1])
+            if kind == 'GRU' and spec['reset_after'] and bias.ndim == 1:
+                bias = np.stack([bias, np.zeros_like(bias)])
+        arrays[f'{index}/bias'] = np.asarray(bias, dtype=np.float32)
+        layers.append(spec)
+
+    input_shape = [int(dim) for dim in keras_model.input_shape[1:]]
+    np.savez(path, architecture=np.array(json.dumps({'input_shape': input_shape, 'layers': layers})),
+             **arrays)
+
+# ==================== FORWARD PASS ====================
+
+class NumpyRecurrentModel:
+    """Stacked LSTM/GRU/Dense model evaluated with NumPy"""
+
+    def __init__(self, path):
+        with np.load(path, allow_pickle=False) as data:
+            architecture = json.loads(str(data['architecture']))
+            self.layers = []
+            for index, spec in enumerate(architecture['layers']):
+                weights = {name: data[f'{index}/{name}']
+                           for name in ('kernel', 'recurrent_kernel', 'bias')
+                           if f'{index}/{name}' in data}
+                self.layers.append((spec, weights))
+        self.input_shape = tuple(architecture['input_shape'])
+
+    def predict(self, windows):
+        """Model output for (n_windows, seq_len, n_features) windows, flattened"""
+        x = np.asarray(windows, dtype=np.float32)
+        if x.ndim != 3 or x.shape[1:] != self.input_shape:
+            raise ValueError(f"Expected windows of shape (n, {', '.join(map(str, self.input_shape))}), "
+                             f"got {x.shape}")
+        if len(x) > MAX_BATCH:
+            return np.concatenate([self.predict(x[start:start + MAX_BATCH])
+                                   for start in range(0, len(x), MAX_BATCH)])
+        for spec, weights in self.layers:
+            if spec['type'] == 'lstm':
+                x = self._lstm(x, spec, weights)
+            elif spec['type'] == 'gru':
+                x = self._gru(x, spec, weights)
+            else:
+                x = ACTIVATIONS[spec['activation']](x @ weights['kernel'] + weights['bias'])
+        return x.reshape(-1)
+
+    @staticmethod
+    def _input_projection(x, kernel, bias):
+        """x @ kernel + bias for every timestep at once, as (seq_len, n, gates)"""
+        n_windows, seq_len, n_inputs = x.shape
+        # Time-major so each step reads one contiguous block
+        projected = np.ascontiguousarray(x.transpose(1, 0, 2)).reshape(-1, n_inputs) @ kernel
+        projected += bias
+        return projected.reshape(seq_len, n_windows, -1)
+
+    def _lstm(self, x, spec, weights):
+        units = spec['units']
+        activation = ACTIVATIONS[spec['activation']]
+        recurrent_activation = ACTIVATIONS[spec['recurrent_activation']]
+        n_windows, seq_len, _ = x.shape
+        projected = self._input_projection(x, weights['kernel'], weights['bias'])
+        recurrent_kernel = weights['recurrent_kernel']
+
+        h = np.zeros((n_windows, units), dtype=np.float32)
+        c = np.zeros((n_windows, units), dtype=np.float32)
+        z = np.empty((n_windows, 4 * units), dtype=np.float32)
+        outputs = np.empty((n_windows, seq_len, units), dtype=np.float32) if spec['return_sequences'] else None
+        for t in range(seq_len):
+            np.matmul(h, recurrent_kernel, out=z)
+            z += projected[t]
+            # Input and forget gates are adjacent: one activation call for both
+            recurrent_activation(z[:, :2 * units], out=z[:, :2 * units])
+            recurrent_activation(z[:, 3 * units:], out=z[:, 3 * units:])
+            candidate = activation(z[:, 2 * units:3 * units], out=z[:, 2 * units:3 * units])
+            c *= z[:, units:2 * units]
+            c += z[:, :units] * candidate
+            h = z[:, 3 * units:] * activation(c)
+            if outputs is not None:
+                outputs[:, t] = h
+        return outputs if outputs is not None else h
+
+    def _gru(self, x, spec, weights):
+        units = spec['units']
+        activation = ACTIVATIONS[spec['activation']]
+        recurrent_activation = ACTIVATIONS[spec['recurrent_activation']]
+        n_windows, seq_len, _ = x.shape
+        bias = weights['bias']
+        reset_after = spec['reset_after']
+        input_bias = bias[0] if reset_after else bias
+        projected = self._input_projection(x, weights['kernel'], input_bias)
+        recurrent_kernel = weights['recurrent_kernel']
+
+        h = np.zeros((n_windows, units), dtype=np.float32)
+        outputs = np.empty((n_windows, seq_len, units), dtype=np.float32) if spec['return_sequences'] else None
+        for t in range(seq_len):
+            step = projected[t]
+            if reset_after:
+                # Keras applies the reset gate after the recurrent matmul
+                hidden = h @ recurrent_kernel + bias[1]
+                gates = recurrent_activation(step[:, :2 * units] + hidden[:, :2 * units])
+                candidate = activation(step[:, 2 * units:] + gates[:, units:] * hidden[:, 2 * units:])
+            else:
+                gates = recurrent_activation(step[:, :2 * units] + h @ recurrent_kernel[:, :2 * units])
+                candidate = activation(step[:, 2 * units:]
+                                       + (gates[:, units:] * h) @ recurrent_kernel[:, 2 * units:])
+            update = gates[:, :units]
+            h = update * h + (1.0 - update) * candidate
+            if outputs is not None:
+                outputs[:, t] = h
+        return outputs if outputs is not None else h
+
+def main():
+    """Extract a Keras model's weights: numpy_engine.py MODEL.keras OUTPUT.npz"""
+    if len(sys.argv) != 3:
+        print("Usage: python numpy_engine.py MODEL.keras OUTPUT.npz")
+        sys.exit(1)
+    from tensorflow.keras.models import load_model
+    extract_weights(load_model(sys.argv[1]), sys.argv[2])
+    print(f"✓ Weights of {sys.argv[1]} saved to {sys.argv[2]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Bounded, multi-stage processing pipeline for the RUL subscriber.
+
+Each Stage owns a pool of worker threads fed by BoundedQueue instances.
+When a queue is full its policy decides what happens to new items:
+
+  BLOCK        the producer waits until a worker frees a slot (backpressure)
+  DROP_OLDEST  the oldest *droppable* item is discarded to make room; items
+               queued with droppable=False are never discarded (if the queue
+               holds only such items, a new droppable item is discarded and
+               a new non-droppable item waits for space)
+  DROP_NEWEST  the new item is discarded (non-droppable items wait instead)
+"""
+
+import threading
+import time
+from collections import deque
+
+BLOCK = "block"
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+
+# Marker pushed onto a queue to stop the worker reading it
+_STOP = object()
+
+class BoundedQueue:
+    """Thread-safe FIFO with a maximum size and a full-queue policy"""
+
+    def __init__(self, maxsize, policy=BLOCK):
+        if policy not in (BLOCK, DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Unknown queue policy: {policy}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.items = deque()
+        self.dropped = 0
+        self.condition = threading.Condition()
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, item, droppable=True):
+        """Queue an item, applying the full-queue policy; returns False if dropped"""
+        with self.condition:
+            while len(self.items) >= self.maxsize:
+                if droppable and self.policy == DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                if self.policy == DROP_OLDEST:
+                    if self._drop_oldest():
+                        break
+                    if droppable:
+                        self.dropped += 1
+                        return False
+                self.condition.wait()
+            self.items.append((item, droppable))
+            self.condition.notify_all()
+            return True
+
+    def put_control(self, item):
+        """Queue an item regardless of size (used for stop markers)"""
+        with self.condition:
+            self.items.append((item, False))
+            self.condition.notify_all()
+
+    def get(self):
+        """Remove and return the oldest item, waiting until one is available"""
+        with self.condition:
+            while not self.items:
+                self.condition.wait()
+            item, _ = self.items.popleft()
+            self.condition.notify_all()
+            return item
+
+    def _drop_oldest(self):
+        for index, (_, droppable) in enumerate(self.items):
+            if droppable:
+                del self.items[index]
+                self.dropped += 1
+                return True
+        return False
+
+class Stage:
+    """A named pool of worker threads, each calling handler(item)
+
+    With a partition_key function every worker gets its own queue and items
+    with the same key always go to the same worker, so per-key ordering is
+    preserved. Without one, all workers share a single queue.
+    """
+
+    def __init__(self, name, handler, workers=1, maxsize=1000, policy=BLOCK,
+                 partition_key=None):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.partition_key = partition_key
+        self.processed = 0
+        self.errors = 0
+
+        n_queues = self.workers if partition_key is not None else 1
+        self.queues = [BoundedQueue(maxsize, policy) for _ in range(n_queues)]
+        self.threads = []
+        for index in range(self.workers):
+            queue = self.queues[index % n_queues]
+            thread = threading.Thread(target=self._run, args=(queue,),
+                                      name=f"{name}-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def put(self, item, droppable=True):
+        """Hand an item to the stage; returns False if the queue policy dropped it"""
+        return self._queue_for(item).put(item, droppable)
+
+    def depth(self):
+        """Number of items currently queued across all workers"""
+        return sum(len(queue) for queue in self.queues)
+
+    def dropped(self):
+        """Number of items discarded by the queue policy"""
+        return sum(queue.dropped for queue in self.queues)
+
+    def stop(self, timeout=None):
+        """Let workers drain their queues, then stop them"""
+        for index in range(self.workers):
+            self.queues[index % len(self.queues)].put_control(_STOP)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self.threads:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            thread.join(remaining)
+
+    def _queue_for(self, item):
+        if len(self.queues) == 1:
+            return self.queues[0]
+        return self.queues[hash(self.partition_key(item)) % len(self.queues)]
+
+    def _run(self, queue):
+        while True:
+            item = queue.get()
+            if item is _STOP:
+                return
+            try:
+                self.handler(item)
+                self.processed += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"✗ {self.name} stage error: {e}")
+                import traceback
+                traceback.print_exc()
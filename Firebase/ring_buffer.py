@@ -0,0 +1,103 @@
+"""
+Preallocated ring buffer of scaled feature rows.
+
+Rows are scaled once on arrival with the RobustScaler's center_/scale_
+folded into plain float32 arrays, so no sklearn call is needed on the hot
+path. Every row is written twice, at slot p and p + slots, which makes any
+run of up to `slots` consecutive rows a contiguous slice: windows are
+returned as zero-copy views.
+
+`capacity` is the logical buffer length (what len() reports); `headroom`
+extra slots keep recent rows that have left the logical buffer readable,
+so windows queued for scoring survive a burst of newer samples.
+"""
+
+import numpy as np
+
+def fold_robust_scaler(scaler, n_features):
+    """(center, scale) float32 arrays equivalent to scaler.transform"""
+    center = getattr(scaler, 'center_', None)
+    scale = getattr(scaler, 'scale_', None)
+    if center is None or not getattr(scaler, 'with_centering', True):
+        center = np.zeros(n_features)
+    if scale is None or not getattr(scaler, 'with_scaling', True):
+        scale = np.ones(n_features)
+    return np.asarray(center, dtype=np.float32), np.asarray(scale, dtype=np.float32)
+
+class ScaledRingBuffer:
+    """Fixed-capacity float32 ring of scaled rows with contiguous window views"""
+
+    def __init__(self, capacity, n_features, center, scale, headroom=0):
+        self.capacity = capacity
+        self.slots = capacity + headroom
+        self.n_features = n_features
+        self.center = center
+        self.scale = scale
+        self.data = np.zeros((2 * self.slots, n_features), dtype=np.float32)
+        # Total rows ever appended; row i (absolute) lives at slot i % slots
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def next_slot(self):
+        """View of the slot the next row will occupy, to be filled with raw features"""
+        return self.data[self.count % self.slots]
+
+    def commit(self):
+        """Scale the row written into next_slot() in place and append it"""
+        position = self.count % self.slots
+        row = self.data[position]
+        np.subtract(row, self.center, out=row)
+        np.divide(row, self.scale, out=row)
+        self.data[position + self.slots] = row
+        self.count += 1
+
+    def append(self, raw_row):
+        """Copy a raw feature row in, scale it and append it"""
+        self.next_slot()[:] = raw_row
+        self.commit()
+
+    def extend(self, raw_rows):
+        """Scale a 2-D block of raw feature rows as a whole and append it"""
+        if len(raw_rows) > self.slots:
+            # Only the newest `slots` rows can be kept
+            self.count += len(raw_rows) - self.slots
+            raw_rows = raw_rows[-self.slots:]
+        n_rows = len(raw_rows)
+        position = self.count % self.slots
+        block = self.data[position:position + n_rows]
+        np.subtract(raw_rows, self.center, out=block)
+        np.divide(block, self.scale, out=block)
+        # Mirror into the other copy: rows that landed in the first half go
+        # to +slots, rows that ran past it into the second half to -slots
+        split = min(position + n_rows, self.slots)
+        self.data[position + self.slots:split + self.slots] = self.data[position:split]
+        self.data[:position + n_rows - split] = self.data[self.slots:position + n_rows]
+        self.count += n_rows
+
+    def oldest_index(self):
+        """Absolute index of the oldest row in the logical buffer"""
+        return self.count - len(self)
+
+    def holds(self, first_index):
+        """Whether rows first_index .. count-1 are all still readable
+
+        The slot handed out by next_slot() is excluded, since it may be
+        being overwritten with the next row.
+        """
+        return first_index > self.count - self.slots
+
+    def rows(self, first_index, last_index):
+        """Zero-copy view of absolute rows first_index..last_index (inclusive)"""
+        length = last_index - first_index + 1
+        if length > self.slots or not self.holds(first_index) or last_index >= self.count:
+            raise IndexError(f"Rows {first_index}..{last_index} are not in the buffer")
+        start = first_index % self.slots
+        return self.data[start:start + length]
+
+    def windows(self, first_end, last_end, seq_len):
+        """Zero-copy (n_windows, seq_len, n_features) view of the windows
+        ending at absolute rows first_end..last_end"""
+        block = self.rows(first_end - seq_len + 1, last_end)
+        return np.lib.stride_tricks.sliding_window_view(block, seq_len, axis=0).transpose(0, 2, 1)
@@ -0,0 +1,151 @@
+"""
+Constant-time rolling statistics over a sliding window of (index, value)
+points, used for the per-vehicle RUL prediction statistics.
+
+Points enter at the newest index and leave from the oldest. Mean and
+(population) standard deviation use Welford updates with removal, min and
+max use monotonic deques, and the least-squares slope of value against
+index uses the same centered co-moment updates, so every operation is O(1)
+amortized regardless of window length. The running moments are rebuilt
+from the stored points every RECOMPUTE_INTERVAL updates to stop
+floating-point drift from accumulating over long runs.
+"""
+
+import math
+from collections import deque
+
+RECOMPUTE_INTERVAL = 10000
+
+class RollingStats:
+    """Mean/std/min/max/slope over a sliding window of (index, value) points"""
+
+    def __init__(self):
+        self.points = deque()
+        self.min_points = deque()  # values increasing from front to back
+        self.max_points = deque()  # values decreasing from front to back
+        self._reset_moments()
+
+    def __len__(self):
+        return len(self.points)
+
+    def reset(self):
+        """Forget every point (e.g. before a cold recompute)"""
+        self.points.clear()
+        self.min_points.clear()
+        self.max_points.clear()
+        self._reset_moments()
+
+    def push(self, index, value):
+        """Add the point for `index`, which must be newer than every held point"""
+        value = float(value)
+        self.points.append((index, value))
+        while self.min_points and self.min_points[-1][1] >= value:
+            self.min_points.pop()
+        self.min_points.append((index, value))
+        while self.max_points and self.max_points[-1][1] <= value:
+            self.max_points.pop()
+        self.max_points.append((index, value))
+
+        self.n += 1
+        dx = index - self.mean_x
+        dy = value - self.mean_y
+        self.mean_x += dx / self.n
+        self.mean_y += dy / self.n
+        self.m2_x += dx * (index - self.mean_x)
+        self.m2_y += dy * (value - self.mean_y)
+        self.c_xy += dx * (value - self.mean_y)
+        self._count_update()
+
+    def evict_before(self, min_index):
+        """Drop every point whose index is below min_index"""
+        while self.points and self.points[0][0] < min_index:
+            index, value = self.points.popleft()
+            if self.min_points[0][0] == index:
+                self.min_points.popleft()
+            if self.max_points[0][0] == index:
+                self.max_points.popleft()
+            self._remove_moments(index, value)
+
+    # ---------- statistics ----------
+
+    def last(self):
+        return self.points[-1][1]
+
+    def first(self):
+        return self.points[0][1]
+
+    def mean(self):
+        return self.mean_y
+
+    def std(self):
+        return math.sqrt(max(self.m2_y, 0.0) / self.n) if self.n else 0.0
+
+    def min(self):
+        return self.min_points[0][1]
+
+    def max(self):
+        return self.max_points[0][1]
+
+    def slope(self):
+        """Least-squares slope of value against index (0 for fewer than two points)"""
+        if self.n < 2 or self.m2_x <= 0:
+            return 0.0
+        return self.c_xy / self.m2_x
+
+    # ---------- internals ----------
+
+    def _reset_moments(self):
+        self.n = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.m2_x = 0.0
+        self.m2_y = 0.0
+        self.c_xy = 0.0
+        self.updates = 0
+
+    def _remove_moments(self, index, value):
+        if self.n <= 1:
+            self._reset_moments()
+            return
+        if self.n == 2:
+            # One point left: its moments are exact, without removal round-off
+            updates = self.updates
+            self._reset_moments()
+            self.updates = updates
+            self.n = 1
+            index, value = self.points[0]
+            self.mean_x = float(index)
+            self.mean_y = value
+            self._count_update()
+            return
+        # Inverse of the push() update: means after removal, then take the
+        # removed point's contribution out of the co-moments
+        old_mean_x = self.mean_x
+        old_mean_y = self.mean_y
+        self.n -= 1
+        self.mean_x -= (index - old_mean_x) / self.n
+        self.mean_y -= (value - old_mean_y) / self.n
+        self.m2_x -= (index - self.mean_x) * (index - old_mean_x)
+        self.m2_y -= (value - self.mean_y) * (value - old_mean_y)
+        self.c_xy -= (index - self.mean_x) * (value - old_mean_y)
+        self._count_update()
+
+    def _count_update(self):
+        self.updates += 1
+        if self.updates >= RECOMPUTE_INTERVAL:
+            self._recompute()
+
+    def _recompute(self):
+        """Rebuild the running moments exactly from the held points"""
+        self._reset_moments()
+        if not self.points:
+            return
+        n = len(self.points)
+        mean_x = sum(index for index, _ in self.points) / n
+        mean_y = sum(value for _, value in self.points) / n
+        self.n = n
+        self.mean_x = mean_x
+        self.mean_y = mean_y
+        self.m2_x = sum((index - mean_x) ** 2 for index, _ in self.points)
+        self.m2_y = sum((value - mean_y) ** 2 for _, value in self.points)
+        self.c_xy = sum((index - mean_x) * (value - mean_y) for index, value in self.points)
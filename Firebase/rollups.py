@@ -0,0 +1,175 @@
+"""
+Incremental time-bucket rollups of the subscriber's records.
+
+For every vehicle, a RollupAggregator keeps one open bucket per resolution
+(1 minute, 15 minutes and 1 hour by default) in memory. It tracks min, max,
+mean and last of SoC, SoH, battery temperature and RUL. Records are
+bucketed by their sample time, with buckets aligned to local wall-clock
+time. A bucket is closed when a record for a later bucket arrives, or when
+close_expired() finds its interval (plus a grace period) over; that is
+measured on the arrival clock from the bucket's first record, so samples
+that lag the clock (device clock skew, backlog) still fill their buckets.
+Each closed bucket is returned once, as one path -> value update:
+
+    <root>/<vehicle>/<resolution>/<YYYY-MM-DD>/<HHMM>
+        {'start': '2024-05-01T10:15:00', 'seconds': 900, 'count': 90,
+         'soc': {'min': .., 'max': .., 'mean': .., 'last': ..}, ...}
+
+A day of 15-minute rollups is 96 points, which dashboards can read in one
+query instead of thousands of raw rows.
+
+Resolutions no wider than a vehicle's sample spacing are skipped for that
+vehicle: each of their buckets would hold a single record, so they would
+cost as many writes as the raw rows and add nothing. The recorded dataset
+is sampled every 15 minutes, which leaves only the hourly rollups; a
+vehicle's first record is rolled up at every resolution, since its spacing
+is not known yet.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+
+RESOLUTIONS = {'1m': 60, '15m': 15 * 60, '1h': 60 * 60}
+ROLLUP_FIELDS = ('soc', 'soh', 'temperature', 'rul')
+
+# Characters Firebase does not allow in a key
+_KEY_TRANSLATION = str.maketrans({c: '_' for c in '.$#[]/'})
+
+def firebase_key(text):
+    """text made usable as one Firebase path segment"""
+    return str(text).translate(_KEY_TRANSLATION) or '_'
+
+def local_seconds(timestamp):
+    """Epoch seconds shifted so that bucket boundaries fall on local wall-clock time"""
+    return timestamp + time.localtime(timestamp).tm_gmtoff
+
+class Bucket:
+    """Statistics of the records in one time bucket"""
+
+    __slots__ = ('start', 'deadline', 'count', 'stats')
+
+    def __init__(self, start, deadline, n_fields):
+        self.start = start
+        # Arrival time (epoch seconds) at which the interval is over
+        self.deadline = deadline
+        self.count = 0
+        # Per field: [min, max, sum, n, last], or None until a value arrives
+        self.stats = [None] * n_fields
+
+    def add(self, values):
+        self.count += 1
+        for i, value in enumerate(values):
+            if value is None:
+                continue
+            stats = self.stats[i]
+            if stats is None:
+                self.stats[i] = [value, value, value, 1, value]
+                continue
+            if value < stats[0]:
+                stats[0] = value
+            if value > stats[1]:
+                stats[1] = value
+            stats[2] += value
+            stats[3] += 1
+            stats[4] = value
+
+    def to_dict(self, fields, seconds):
+        rollup = {
+            'start': datetime.fromtimestamp(self.start, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S'),
+            'seconds': seconds,
+            'count': self.count
+        }
+        for name, stats in zip(fields, self.stats):
+            if stats is not None:
+                rollup[name] = {'min': stats[0], 'max': stats[1],
+                                'mean': stats[2] / stats[3], 'last': stats[4]}
+        return rollup
+
+class RollupAggregator:
+    """Open per-vehicle buckets at every resolution; returns buckets as they close"""
+
+    def __init__(self, root='ev_battery_rollups', resolutions=RESOLUTIONS,
+                 fields=ROLLUP_FIELDS, grace_s=5):
+        self.root = root
+        self.resolutions = list(resolutions.items())
+        self.fields = tuple(fields)
+        self.grace_s = grace_s
+        # vehicle id -> [open Bucket or None, one per resolution]
+        self.open = {}
+        # vehicle id -> last sample time, and smallest gap between samples
+        self.last_sample = {}
+        self.spacing = {}
+        self.lock = threading.Lock()
+
+    def add(self, vehicle_id, timestamp, values, now=None):
+        """Add one record's values (in `fields` order, None if missing) sampled at
+        epoch seconds `timestamp` and arriving at `now` (default: the current
+        time); returns the buckets this closed as {path: rollup}"""
+        if now is None:
+            now = time.time()
+        local = local_seconds(timestamp)
+        closed = {}
+        with self.lock:
+            buckets = self.open.get(vehicle_id)
+            if buckets is None:
+                buckets = self.open[vehicle_id] = [None] * len(self.resolutions)
+            spacing = self._update_spacing(vehicle_id, timestamp)
+            for i, (name, seconds) in enumerate(self.resolutions):
+                bucket = buckets[i]
+                if spacing is not None and seconds <= spacing:
+                    # At most one record per bucket: not worth a rollup
+                    if bucket is not None:
+                        self._close(closed, vehicle_id, i, bucket)
+                        buckets[i] = None
+                    continue
+                start = local - local % seconds
+                if bucket is not None and start > bucket.start:
+                    self._close(closed, vehicle_id, i, bucket)
+                    bucket = None
+                if bucket is None:
+                    bucket = buckets[i] = Bucket(start, now + start + seconds - local,
+                                                 len(self.fields))
+                # A record from before the open bucket (out of order) is counted in it
+                bucket.add(values)
+        return closed
+
+    def close_expired(self, now=None):
+        """Close every bucket whose interval ended more than grace_s ago"""
+        cutoff = (time.time() if now is None else now) - self.grace_s
+        closed = {}
+        with self.lock:
+            for vehicle_id, buckets in self.open.items():
+                for i, bucket in enumerate(buckets):
+                    if bucket is not None and bucket.deadline <= cutoff:
+                        self._close(closed, vehicle_id, i, bucket)
+                        buckets[i] = None
+        return closed
+
+    def close_all(self):
+        """Close every open bucket, complete or not (at shutdown)"""
+        closed = {}
+        with self.lock:
+            for vehicle_id, buckets in self.open.items():
+                for i, bucket in enumerate(buckets):
+                    if bucket is not None:
+                        self._close(closed, vehicle_id, i, bucket)
+            self.open.clear()
+        return closed
+
+    def _update_spacing(self, vehicle_id, timestamp):
+        """Smallest gap seen between a vehicle's samples, or None"""
+        previous = self.last_sample.get(vehicle_id)
+        self.last_sample[vehicle_id] = timestamp
+        spacing = self.spacing.get(vehicle_id)
+        if previous is not None and timestamp > previous:
+            if spacing is None or timestamp - previous < spacing:
+                spacing = self.spacing[vehicle_id] = timestamp - previous
+        return spacing
+
+    def _close(self, closed, vehicle_id, index, bucket):
+        name, seconds = self.resolutions[index]
+        start = datetime.fromtimestamp(bucket.start, timezone.utc)
+        path = (f"{self.root}/{firebase_key(vehicle_id)}/{name}/"
+                f"{start.strftime('%Y-%m-%d')}/{start.strftime('%H%M')}")
+        closed[path] = bucket.to_dict(self.fields, seconds)
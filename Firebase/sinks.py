@@ -0,0 +1,60 @@
+"""
+Bulk record sinks for offline replay.
+
+Each sink takes the same calls as FirebaseBatchWriter: add(data_entry,
+alert=None, alert_key=None) returns the record key, flush() writes what is buffered and
+stop() flushes and closes. Replay can therefore write to Firebase (a
+FirebaseBatchWriter with large flushes), a local SQLite database
+(sqlite_store.SqliteSink), a JSON-lines file, or nowhere.
+"""
+
+import json
+
+from firebase_writer import generate_push_id
+
+class JsonLinesSink:
+    """Appends one JSON object per record to a file, in buffered blocks"""
+
+    def __init__(self, path, flush_records=5000):
+        self.path = path
+        self.flush_records = flush_records
+        self.file = open(path, 'a', encoding='utf-8')
+        self.pending = []
+        self.written = 0
+
+    def add(self, data_entry, alert=None, alert_key=None):
+        record = {'key': generate_push_id(), 'entry': data_entry}
+        if alert is not None:
+            alert['data_key'] = record['key']
+            record['alert_key'] = alert_key or generate_push_id()
+            record['alert'] = alert
+        self.pending.append(json.dumps(record))
+        if len(self.pending) >= self.flush_records:
+            self.flush()
+        return record['key']
+
+    def flush(self):
+        if self.pending:
+            self.file.write('\n'.join(self.pending) + '\n')
+            self.written += len(self.pending)
+            self.pending = []
+
+    def stop(self):
+        self.flush()
+        self.file.close()
+
+class NullSink:
+    """Discards records (scoring-only replay and benchmarks)"""
+
+    def __init__(self):
+        self.written = 0
+
+    def add(self, data_entry, alert=None, alert_key=None):
+        self.written += 1
+        return None
+
+    def flush(self):
+        pass
+
+    def stop(self):
+        pass
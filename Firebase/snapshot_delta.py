@@ -0,0 +1,88 @@
+"""
+Leaf-path deltas against the last written copy of a Firebase document.
+
+SnapshotDelta remembers what was last written to a node (e.g.
+ev_battery_data/latest) and turns the next full document into the
+{relative path: value} updates that bring the stored copy up to date:
+
+  - leaves whose value did not change are left out;
+  - numeric leaves count as changed only if they moved by more than their
+    tolerance (by leaf path, e.g. 'battery/voltage'), so sensor noise does
+    not cause writes; the stored value drifts at most one tolerance away.
+    A leaf turning NaN, or back from NaN, always counts as changed;
+  - keys that disappeared are deleted (written as None);
+  - the first document, or one whose root is not a dict, is written whole
+    under the path ''.
+
+Deltas are only folded into the snapshot with commit(), once the write has
+succeeded, so a failed write is retried against what is really stored.
+"""
+
+import copy
+import math
+
+_MISSING = object()
+
+class SnapshotDelta:
+    """Diffs documents against the last committed snapshot"""
+
+    def __init__(self, tolerances=None, default_tolerance=0.0):
+        self.tolerances = dict(tolerances or {})
+        self.default_tolerance = default_tolerance
+        self.snapshot = None
+
+    def reset(self):
+        """Forget the snapshot; the next document is written whole"""
+        self.snapshot = None
+
+    def diff(self, document):
+        """{relative path: value} updates turning the snapshot into document"""
+        if not isinstance(self.snapshot, dict) or not isinstance(document, dict):
+            return {'': document}
+        changes = {}
+        self._diff(self.snapshot, document, '', changes)
+        return changes
+
+    def commit(self, changes):
+        """Record that changes (from diff) were written"""
+        for path, value in changes.items():
+            value = copy.deepcopy(value)
+            if path == '':
+                self.snapshot = value
+                continue
+            parts = path.split('/')
+            node = self.snapshot
+            for part in parts[:-1]:
+                child = node.get(part)
+                if not isinstance(child, dict):
+                    child = node[part] = {}
+                node = child
+            if value is None:
+                node.pop(parts[-1], None)
+            else:
+                node[parts[-1]] = value
+
+    def _diff(self, old, new, prefix, changes):
+        for key, value in new.items():
+            path = prefix + key
+            previous = old.get(key, _MISSING)
+            if isinstance(value, dict) and isinstance(previous, dict):
+                self._diff(previous, value, path + '/', changes)
+            elif previous is _MISSING:
+                if value is not None:
+                    changes[path] = value
+            elif self._changed(path, previous, value):
+                changes[path] = value
+        for key in old:
+            if key not in new:
+                changes[prefix + key] = None
+
+    def _changed(self, path, previous, value):
+        if _is_number(value) and _is_number(previous):
+            if math.isnan(value) or math.isnan(previous):
+                return not (math.isnan(value) and math.isnan(previous))
+            return abs(value - previous) > self.tolerances.get(path, self.default_tolerance)
+        return value != previous
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
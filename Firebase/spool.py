@@ -0,0 +1,243 @@
+"""
+Append-only local write-ahead spool for outgoing Firebase records.
+
+Records are JSON documents stored in segment files as
+
+    [4-byte big-endian length][4-byte CRC32][JSON bytes]
+
+Appends are buffered and fsync'd in batches (every fsync_records records,
+every fsync_interval_ms, or on an explicit sync()). Positions are
+(segment_id, byte_offset) tuples; ack(position) persists a checkpoint and
+deletes every segment that lies entirely before it. A torn record at the
+tail of the last segment (e.g. after a crash) is truncated on open. A
+corrupt record anywhere else (bad length or CRC) is skipped: reading
+resumes at the next intact record, and the skipped bytes are logged and
+counted in corrupt_records.
+"""
+
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+HEADER = struct.Struct('>II')
+SEGMENT_PREFIX = 'segment-'
+SEGMENT_SUFFIX = '.log'
+CHECKPOINT_FILE = 'checkpoint.json'
+
+# _read_record result for a frame whose length or CRC does not check out
+_CORRUPT = object()
+
+class WriteAheadSpool:
+    """Durable FIFO of JSON records backed by rolling segment files"""
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024,
+                 fsync_records=500, fsync_interval_ms=1000):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_records = fsync_records
+        self.fsync_interval = fsync_interval_ms / 1000.0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # Corrupt regions skipped so far, as (segment_id, offset)
+        self.corrupt_regions = set()
+        self.corrupt_records = 0
+
+        self.acked = self._load_checkpoint()
+        segments = self._segment_ids()
+        self.active_id = segments[-1] if segments else max(1, self.acked[0])
+        self.file = open(self._segment_path(self.active_id), 'ab')
+        self._truncate_torn_tail()
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    # ---------- writing ----------
+
+    def append(self, record):
+        """Append a record; returns the position just after it"""
+        data = json.dumps(record, separators=(',', ':')).encode('utf-8')
+        with self.lock:
+            if self.file.tell() >= self.segment_bytes:
+                self._roll()
+            self.file.write(HEADER.pack(len(data), zlib.crc32(data)))
+            self.file.write(data)
+            self.unsynced += 1
+            if (self.unsynced >= self.fsync_records
+                    or time.monotonic() - self.last_sync >= self.fsync_interval):
+                self._sync()
+            return (self.active_id, self.file.tell())
+
+    def sync(self):
+        """Flush and fsync everything appended so far"""
+        with self.lock:
+            self._sync()
+
+    # ---------- reading & acknowledgment ----------
+
+    def read(self, position=None, max_records=1000):
+        """Read up to max_records records after position (default: the ack cursor)
+
+        Returns a list of (position_after_record, record).
+        """
+        with self.lock:
+            self.file.flush()
+            end = (self.active_id, self.file.tell())
+        segment_id, offset = position or self.acked
+        records = []
+
+        for current_id in self._segment_ids():
+            if current_id < segment_id:
+                continue
+            if current_id > segment_id:
+                offset = 0
+            limit = end[1] if current_id == end[0] else None
+            with open(self._segment_path(current_id), 'rb') as f:
+                f.seek(offset)
+                while len(records) < max_records:
+                    start = f.tell()
+                    if limit is not None and start >= limit:
+                        break
+                    record = self._read_record(f, limit)
+                    if record is None:
+                        break
+                    if record is _CORRUPT:
+                        resume = self._resync(f, start, limit)
+                        self._report_corrupt(current_id, start, resume)
+                        if resume is None:
+                            break
+                        f.seek(resume)
+                        continue
+                    records.append(((current_id, f.tell()), record))
+            if len(records) >= max_records or current_id >= end[0]:
+                break
+        return records
+
+    def backlog(self):
+        """Whether there are appended records that have not been acknowledged"""
+        return bool(self.read(max_records=1))
+
+    def ack(self, position):
+        """Mark everything up to position as delivered and compact old segments"""
+        with self.lock:
+            if position <= self.acked:
+                return
+            self.acked = position
+            tmp_path = os.path.join(self.directory, CHECKPOINT_FILE + '.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump({'segment': position[0], 'offset': position[1]}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(self.directory, CHECKPOINT_FILE))
+
+            for segment_id in self._segment_ids():
+                if segment_id >= min(position[0], self.active_id):
+                    break
+                os.remove(self._segment_path(segment_id))
+
+    def close(self):
+        with self.lock:
+            self._sync()
+            self.file.close()
+
+    # ---------- internals ----------
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def _roll(self):
+        self._sync()
+        self.file.close()
+        self.active_id += 1
+        self.file = open(self._segment_path(self.active_id), 'ab')
+
+    def _segment_path(self, segment_id):
+        return os.path.join(self.directory, f'{SEGMENT_PREFIX}{segment_id:012d}{SEGMENT_SUFFIX}')
+
+    def _segment_ids(self):
+        ids = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                ids.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+        return sorted(ids)
+
+    def _load_checkpoint(self):
+        try:
+            with open(os.path.join(self.directory, CHECKPOINT_FILE)) as f:
+                checkpoint = json.load(f)
+            return (checkpoint['segment'], checkpoint['offset'])
+        except (OSError, ValueError, KeyError):
+            return (0, 0)
+
+    def _read_record(self, f, limit=None):
+        """Next record, None at the end of the data, or _CORRUPT"""
+        start = f.tell()
+        header = f.read(HEADER.size)
+        if not header:
+            return None
+        if len(header) < HEADER.size:
+            return _CORRUPT
+        length, crc = HEADER.unpack(header)
+        if limit is not None and start + HEADER.size + length > limit:
+            return _CORRUPT
+        data = f.read(length)
+        if len(data) < length or zlib.crc32(data) != crc:
+            return _CORRUPT
+        try:
+            return json.loads(data)
+        except ValueError:
+            return _CORRUPT
+
+    def _resync(self, f, start, limit=None):
+        """Offset of the first intact record after a corrupt one at start, or None"""
+        f.seek(start + 1)
+        data = f.read(limit - start - 1 if limit is not None else -1)
+        for i in range(len(data) - HEADER.size + 1):
+            length, crc = HEADER.unpack_from(data, i)
+            end = i + HEADER.size + length
+            if end > len(data) or zlib.crc32(data[i + HEADER.size:end]) != crc:
+                continue
+            try:
+                json.loads(data[i + HEADER.size:end])
+            except ValueError:
+                continue
+            return start + 1 + i
+        return None
+
+    def _report_corrupt(self, segment_id, start, resume):
+        with self.lock:
+            if (segment_id, start) in self.corrupt_regions:
+                return
+            self.corrupt_regions.add((segment_id, start))
+            self.corrupt_records += 1
+        path = self._segment_path(segment_id)
+        if resume is None:
+            print(f"⚠ Discarding corrupt data from offset {start} to the end of {path}")
+        else:
+            print(f"⚠ Skipping {resume - start} corrupt bytes at offset {start} of {path}")
+
+    def _truncate_torn_tail(self):
+        path = self._segment_path(self.active_id)
+        valid_end = 0
+        with open(path, 'rb') as f:
+            while True:
+                record = self._read_record(f)
+                if record is None:
+                    break
+                if record is _CORRUPT:
+                    resume = self._resync(f, valid_end)
+                    if resume is None:
+                        break
+                    # Intact records follow: corruption, not a torn tail
+                    self._report_corrupt(self.active_id, valid_end, resume)
+                    f.seek(resume)
+                    continue
+                valid_end = f.tell()
+        if valid_end < os.path.getsize(path):
+            print(f"⚠ Truncating torn record at end of {path}")
+            self.file.truncate(valid_end)
+            self.file.seek(valid_end)
@@ -0,0 +1,293 @@
+"""
+Local SQLite time-series store for the subscriber's records.
+
+An alternative to the Firebase Realtime Database for bulk history and for
+environments without network access. SqliteSink takes the same calls as
+FirebaseBatchWriter (add, add_updates, flush, stop) and appends records in
+batched transactions from a background thread. SqliteStore is the read
+side, used by the dashboard:
+
+  latest(vehicle_id=None)                    newest record (as stored in Firebase)
+  query_range(vehicle_id, start, end)        records in [start, end), oldest first
+  downsample(vehicle_id, start, end, bucket_s)
+                                             min/max/mean per bucket, aligned to
+                                             local time like the Firebase rollups
+  latest_day(vehicle_id)                     [start, end) of the newest sample's day
+  recent_alerts(limit)                       newest alert records
+
+oldest() and delete_rows() page old records out for compact_history.py.
+
+Each record is one row of the telemetry table: the columns the dashboard
+charts and queries use, plus the full document as JSON. Rows are indexed on
+(vehicle_id, ts), with ts the sample time in epoch seconds (the device
+timestamp read as local time, or the upload time if it has none). Alerts are
+upserted by key, so an alert updated in place stays one row. The database
+runs in WAL mode, so the dashboard can read while the subscriber writes.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from features import sample_epoch
+from firebase_writer import generate_push_id
+from rollups import local_seconds
+
+# (column, path in the record document) for the queryable columns
+COLUMNS = (
+    ('soc', ('battery', 'soc')),
+    ('soh', ('battery', 'soh')),
+    ('voltage', ('battery', 'voltage')),
+    ('current', ('battery', 'current')),
+    ('temperature', ('battery', 'temperature')),
+    ('charge_cycles', ('battery', 'charge_cycles')),
+    ('rul', ('rul_prediction', 'value')),
+)
+# Columns summarised by downsample()
+DOWNSAMPLE_COLUMNS = ('soc', 'soh', 'temperature', 'rul')
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS telemetry (
+    vehicle_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    key TEXT NOT NULL,
+    row_number INTEGER,
+    {', '.join(f'{name} REAL' for name, _ in COLUMNS)},
+    health_status TEXT,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS telemetry_vehicle_ts ON telemetry (vehicle_id, ts);
+CREATE TABLE IF NOT EXISTS alerts (
+    key TEXT PRIMARY KEY,
+    vehicle_id TEXT,
+    ts REAL,
+    severity TEXT,
+    status TEXT,
+    alert TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS alerts_ts ON alerts (ts);
+"""
+
+INSERT_TELEMETRY = (f"INSERT INTO telemetry (vehicle_id, ts, key, row_number, "
+                    f"{', '.join(name for name, _ in COLUMNS)}, health_status, entry) "
+                    f"VALUES ({', '.join('?' * (len(COLUMNS) + 6))})")
+UPSERT_ALERT = ("INSERT OR REPLACE INTO alerts (key, vehicle_id, ts, severity, status, alert) "
+                "VALUES (?, ?, ?, ?, ?, ?)")
+
+def _epoch(data_entry):
+    """Sample time of a record, falling back to its upload time"""
+    timestamp = sample_epoch(data_entry.get('timestamp'))
+    if timestamp is not None:
+        return timestamp
+    try:
+        return datetime.fromisoformat(data_entry.get('upload_timestamp')).timestamp()
+    except (TypeError, ValueError):
+        return time.time()
+
+def _column(entry, path):
+    value = entry.get(path[0])
+    if isinstance(value, dict):
+        value = value.get(path[1])
+    return value if isinstance(value, (int, float)) else None
+
+class SqliteStore:
+    """Read access to a telemetry database written by SqliteSink"""
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def latest(self, vehicle_id=None):
+        """Newest record (of one vehicle, or of any), or None"""
+        if vehicle_id is None:
+            sql, params = "SELECT entry FROM telemetry ORDER BY ts DESC, rowid DESC LIMIT 1", ()
+        else:
+            sql = ("SELECT entry FROM telemetry WHERE vehicle_id = ? "
+                   "ORDER BY ts DESC, rowid DESC LIMIT 1")
+            params = (vehicle_id,)
+        row = self._fetch(sql, params)
+        return json.loads(row[0][0]) if row else None
+
+    def query_range(self, vehicle_id, start, end, limit=None):
+        """Records of a vehicle with start <= ts < end (epoch seconds), oldest first
+
+        With a limit, the newest `limit` records of the range are returned.
+        """
+        sql = "SELECT ts, entry FROM telemetry WHERE vehicle_id = ? AND ts >= ? AND ts < ?"
+        params = (vehicle_id, start, end)
+        if limit is not None:
+            sql = f"SELECT ts, entry FROM ({sql} ORDER BY ts DESC LIMIT ?) ORDER BY ts"
+            params += (limit,)
+        else:
+            sql += " ORDER BY ts"
+        return [json.loads(entry) for _, entry in self._fetch(sql, params)]
+
+    def downsample(self, vehicle_id, start, end, bucket_s):
+        """Per-bucket count and min/max/mean of DOWNSAMPLE_COLUMNS, oldest first
+
+        Buckets are aligned to local wall-clock time, like RollupAggregator's;
+        'start' is the bucket's epoch seconds. The UTC offset is taken at
+        `start`, so a range spanning a DST change has its later buckets
+        shifted by the change.
+        """
+        offset = local_seconds(start) - start
+        aggregates = ', '.join(f'MIN({name}), MAX({name}), AVG({name})' for name in DOWNSAMPLE_COLUMNS)
+        sql = (f"SELECT CAST((ts + ?) / ? AS INTEGER) AS bucket, COUNT(*), {aggregates} "
+               f"FROM telemetry WHERE vehicle_id = ? AND ts >= ? AND ts < ? "
+               f"GROUP BY bucket ORDER BY bucket")
+        buckets = []
+        for row in self._fetch(sql, (offset, bucket_s, vehicle_id, start, end)):
+            bucket = {'start': row[0] * bucket_s - offset, 'seconds': bucket_s, 'count': row[1]}
+            for i, name in enumerate(DOWNSAMPLE_COLUMNS):
+                low, high, mean = row[2 + 3 * i:5 + 3 * i]
+                if mean is not None:
+                    bucket[name] = {'min': low, 'max': high, 'mean': mean}
+            buckets.append(bucket)
+        return buckets
+
+    def latest_day(self, vehicle_id):
+        """(local midnight, newest ts + 1) of the vehicle's newest sample day, or None
+
+        The range the dashboard charts: recorded data replayed later is
+        charted from the day it was sampled, not the wall-clock day.
+        """
+        latest, = self._fetch("SELECT MAX(ts) FROM telemetry WHERE vehicle_id = ?", (vehicle_id,))[0]
+        if latest is None:
+            return None
+        midnight = datetime.fromtimestamp(latest).replace(hour=0, minute=0, second=0, microsecond=0)
+        return midnight.timestamp(), latest + 1
+
+    def recent_alerts(self, limit=5):
+        """{key: alert} of the most recently updated alerts, oldest first"""
+        rows = self._fetch("SELECT key, alert FROM alerts ORDER BY ts DESC LIMIT ?", (limit,))
+        return {key: json.loads(alert) for key, alert in reversed(rows)}
+
+    def vehicles(self):
+        """Vehicle ids that have records"""
+        return [vehicle for vehicle, in self._fetch("SELECT DISTINCT vehicle_id FROM telemetry", ())]
+
+    def oldest(self, vehicle_id, before, limit):
+        """[(rowid, key, record)] of a vehicle's oldest records with ts < before"""
+        rows = self._fetch("SELECT rowid, key, entry FROM telemetry WHERE vehicle_id = ? AND ts < ? "
+                           "ORDER BY ts, rowid LIMIT ?", (vehicle_id, before, limit))
+        return [(rowid, key, json.loads(entry)) for rowid, key, entry in rows]
+
+    def delete_rows(self, rowids):
+        """Delete telemetry rows by rowid, in one transaction"""
+        with self.lock, self.connection:
+            self.connection.executemany("DELETE FROM telemetry WHERE rowid = ?",
+                                        [(rowid,) for rowid in rowids])
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def _fetch(self, sql, params):
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+class SqliteSink(SqliteStore):
+    """Batched, append-only writer with the FirebaseBatchWriter interface"""
+
+    def __init__(self, path, flush_records=5000, flush_interval_ms=1000, flush_latency=None):
+        super().__init__(path)
+        # Durable at each checkpoint; a crash loses at most the last batches
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.flush_records = flush_records
+        self.flush_interval = flush_interval_ms / 1000.0
+        # Optional metrics.LatencyHistogram timing each transaction
+        self.flush_latency = flush_latency
+        self.pending = []
+        self.pending_alerts = []
+        self.first_pending = 0.0
+        # Held from taking a batch until it is committed, so flush() and the
+        # writer thread commit their batches in the order they were taken
+        self.write_lock = threading.Lock()
+        self.written = 0
+        self.errors = 0
+
+        self.running = True
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self.thread.start()
+
+    def add(self, data_entry, alert=None, alert_key=None):
+        """Queue a record (and optional alert, upserted by alert_key); returns its key"""
+        key = generate_push_id()
+        row = [data_entry.get('vehicle_id', ''), _epoch(data_entry), key,
+               data_entry.get('row_number')]
+        row.extend(_column(data_entry, path) for _, path in COLUMNS)
+        row.append((data_entry.get('rul_prediction') or {}).get('health_status'))
+        row.append(json.dumps(data_entry))
+        with self.condition:
+            if not self.pending and not self.pending_alerts:
+                self.first_pending = time.monotonic()
+            self.pending.append(row)
+            if alert is not None:
+                alert['data_key'] = key
+                self.pending_alerts.append((alert_key or generate_push_id(), alert.get('vehicle_id'),
+                                            row[1], alert.get('severity'), alert.get('status'),
+                                            json.dumps(alert)))
+            if len(self.pending) >= self.flush_records:
+                self.condition.notify()
+        return key
+
+    def add_updates(self, updates):
+        """Firebase path updates (rollups) are not stored; downsample() replaces them"""
+
+    def flush(self):
+        with self.write_lock:
+            with self.condition:
+                rows, alerts = self._take_pending()
+            self._write(rows, alerts)
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+        self.close()
+
+    def _take_pending(self):
+        rows, alerts = self.pending, self.pending_alerts
+        self.pending = []
+        self.pending_alerts = []
+        return rows, alerts
+
+    def _write(self, rows, alerts):
+        if not rows and not alerts:
+            return
+        start = time.perf_counter_ns()
+        try:
+            with self.lock, self.connection:
+                self.connection.executemany(INSERT_TELEMETRY, rows)
+                self.connection.executemany(UPSERT_ALERT, alerts)
+            self.written += len(rows)
+            if self.flush_latency is not None:
+                self.flush_latency.since(start)
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"✗ SQLite write error: {e} ({len(rows)} records lost)")
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.pending and not self.pending_alerts:
+                    self.condition.wait()
+                while self.running and len(self.pending) < self.flush_records:
+                    remaining = self.first_pending + self.flush_interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                running = self.running
+            with self.write_lock:
+                with self.condition:
+                    rows, alerts = self._take_pending()
+                self._write(rows, alerts)
+            if not running:
+                return
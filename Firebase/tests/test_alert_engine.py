@@ -0,0 +1,63 @@
+import pytest
+
+from alert_engine import AlertEngine
+
+def transitions(engine, ruls, vehicle='ev-1', start=1000.0, step=10.0):
+    """[transition or None] for a series of predictions `step` seconds apart"""
+    changes = [engine.observe(vehicle, rul, 90.0, start + i * step) for i, rul in enumerate(ruls)]
+    return [change[0] if change else None for change in changes]
+
+def test_hysteresis_does_not_flap():
+    engine = AlertEngine(enter_rul=100, exit_rul=110)
+    # Hovering between the enter and exit thresholds keeps one open alert
+    assert transitions(engine, [120, 99, 101, 99, 109, 105, 110]) == \
+        [None, 'open', None, None, None, None, 'close']
+    assert not engine.is_open('ev-1')
+
+def test_escalate_and_deescalate():
+    engine = AlertEngine(enter_rul=100, exit_rul=110, critical_enter_rul=5, critical_exit_rul=7)
+    assert transitions(engine, [50, 4, 6, 7, 4, 3, 120]) == \
+        ['open', 'escalate', None, 'deescalate', 'escalate', None, 'close']
+
+def test_open_critical_directly():
+    engine = AlertEngine()
+    _, _, record = engine.observe('ev-1', 2.0, 80.0, 1000.0)
+    assert record['severity'] == 'critical' and record['status'] == 'open'
+
+def test_reopen_within_cooldown_keeps_key():
+    engine = AlertEngine(cooldown_s=600)
+    _, key, _ = engine.observe('ev-1', 50, 90.0, 1000.0)
+    engine.observe('ev-1', 120, 90.0, 1100.0)
+    transition, reopened_key, record = engine.observe('ev-1', 50, 90.0, 1200.0)
+    assert (transition, reopened_key) == ('reopen', key)
+    assert record['reopened'] == 1 and record['closed_at'] is None
+
+def test_new_alert_after_cooldown():
+    engine = AlertEngine(cooldown_s=600)
+    _, key, _ = engine.observe('ev-1', 50, 90.0, 1000.0)
+    engine.observe('ev-1', 120, 90.0, 1100.0)
+    transition, new_key, record = engine.observe('ev-1', 50, 90.0, 1100.0 + 600)
+    assert transition == 'open' and new_key != key and record['reopened'] == 0
+
+def test_no_write_without_transition():
+    engine = AlertEngine()
+    assert engine.observe('ev-1', None) is None
+    assert engine.observe('ev-1', 150, 90.0, 1000.0) is None
+    engine.observe('ev-1', 50, 90.0, 1000.0)
+    assert engine.observe('ev-1', 60, 90.0, 1010.0) is None
+
+def test_returned_record_is_a_snapshot():
+    engine = AlertEngine()
+    _, _, opened = engine.observe('ev-1', 50, 90.0, 1000.0)
+    engine.observe('ev-1', 120, 90.0, 1010.0)
+    assert opened['status'] == 'open' and opened['closed_at'] is None
+
+def test_vehicles_are_independent():
+    engine = AlertEngine()
+    engine.observe('ev-1', 50, 90.0, 1000.0)
+    assert engine.is_open('ev-1') and not engine.is_open('ev-2')
+    assert engine.observe('ev-2', 50, 90.0, 1000.0)[0] == 'open'
+
+def test_exit_below_enter_is_rejected():
+    with pytest.raises(ValueError):
+        AlertEngine(enter_rul=100, exit_rul=90)
@@ -0,0 +1,84 @@
+import json
+
+import numpy as np
+import pytest
+
+from codec import (PACKED_KEYS, PACKED_HEADER, PayloadError, SampleBatch, batch_from_envelope,
+                   build_envelope, decode_binary, decode_packed, encode_packed, is_binary,
+                   is_envelope)
+
+def payload(i):
+    row = {key: round(0.5 + 0.01 * i + 0.001 * k, 3) for k, key in enumerate(PACKED_KEYS)}
+    row.update({'timestamp': f'0{1 + i % 9}-03-2024 10:{i % 60:02d}', 'row_number': i,
+                'device_millis': 1000 * i})
+    return row
+
+PAYLOADS = [payload(i) for i in range(5)]
+
+def test_packed_round_trip():
+    message = encode_packed(PAYLOADS, 'ev-7')
+    assert is_binary(message)
+    assert len(message) == PACKED_HEADER.size + 4 + 108 * len(PAYLOADS)
+    batch, = decode_binary(message)
+    assert isinstance(batch, SampleBatch) and len(batch) == len(PAYLOADS)
+    for i, original in enumerate(PAYLOADS):
+        row = batch.row(i)
+        assert row.get('vehicle_id') == 'ev-7'
+        assert row.get('timestamp') == original['timestamp']
+        assert row.get('row_number') == i and row.get('device_millis') == 1000 * i
+        # float32 values read back as the shortest decimal, i.e. as sent
+        assert [row.get(key) for key in PACKED_KEYS] == [original[key] for key in PACKED_KEYS]
+
+def test_packed_missing_timestamp_and_vehicle():
+    batch = decode_packed(encode_packed([{'soc': 0.5}]))
+    assert np.isnan(batch.timestamps[0])
+    assert batch.row(0).get('timestamp') == ''
+    assert batch.row(0).get('vehicle_id', 'default') == 'default'
+
+@pytest.mark.parametrize('message', [
+    b'EV',
+    encode_packed(PAYLOADS)[:-1],
+    b'EV\x02' + encode_packed(PAYLOADS)[3:],
+])
+def test_packed_rejects_malformed(message):
+    with pytest.raises(PayloadError):
+        decode_packed(message)
+
+def test_json_envelope_round_trip():
+    envelope = json.loads(json.dumps(build_envelope(PAYLOADS, 'ev-7')))
+    assert is_envelope(envelope)
+    batch = batch_from_envelope(envelope)
+    assert batch.values.shape == (len(PAYLOADS), len(PACKED_KEYS))
+    for i, original in enumerate(PAYLOADS):
+        for key, value in original.items():
+            assert batch.row(i).get(key) == value
+        assert batch.row(i).get('vehicle_id') == 'ev-7'
+
+@pytest.mark.parametrize('envelope', [
+    {'columns': 'soc', 'rows': []},
+    {'columns': ['soc', 'soh'], 'rows': [[0.5]]},
+    {'columns': ['soc'], 'rows': [['high']]},
+])
+def test_envelope_rejects_malformed(envelope):
+    with pytest.raises(PayloadError):
+        batch_from_envelope(envelope)
+
+def test_msgpack_round_trip():
+    msgpack = pytest.importorskip('msgpack')
+    single = msgpack.packb(PAYLOADS[0])
+    assert is_binary(single)
+    assert decode_binary(single) == [PAYLOADS[0]]
+
+    envelope, = decode_binary(msgpack.packb(build_envelope(PAYLOADS, 'ev-7')))
+    batch = batch_from_envelope(envelope)
+    assert [batch.row(i).get('soc') for i in range(len(PAYLOADS))] == [p['soc'] for p in PAYLOADS]
+
+def test_msgpack_rejects_invalid_and_non_map():
+    msgpack = pytest.importorskip('msgpack')
+    with pytest.raises(PayloadError):
+        decode_binary(msgpack.packb({'a': 1})[:1] + b'\xc1')
+    with pytest.raises(PayloadError):
+        decode_binary(msgpack.packb([1, 2]))
+
+def test_json_is_not_binary():
+    assert not is_binary(json.dumps(PAYLOADS[0]).encode())
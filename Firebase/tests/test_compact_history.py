@@ -0,0 +1,83 @@
+import os
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from compact_history import (FirebaseHistory, MANIFEST_FILE, compact, query_archive, read_json,
+                             sample_time)
+from firebase_writer import generate_push_id
+from local_db import LocalDatabase, SimulatedOutage
+
+def fill(database, days=('2024-01-30', '2024-01-31', '2024-02-01', '2024-02-02'), per_day=6):
+    # Recorded data, uploaded long after it was sampled
+    n = 0
+    for day in days:
+        year, month, date = day.split('-')
+        for hour in range(per_day):
+            record = {'vehicle_id': 'ev.1', 'timestamp': f'{date}-{month}-{year} {hour:02d}:30',
+                      'upload_timestamp': f'2030-06-01T00:00:{n % 60:02d}', 'row_number': n,
+                      'battery': {'soc': 50.0 + n}}
+            database.reference(f'h/ev,1/{day}').child(generate_push_id()).set(record)
+            n += 1
+    return n
+
+def new_checkpoint():
+    return {'cutoff': '2024-02-02T00:00:00', 'done': [], 'pending': None, 'archived': 0, 'complete': False}
+
+def run(database, archive, checkpoint, page_records=4):
+    history = FirebaseHistory(database, 'h', None, datetime(2024, 2, 2))
+    return compact(history, str(archive), checkpoint, str(archive / 'checkpoint.json'), page_records, 3)
+
+def test_sample_time_falls_back_to_the_upload_time():
+    assert sample_time({'timestamp': '05-01-2024 10:15'}) == '2024-01-05T10:15:00'
+    assert sample_time({'timestamp': '', 'upload_timestamp': '2030-01-01T00:00:00'}) == '2030-01-01T00:00:00'
+    assert sample_time({}) == ''
+
+def test_compact_then_query_by_sample_time(tmp_path):
+    database = LocalDatabase()
+    fill(database)
+    assert run(database, tmp_path, new_checkpoint()) == 18
+
+    # The day at the horizon stays in the store
+    assert list(database.reference('h/ev,1').get(shallow=True)) == ['2024-02-02']
+    files = read_json(os.path.join(tmp_path, MANIFEST_FILE))['files'].values()
+    assert {info['month'] for info in files} == {'2024-01', '2024-02'}
+    february = [info for info in files if info['month'] == '2024-02']
+    assert min(info['start'] for info in february) == '2024-02-01T00:30:00'
+
+    frame = query_archive(str(tmp_path), 'ev.1', '2024-01-31T02:00:00', '2024-02-01T03:00:00')
+    assert list(frame['row_number']) == [8, 9, 10, 11, 12, 13, 14]
+    assert list(frame['battery.soc']) == [58.0, 59.0, 60.0, 61.0, 62.0, 63.0, 64.0]
+    assert len(query_archive(str(tmp_path), 'ev.1')) == 18
+    assert query_archive(str(tmp_path), 'ev.1', '2030-01-01T00:00:00').empty
+
+def test_interrupted_run_resumes_from_the_checkpoint(tmp_path):
+    database = LocalDatabase()
+    fill(database)
+    checkpoint = new_checkpoint()
+    # The second page is archived, then its delete fails
+    history = FirebaseHistory(database, 'h', None, datetime(2024, 2, 2))
+    history_delete = history.delete
+    calls = []
+
+    def delete(partition, ids, batch_records):
+        calls.append(partition)
+        if len(calls) == 2:
+            raise SimulatedOutage("connection lost")
+        history_delete(partition, ids, batch_records)
+
+    history.delete = delete
+    with pytest.raises(SimulatedOutage):
+        compact(history, str(tmp_path), checkpoint, str(tmp_path / 'checkpoint.json'), 4, 3)
+
+    saved = read_json(str(tmp_path / 'checkpoint.json'))
+    assert saved['archived'] == 4
+    assert len(saved['pending']['ids']) == 2
+    assert run(database, tmp_path, saved) == 12
+    assert saved['archived'] == 18 and saved['complete'] and saved['pending'] is None
+
+    frame = query_archive(str(tmp_path), 'ev.1')
+    assert sorted(frame['row_number']) == list(range(18))
+    assert sum(info['rows'] for info in read_json(os.path.join(tmp_path, MANIFEST_FILE))['files'].values()) == 18
@@ -0,0 +1,53 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+import mqtt_lstm_firebase as subscriber
+from firebase_writer import FirebaseBatchWriter
+from local_db import LocalDatabase
+from rollups import RollupAggregator
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                'Streamlit'))
+from firebase_cache import chart_day, rollup_path, rollup_points
+
+@pytest.fixture
+def database(monkeypatch):
+    database = LocalDatabase()
+    writer = FirebaseBatchWriter(database, history_path=subscriber.FIREBASE_HISTORY_PATH,
+                                 latest_path=subscriber.FIREBASE_LATEST_PATH, flush_records=10 ** 9,
+                                 flush_interval_ms=10 ** 9, shard_history=True)
+    monkeypatch.setattr(subscriber, 'record_sink', writer)
+    monkeypatch.setattr(subscriber, 'alert_engine', subscriber.new_alert_engine())
+    monkeypatch.setattr(subscriber, 'rollup_aggregator',
+                        RollupAggregator(subscriber.FIREBASE_ROLLUP_PATH, subscriber.ROLLUP_RESOLUTIONS))
+    yield database
+    writer.stop()
+
+def test_recorded_samples_chart_from_their_own_day(database):
+    # Recorded rows, 15 minutes apart, as MQTT.ino replays them from the CSV
+    for i in range(12):
+        payload = {'timestamp': f'05-01-2024 {8 + i // 4:02d}:{15 * (i % 4):02d}', 'row_number': i,
+                   'soc': 0.5 + 0.01 * i, 'soh': 0.9, 'battery_temperature': 30.0}
+        subscriber.store_record(payload, 120.0 - i, None, 'ev.1', 30)
+    subscriber.queue_rollups(subscriber.rollup_aggregator.close_all())
+    subscriber.record_sink.flush()
+
+    latest = database.reference(subscriber.FIREBASE_LATEST_PATH).get()
+    assert chart_day(latest) == '2024-01-05'
+    rows = rollup_points(database.reference(rollup_path('ev.1', '1h', chart_day(latest))).get())
+    assert [row['upload_timestamp'] for row in rows] == \
+        ['2024-01-05T08:00:00', '2024-01-05T09:00:00', '2024-01-05T10:00:00']
+    assert [row['rul'] for row in rows] == pytest.approx([118.5, 114.5, 110.5])
+    assert rows[0]['soc'] == pytest.approx(51.5)
+    # Wall-clock today has nothing for this data
+    assert database.reference(rollup_path('ev.1', '1h', datetime.now().strftime('%Y-%m-%d'))).get() is None
+    # Finer than the 15-minute spacing: only the first record's bucket
+    assert len(rollup_points(database.reference(rollup_path('ev.1', '1m', '2024-01-05')).get())) == 1
+
+def test_chart_day_falls_back_to_the_upload_day():
+    assert chart_day({'timestamp': '', 'upload_timestamp': '2024-02-03T10:00:00'}) == '2024-02-03'
+    assert chart_day(None) == datetime.now().strftime('%Y-%m-%d')
+    assert rollup_points(None) == []
@@ -0,0 +1,23 @@
+import math
+
+import pandas as pd
+import pytest
+
+from features import TIMESTAMP_FORMAT, parse_timestamp, parse_timestamps
+
+VALID = ['01-01-2020 00:00', '29-02-2024 23:59', '1-2-2024 3:05', '31-12-2261 12:00']
+INVALID = ['01-01-24 10:00', '01-01-0099 10:00', '01-01-3000 10:00', '32-01-2024 10:00',
+           '01-01-2024 24:00', '01-01-2024', ' 01-01-2024 10:00', '', None]
+
+@pytest.mark.parametrize('text', VALID)
+def test_parse_timestamp_matches_pandas(text):
+    assert parse_timestamp(text) == pd.to_datetime(text, format=TIMESTAMP_FORMAT).timestamp()
+
+@pytest.mark.parametrize('text', INVALID)
+def test_parse_timestamp_rejects_invalid(text):
+    assert parse_timestamp(text) is None
+
+def test_parse_timestamps_coerces_invalid_rows_to_nan():
+    parsed = parse_timestamps(VALID + INVALID)
+    assert list(parsed[:len(VALID)]) == [parse_timestamp(text) for text in VALID]
+    assert all(math.isnan(value) for value in parsed[len(VALID):])
@@ -0,0 +1,76 @@
+import time
+
+from firebase_writer import FirebaseBatchWriter
+from local_db import LocalDatabase
+from spool import WriteAheadSpool
+
+def entry(i):
+    return {'vehicle_id': 'ev-1', 'timestamp': '01-03-2024 10:00',
+            'upload_timestamp': '2024-03-01T10:00:00', 'row_number': i}
+
+def new_writer(database, spool):
+    return FirebaseBatchWriter(database, history_path='h', latest_path='l', flush_records=10 ** 9,
+                               flush_interval_ms=10 ** 9, spool=spool, replay_batch_records=7,
+                               replay_retry_ms=10)
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def history_rows(database):
+    return [row['row_number'] for row in database.reference('h').get().values()]
+
+def test_outage_is_spooled_and_replayed_once(tmp_path):
+    database = LocalDatabase()
+    spool = WriteAheadSpool(str(tmp_path))
+    writer = new_writer(database, spool)
+    keys = [writer.add(entry(i)) for i in range(10)]
+    writer.flush()
+    assert sorted(history_rows(database)) == list(range(10))
+
+    # The flush fails: the batch stays in the spool and the writer replays
+    database.fail_writes = True
+    keys += [writer.add(entry(i)) for i in range(10, 20)]
+    writer.flush()
+    assert writer.replaying
+    # Records added during the outage go to the spool only
+    keys += [writer.add(entry(i)) for i in range(20, 40)]
+    assert writer.pending == []
+
+    # Recovery, with one more failure part-way through the replay
+    database.fail_writes = False
+    database.fail_next_writes(1)
+    wait_for(lambda: not writer.replaying)
+    keys += [writer.add(entry(i)) for i in range(40, 45)]
+    writer.flush()
+    writer.stop()
+
+    stored = database.reference('h').get()
+    assert sorted(stored) == sorted(keys)
+    assert sorted(history_rows(database)) == list(range(45))
+    assert database.reference('l').get()['row_number'] == 44
+    assert not spool.backlog()
+    spool.close()
+
+def test_backlog_left_by_a_previous_run_is_replayed(tmp_path):
+    database = LocalDatabase()
+    database.fail_writes = True
+    spool = WriteAheadSpool(str(tmp_path))
+    writer = new_writer(database, spool)
+    for i in range(12):
+        writer.add(entry(i))
+    writer.flush()
+    writer.stop()
+    spool.close()
+    assert database.reference('h').get() is None
+
+    database.fail_writes = False
+    spool = WriteAheadSpool(str(tmp_path))
+    writer = new_writer(database, spool)
+    wait_for(lambda: not writer.replaying)
+    writer.stop()
+    assert sorted(history_rows(database)) == list(range(12))
+    assert not spool.backlog()
+    spool.close()
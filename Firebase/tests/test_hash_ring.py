@@ -0,0 +1,48 @@
+import hashlib
+from collections import Counter
+
+import pytest
+
+from hash_ring import HashRing, stable_hash
+
+VEHICLES = [f'ev-{i:04d}' for i in range(4000)]
+
+def test_stable_hash_is_fixed():
+    # Same value in every process (hash() would be salted per process)
+    assert stable_hash('ev-0001') == stable_hash('ev-0001')
+    assert stable_hash('ev-0001') == int.from_bytes(
+        hashlib.blake2b(b'ev-0001', digest_size=8).digest(), 'big')
+    assert 0 <= stable_hash('') < 2 ** 64
+
+def test_owner_is_deterministic():
+    first, second = HashRing(range(4)), HashRing(range(4))
+    assert [first.owner(v) for v in VEHICLES] == [second.owner(v) for v in VEHICLES]
+    # Cached lookups agree with fresh ones
+    assert [first.owner(v) for v in VEHICLES] == [second.owner(v) for v in VEHICLES]
+
+def test_keys_spread_over_nodes():
+    ring = HashRing(range(4))
+    counts = Counter(ring.owner(v) for v in VEHICLES)
+    assert set(counts) == {0, 1, 2, 3}
+    expected = len(VEHICLES) / 4
+    assert all(0.7 * expected < count < 1.3 * expected for count in counts.values())
+
+def test_adding_a_node_moves_about_one_share():
+    before, after = HashRing(range(4)), HashRing(range(5))
+    moved = [v for v in VEHICLES if before.owner(v) != after.owner(v)]
+    # Only keys taken over by the new node move, about 1/5 of them
+    assert all(after.owner(v) == 4 for v in moved)
+    assert 0.1 < len(moved) / len(VEHICLES) < 0.3
+
+def test_removing_a_node_moves_only_its_keys():
+    before, after = HashRing(range(4)), HashRing([0, 1, 3])
+    for v in VEHICLES:
+        if before.owner(v) != 2:
+            assert after.owner(v) == before.owner(v)
+        else:
+            assert after.owner(v) in (0, 1, 3)
+
+def test_single_node_and_empty_ring():
+    assert {HashRing(['only']).owner(v) for v in VEHICLES[:50]} == {'only'}
+    with pytest.raises(ValueError):
+        HashRing([])
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+import json_stream
+from json_stream import JsonStreamDecoder
+
+MESSAGES = [
+    {'soc': 0.5, 'timestamp': '01-03-2024 10:00', 'row_number': 1},
+    {'note': 'quote " brace } bracket ] open { [ backslash \\', 'nested': {'a': [1, {'b': 2}]}},
+    [1, 2, {'c': '}'}],
+]
+
+@pytest.fixture(params=['orjson', 'json'])
+def decoder(request, monkeypatch):
+    if request.param == 'json':
+        monkeypatch.setattr(json_stream, 'orjson', None)
+    elif json_stream.orjson is None:
+        pytest.skip('orjson is not installed')
+    return JsonStreamDecoder(max_buffer=5000)
+
+def encoded(messages):
+    return b''.join(json.dumps(message).encode('utf-8') for message in messages)
+
+def test_whole_message(decoder):
+    assert decoder.feed(b'  ' + encoded(MESSAGES[:1]) + b'\n') == MESSAGES[:1]
+    assert len(decoder) == 0
+
+@pytest.mark.parametrize('size', [1, 2, 7, 64])
+def test_messages_split_across_chunks(decoder, size):
+    data = encoded(MESSAGES)
+    values = []
+    for i in range(0, len(data), size):
+        values.extend(decoder.feed(data[i:i + size]))
+    assert values == MESSAGES
+    assert len(decoder) == 0 and decoder.errors == 0
+
+def test_several_messages_in_one_chunk(decoder):
+    data = encoded(MESSAGES) + b' ' + encoded(MESSAGES[:1])
+    assert decoder.feed(data) == MESSAGES + MESSAGES[:1]
+
+def test_split_inside_an_escaped_string(decoder):
+    data = encoded(MESSAGES[1:2])
+    cut = data.index(b'\\"') + 1
+    assert decoder.feed(data[:cut]) == []
+    assert decoder.feed(data[cut:]) == MESSAGES[1:2]
+
+def test_garbage_between_messages_is_skipped(decoder):
+    values = decoder.feed(b'garbage' + encoded(MESSAGES[:1]) + b'more garbage')
+    assert values == MESSAGES[:1]
+    assert decoder.errors == 2 and len(decoder) == 0
+
+def test_invalid_message_is_dropped_and_decoding_resumes(decoder):
+    values = decoder.feed(b'{"soc": 0.5,, "x": 1}' + encoded(MESSAGES[:1]))
+    assert values == MESSAGES[:1]
+    assert decoder.errors == 1
+    assert decoder.feed(encoded(MESSAGES[2:])) == MESSAGES[2:]
+
+def test_overflow_resets_the_buffer(decoder):
+    small = JsonStreamDecoder(max_buffer=16)
+    assert small.feed(b'{"a": "' + b'x' * 32) == []
+    assert small.overflows == 1 and len(small) == 0
+    assert small.feed(encoded(MESSAGES[:1])) == MESSAGES[:1]
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from ring_buffer import ScaledRingBuffer
+
+N_FEATURES = 3
+CENTER = np.array([1.0, -2.0, 0.5], dtype=np.float32)
+SCALE = np.array([2.0, 4.0, 0.25], dtype=np.float32)
+
+def raw(start, n):
+    """Rows whose first raw feature is their absolute index"""
+    index = np.arange(start, start + n, dtype=np.float32)[:, None]
+    return index * np.array([1.0, 0.5, -3.0], dtype=np.float32)
+
+def scaled(rows):
+    return (rows - CENTER) / SCALE
+
+def check(buffer, expected):
+    """Every readable range matches the naive list of scaled rows"""
+    assert buffer.count == len(expected)
+    assert len(buffer) == min(buffer.count, buffer.capacity)
+    first = max(0, buffer.count - buffer.slots + 1)
+    for start in range(first, buffer.count):
+        np.testing.assert_allclose(buffer.rows(start, buffer.count - 1), expected[start:], rtol=1e-6)
+    if first > 0:
+        with pytest.raises(IndexError):
+            buffer.rows(first - 1, buffer.count - 1)
+
+@pytest.mark.parametrize('headroom', [0, 3])
+def test_append_wraps(headroom):
+    buffer = ScaledRingBuffer(5, N_FEATURES, CENTER, SCALE, headroom)
+    expected = []
+    for i in range(23):
+        buffer.append(raw(i, 1)[0])
+        expected.extend(scaled(raw(i, 1)))
+        check(buffer, np.array(expected))
+
+@pytest.mark.parametrize('sizes', [
+    [3, 3, 3, 3],          # wraps past the end part-way through a block
+    [8, 1, 7, 2],          # exactly `slots` rows, then odd sizes
+    [20, 4, 13],           # larger than the ring
+    [1, 2, 3, 4, 5, 6, 7],
+])
+def test_extend_matches_naive_list(sizes):
+    buffer = ScaledRingBuffer(6, N_FEATURES, CENTER, SCALE, headroom=2)
+    expected = np.empty((0, N_FEATURES), dtype=np.float32)
+    for n in sizes:
+        block = raw(buffer.count, n)
+        buffer.extend(block)
+        expected = np.concatenate([expected, scaled(block)])
+        check(buffer, expected)
+
+def test_randomized_mix_of_append_and_extend():
+    rng = np.random.default_rng(3)
+    buffer = ScaledRingBuffer(7, N_FEATURES, CENTER, SCALE, headroom=4)
+    expected = []
+    for _ in range(300):
+        n = int(rng.integers(1, 25))
+        block = rng.normal(size=(n, N_FEATURES)).astype(np.float32)
+        if n == 1 and rng.random() < 0.5:
+            buffer.append(block[0])
+        else:
+            buffer.extend(block)
+        expected.extend(scaled(block))
+        check(buffer, np.array(expected))
+
+def test_windows_are_views_of_rows():
+    buffer = ScaledRingBuffer(10, N_FEATURES, CENTER, SCALE)
+    buffer.extend(raw(0, 14))
+    windows = buffer.windows(8, 13, 4)
+    expected = scaled(raw(0, 14))
+    assert windows.shape == (6, 4, N_FEATURES)
+    for i, end in enumerate(range(8, 14)):
+        np.testing.assert_allclose(windows[i], expected[end - 3:end + 1], rtol=1e-6)
+    assert np.shares_memory(windows, buffer.data)
+    with pytest.raises(IndexError):
+        buffer.rows(10, 14)
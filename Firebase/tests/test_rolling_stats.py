@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+import rolling_stats
+from rolling_stats import RollingStats
+
+def check_against_numpy(stats, window):
+    indices = np.array([index for index, _ in window], dtype=float)
+    values = np.array([value for _, value in window])
+    assert len(stats) == len(window)
+    assert stats.first() == values[0]
+    assert stats.last() == values[-1]
+    assert stats.min() == values.min()
+    assert stats.max() == values.max()
+    assert stats.mean() == pytest.approx(values.mean(), rel=1e-9, abs=1e-9)
+    assert stats.std() == pytest.approx(values.std(), rel=1e-7, abs=1e-7)
+    expected_slope = np.polyfit(indices, values, 1)[0] if len(window) > 1 else 0.0
+    assert stats.slope() == pytest.approx(expected_slope, rel=1e-7, abs=1e-9)
+
+@pytest.mark.parametrize('width', [1, 2, 7, 100])
+def test_sliding_window_matches_numpy(width):
+    rng = np.random.default_rng(width)
+    values = 150 - np.arange(500) * 0.1 + rng.normal(0, 3, 500)
+    stats = RollingStats()
+    window = []
+    for index, value in enumerate(values):
+        stats.push(index, value)
+        stats.evict_before(index - width + 1)
+        window = [(i, float(v)) for i, v in enumerate(values)][max(0, index - width + 1):index + 1]
+        check_against_numpy(stats, window)
+
+def test_gaps_in_indices_and_repeated_values():
+    stats = RollingStats()
+    points = [(0, 5.0), (3, 5.0), (4, 1.0), (10, 5.0), (11, 1.0)]
+    for index, value in points:
+        stats.push(index, value)
+    check_against_numpy(stats, points)
+    stats.evict_before(4)
+    check_against_numpy(stats, points[2:])
+
+def test_periodic_recompute_keeps_results_exact(monkeypatch):
+    monkeypatch.setattr(rolling_stats, 'RECOMPUTE_INTERVAL', 50)
+    stats = RollingStats()
+    values = np.random.default_rng(0).normal(1e6, 1.0, 400)
+    for index, value in enumerate(values):
+        stats.push(index, value)
+        stats.evict_before(index - 30)
+    check_against_numpy(stats, [(i, float(values[i])) for i in range(400 - 31, 400)])
+
+def test_reset_and_evicting_everything():
+    stats = RollingStats()
+    for index in range(5):
+        stats.push(index, index * 2.0)
+    stats.evict_before(100)
+    assert len(stats) == 0 and stats.std() == 0.0 and stats.slope() == 0.0
+    stats.push(100, 3.0)
+    check_against_numpy(stats, [(100, 3.0)])
+    stats.reset()
+    assert len(stats) == 0
@@ -0,0 +1,102 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from features import TIMESTAMP_FORMAT, sample_day, sample_epoch
+from firebase_writer import FirebaseBatchWriter
+from local_db import LocalDatabase
+from rollups import RollupAggregator
+
+@pytest.fixture(autouse=True)
+def local_zone(monkeypatch):
+    # A half-hour offset, so hourly buckets only line up in local time
+    monkeypatch.setenv('TZ', 'Asia/Kolkata')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+def samples(n=500, step_minutes=1):
+    times = pd.date_range('2024-03-01 22:07', periods=n, freq=f'{step_minutes}min')
+    rng = np.random.default_rng(1)
+    return pd.DataFrame({'timestamp': times.strftime(TIMESTAMP_FORMAT),
+                         'soc': rng.uniform(20, 90, n), 'rul': rng.uniform(50, 150, n)},
+                        index=times)
+
+def test_sample_epoch_is_local_wall_clock():
+    epoch = sample_epoch('01-03-2024 22:07')
+    assert time.strftime('%d-%m-%Y %H:%M', time.localtime(epoch)) == '01-03-2024 22:07'
+    assert sample_epoch('not a time') is None
+    assert sample_day('1-3-2024 22:07') == '2024-03-01' and sample_day('') is None
+
+@pytest.mark.parametrize('resolution,seconds,freq', [('15m', 900, '15min'), ('1h', 3600, '1h')])
+def test_buckets_match_pandas_resample(resolution, seconds, freq):
+    frame = samples()
+    aggregator = RollupAggregator('r', {resolution: seconds}, fields=('soc', 'rul'))
+    closed = {}
+    for row in frame.itertuples():
+        closed.update(aggregator.add('ev-1', sample_epoch(row.timestamp), (row.soc, row.rul)))
+    closed.update(aggregator.close_all())
+
+    expected = frame[['soc', 'rul']].resample(freq).agg(['min', 'max', 'mean', 'last', 'count'])
+    assert len(closed) == len(expected)
+    for start, row in expected.iterrows():
+        rollup = closed[f"r/ev-1/{resolution}/{start:%Y-%m-%d}/{start:%H%M}"]
+        assert rollup['start'] == start.strftime('%Y-%m-%dT%H:%M:%S')
+        assert rollup['seconds'] == seconds and rollup['count'] == row[('soc', 'count')]
+        for field in ('soc', 'rul'):
+            for stat in ('min', 'max', 'mean', 'last'):
+                assert rollup[field][stat] == pytest.approx(row[(field, stat)])
+
+def test_close_expired_runs_on_the_arrival_clock():
+    aggregator = RollupAggregator('r', {'15m': 900}, grace_s=5)
+    # A sample two hours behind the clock fills its bucket until the
+    # bucket's remaining interval has passed on the arrival clock
+    sample = sample_epoch('01-03-2024 10:10')
+    arrival = sample + 7200
+    assert aggregator.add('ev-1', sample, (1.0,) * 4, arrival) == {}
+    assert aggregator.close_expired(arrival + 60) == {}
+    assert aggregator.add('ev-1', sample + 60, (2.0,) * 4, arrival + 60) == {}
+    assert aggregator.close_expired(arrival + 300 + 4) == {}
+    closed = aggregator.close_expired(arrival + 300 + 5)
+    rollup, = closed.values()
+    assert list(closed) == ['r/ev-1/15m/2024-03-01/1000'] and rollup['count'] == 2
+    assert aggregator.close_all() == {}
+
+def test_later_bucket_closes_the_open_one():
+    aggregator = RollupAggregator('r', {'1m': 60})
+    start = sample_epoch('01-03-2024 10:10')
+    aggregator.add('ev-1', start + 30, (1.0, None, None, None))
+    closed = aggregator.add('ev-1', start + 80, (2.0, None, None, None))
+    rollup, = closed.values()
+    assert rollup['count'] == 1 and rollup['soc']['last'] == 1.0 and 'soh' not in rollup
+    assert list(aggregator.close_all()) == ['r/ev-1/1m/2024-03-01/1011']
+
+def test_resolutions_no_wider_than_the_sample_spacing_are_skipped():
+    aggregator = RollupAggregator('r', {'1m': 60, '15m': 900, '1h': 3600})
+    first = sample_epoch('01-03-2024 10:00')
+    closed = {}
+    for i in range(8):
+        closed.update(aggregator.add('ev-1', first + 900 * i, (float(i),) * 4))
+    closed.update(aggregator.close_all())
+    # The first record opened every resolution; the second showed 15-minute
+    # spacing, which closed the 1m and 15m buckets and stopped them
+    assert sorted(closed) == ['r/ev-1/15m/2024-03-01/1000', 'r/ev-1/1h/2024-03-01/1000',
+                              'r/ev-1/1h/2024-03-01/1100', 'r/ev-1/1m/2024-03-01/1000']
+    assert closed['r/ev-1/1h/2024-03-01/1000']['count'] == 4
+    assert closed['r/ev-1/15m/2024-03-01/1000']['count'] == 1
+
+def test_history_shards_by_sample_day():
+    writer = FirebaseBatchWriter(LocalDatabase(), history_path='h', latest_path='l',
+                                 flush_records=10 ** 9, flush_interval_ms=10 ** 9, shard_history=True)
+    try:
+        dated = {'entry': {'vehicle_id': 'ev.1', 'timestamp': '28-02-2024 23:59',
+                           'upload_timestamp': '2024-03-01T00:00:05'}, 'key': 'k'}
+        undated = {'entry': {'vehicle_id': 'ev.1', 'timestamp': '',
+                             'upload_timestamp': '2024-03-01T00:00:05'}, 'key': 'k'}
+        assert writer.history_key(dated) == 'h/ev_1/2024-02-28/k'
+        assert writer.history_key(undated) == 'h/ev_1/2024-03-01/k'
+    finally:
+        writer.stop()
@@ -0,0 +1,97 @@
+import math
+
+from snapshot_delta import SnapshotDelta
+
+DOCUMENT = {'vehicle_id': 'ev-1', 'upload_timestamp': '2024-03-01T10:00:00',
+            'battery': {'soc': 50.0, 'voltage': 320.0, 'charge_cycles': 10},
+            'rul_prediction': {'value': 100.0, 'statistics': {'trend': 'stable', 'reused': False}}}
+
+def written(delta, document):
+    """diff and commit, as the writer does after a successful update"""
+    changes = delta.diff(document)
+    delta.commit(changes)
+    return changes
+
+def updated(document, path, value):
+    document = {key: dict(value) if isinstance(value, dict) else value for key, value in document.items()}
+    node = document
+    parts = path.split('/')
+    for part in parts[:-1]:
+        node[part] = dict(node[part])
+        node = node[part]
+    node[parts[-1]] = value
+    return document
+
+def test_first_document_is_written_whole():
+    delta = SnapshotDelta()
+    assert written(delta, DOCUMENT) == {'': DOCUMENT}
+    assert delta.snapshot == DOCUMENT and delta.snapshot is not DOCUMENT
+    assert delta.diff('not a dict') == {'': 'not a dict'}
+
+def test_unchanged_leaves_are_skipped():
+    delta = SnapshotDelta()
+    written(delta, DOCUMENT)
+    assert delta.diff(DOCUMENT) == {}
+
+def test_changed_leaves_by_path():
+    delta = SnapshotDelta()
+    written(delta, DOCUMENT)
+    document = updated(DOCUMENT, 'rul_prediction/statistics/trend', 'decreasing')
+    document = updated(document, 'battery/charge_cycles', 11)
+    document = updated(document, 'upload_timestamp', '2024-03-01T10:00:10')
+    assert written(delta, document) == {'rul_prediction/statistics/trend': 'decreasing',
+                                        'battery/charge_cycles': 11,
+                                        'upload_timestamp': '2024-03-01T10:00:10'}
+    assert delta.snapshot == document
+
+def test_added_and_removed_keys():
+    delta = SnapshotDelta()
+    written(delta, DOCUMENT)
+    document = updated(DOCUMENT, 'motor', {'rpm': 900.0})
+    del document['rul_prediction']['statistics']
+    document['battery'] = {k: v for k, v in document['battery'].items() if k != 'voltage'}
+    document['empty'] = None
+    assert written(delta, document) == {'motor': {'rpm': 900.0},
+                                        'rul_prediction/statistics': None,
+                                        'battery/voltage': None}
+    assert delta.snapshot == {k: v for k, v in document.items() if k != 'empty'}
+
+def test_dict_replaced_by_scalar_and_back():
+    delta = SnapshotDelta()
+    written(delta, DOCUMENT)
+    assert written(delta, updated(DOCUMENT, 'battery', 'offline')) == {'battery': 'offline'}
+    assert written(delta, DOCUMENT) == {'battery': DOCUMENT['battery']}
+
+def test_tolerance_bounds_the_drift():
+    delta = SnapshotDelta({'battery/voltage': 0.5})
+    written(delta, DOCUMENT)
+    # Each step is within tolerance of the last value, but the stored value
+    # is rewritten once the drift from it exceeds the tolerance
+    writes = [written(delta, updated(DOCUMENT, 'battery/voltage', 320.0 + 0.2 * i)) for i in range(1, 6)]
+    assert writes == [{}, {}, {'battery/voltage': 320.6}, {}, {}]
+    # Leaves without a tolerance use the default (exact)
+    assert written(delta, updated(DOCUMENT, 'battery/soc', 50.01)) != {}
+
+def test_booleans_are_not_numbers():
+    delta = SnapshotDelta(default_tolerance=5.0)
+    written(delta, DOCUMENT)
+    document = updated(DOCUMENT, 'rul_prediction/statistics/reused', True)
+    assert delta.diff(document) == {'rul_prediction/statistics/reused': True}
+
+def test_nan_changes_are_written():
+    delta = SnapshotDelta(default_tolerance=1.0)
+    written(delta, DOCUMENT)
+    to_nan = written(delta, updated(DOCUMENT, 'battery/soc', math.nan))
+    assert list(to_nan) == ['battery/soc'] and math.isnan(to_nan['battery/soc'])
+    assert delta.diff(updated(DOCUMENT, 'battery/soc', math.nan)) == {}
+    assert written(delta, DOCUMENT) == {'battery/soc': 50.0}
+
+def test_uncommitted_diff_is_retried():
+    delta = SnapshotDelta()
+    written(delta, DOCUMENT)
+    document = updated(DOCUMENT, 'battery/soc', 49.0)
+    assert delta.diff(document) == {'battery/soc': 49.0}
+    # The write failed and was not committed: the same change is sent again
+    assert delta.diff(document) == {'battery/soc': 49.0}
+    delta.reset()
+    assert delta.diff(document) == {'': document}
@@ -0,0 +1,76 @@
+import os
+
+from spool import WriteAheadSpool, HEADER
+
+def segment_path(spool):
+    return spool._segment_path(spool.active_id)
+
+def test_round_trip_and_ack(tmp_path):
+    spool = WriteAheadSpool(str(tmp_path))
+    positions = [spool.append({'i': i}) for i in range(5)]
+    assert [record for _, record in spool.read()] == [{'i': i} for i in range(5)]
+    spool.ack(positions[2])
+    assert [record['i'] for _, record in spool.read()] == [3, 4]
+    spool.close()
+
+    reopened = WriteAheadSpool(str(tmp_path))
+    assert [record['i'] for _, record in reopened.read()] == [3, 4]
+    reopened.close()
+
+def test_segments_roll_and_are_deleted_once_acked(tmp_path):
+    spool = WriteAheadSpool(str(tmp_path), segment_bytes=64)
+    positions = [spool.append({'i': i, 'pad': 'x' * 40}) for i in range(6)]
+    assert len(spool._segment_ids()) > 1
+    assert [record['i'] for _, record in spool.read()] == list(range(6))
+    spool.ack(positions[-1])
+    assert spool._segment_ids() == [spool.active_id]
+    assert not spool.backlog()
+    spool.close()
+
+def test_torn_tail_is_truncated_on_open(tmp_path):
+    spool = WriteAheadSpool(str(tmp_path))
+    for i in range(3):
+        spool.append({'i': i})
+    spool.close()
+    path = segment_path(spool)
+    with open(path, 'ab') as f:
+        f.write(HEADER.pack(100, 0) + b'{"i": 3')
+
+    reopened = WriteAheadSpool(str(tmp_path))
+    assert [record['i'] for _, record in reopened.read()] == [0, 1, 2]
+    reopened.append({'i': 4})
+    assert [record['i'] for _, record in reopened.read()] == [0, 1, 2, 4]
+    reopened.close()
+
+def test_corrupt_record_mid_segment_is_skipped(tmp_path, capsys):
+    spool = WriteAheadSpool(str(tmp_path))
+    positions = [spool.append({'i': i}) for i in range(5)]
+    spool.sync()
+    # Flip a byte inside the payload of record 2
+    offset = positions[1][1] + HEADER.size + 3
+    with open(segment_path(spool), 'r+b') as f:
+        f.seek(offset)
+        byte = f.read(1)
+        f.seek(offset)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    assert [record['i'] for _, record in spool.read()] == [0, 1, 3, 4]
+    assert spool.corrupt_records == 1
+    assert 'corrupt' in capsys.readouterr().out
+    # Reading again does not count the same region twice
+    spool.read()
+    assert spool.corrupt_records == 1
+    spool.close()
+
+def test_corrupt_record_is_not_mistaken_for_a_torn_tail(tmp_path):
+    spool = WriteAheadSpool(str(tmp_path))
+    positions = [spool.append({'i': i}) for i in range(4)]
+    spool.close()
+    with open(segment_path(spool), 'r+b') as f:
+        f.seek(positions[0][1])
+        f.write(HEADER.pack(10 ** 6, 0))
+
+    reopened = WriteAheadSpool(str(tmp_path))
+    assert os.path.getsize(segment_path(reopened)) == positions[-1][1]
+    assert [record['i'] for _, record in reopened.read()] == [0, 2, 3]
+    reopened.close()
@@ -0,0 +1,94 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from features import TIMESTAMP_FORMAT, sample_epoch
+from sqlite_store import SqliteSink
+
+@pytest.fixture(autouse=True)
+def local_zone(monkeypatch):
+    # A half-hour offset, so hourly buckets only line up in local time
+    monkeypatch.setenv('TZ', 'Asia/Kolkata')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+@pytest.fixture
+def sink(tmp_path):
+    sink = SqliteSink(str(tmp_path / 'telemetry.db'), flush_records=10 ** 9, flush_interval_ms=10 ** 9)
+    yield sink
+    sink.stop()
+
+def entry(vehicle_id, when, i, soc=50.0):
+    return {'vehicle_id': vehicle_id, 'timestamp': when.strftime(TIMESTAMP_FORMAT),
+            'upload_timestamp': '2030-01-01T00:00:00', 'row_number': i,
+            'battery': {'soc': soc, 'soh': 90.0, 'temperature': 25.0},
+            'rul_prediction': {'value': 100.0 - i, 'health_status': 'good'}}
+
+def fill(sink, n=300):
+    times = pd.date_range('2024-03-01 22:07', periods=n, freq='1min')
+    socs = np.random.default_rng(2).uniform(20, 90, n)
+    for i, (when, soc) in enumerate(zip(times, socs)):
+        sink.add(entry('ev-1', when, i, float(soc)))
+        sink.add(entry('ev-2', when, i))
+    sink.flush()
+    return pd.DataFrame({'soc': socs}, index=times)
+
+def test_rows_use_the_sample_time(sink):
+    sink.add(entry('ev-1', pd.Timestamp('2024-03-01 10:00'), 0))
+    sink.add({'vehicle_id': 'ev-1', 'timestamp': '', 'upload_timestamp': '2024-03-01T11:00:00'})
+    sink.flush()
+    rows = sink._fetch("SELECT ts FROM telemetry ORDER BY rowid", ())
+    assert [ts for ts, in rows] == [sample_epoch('01-03-2024 10:00'), sample_epoch('01-03-2024 11:00')]
+
+def test_latest_and_query_range(sink):
+    fill(sink)
+    assert sink.latest('ev-1')['row_number'] == 299
+    assert sink.latest()['row_number'] == 299
+    assert sink.latest('ev-3') is None
+    start, end = sample_epoch('01-03-2024 23:00'), sample_epoch('01-03-2024 23:10')
+    assert [r['row_number'] for r in sink.query_range('ev-1', start, end)] == list(range(53, 63))
+    assert [r['row_number'] for r in sink.query_range('ev-1', start, end, limit=3)] == [60, 61, 62]
+    assert sorted(sink.vehicles()) == ['ev-1', 'ev-2']
+
+def test_downsample_matches_pandas_resample(sink):
+    frame = fill(sink)
+    start, end = sample_epoch('01-03-2024 00:00'), sample_epoch('03-03-2024 00:00')
+    buckets = sink.downsample('ev-1', start, end, 3600)
+    expected = frame['soc'].resample('1h').agg(['count', 'min', 'max', 'mean'])
+    assert len(buckets) == len(expected)
+    for bucket, (hour, row) in zip(buckets, expected.iterrows()):
+        assert bucket['start'] == sample_epoch(hour.strftime(TIMESTAMP_FORMAT))
+        assert bucket['count'] == row['count']
+        assert bucket['soc'] == pytest.approx({'min': row['min'], 'max': row['max'], 'mean': row['mean']})
+
+def test_alerts_are_upserted_by_key(sink):
+    when = pd.Timestamp('2024-03-01 10:00')
+    sink.add(entry('ev-1', when, 0), {'vehicle_id': 'ev-1', 'status': 'open'}, 'alert-1')
+    key = sink.add(entry('ev-1', when, 1), {'vehicle_id': 'ev-1', 'status': 'closed'}, 'alert-1')
+    sink.add(entry('ev-2', when, 2), {'vehicle_id': 'ev-2', 'status': 'open'}, 'alert-2')
+    sink.flush()
+    alerts = sink.recent_alerts(5)
+    assert set(alerts) == {'alert-1', 'alert-2'}
+    assert alerts['alert-1']['status'] == 'closed'
+    assert alerts['alert-1']['data_key'] == key
+
+def test_oldest_and_delete_rows(sink):
+    fill(sink, 10)
+    before = sample_epoch('01-03-2024 22:12')
+    rows = sink.oldest('ev-1', before, 3)
+    assert [record['row_number'] for _, _, record in rows] == [0, 1, 2]
+    sink.delete_rows([rowid for rowid, _, _ in rows])
+    assert [record['row_number'] for _, _, record in sink.oldest('ev-1', before, 10)] == [3, 4]
+    assert len(sink.oldest('ev-2', before, 10)) == 5
+
+def test_latest_day_follows_the_newest_sample(sink):
+    assert sink.latest_day('ev-1') is None
+    fill(sink)
+    start, end = sink.latest_day('ev-1')
+    assert start == sample_epoch('02-03-2024 00:00')
+    assert end == sample_epoch('02-03-2024 03:06') + 1
+    assert sum(bucket['count'] for bucket in sink.downsample('ev-1', start, end, 900)) == 187
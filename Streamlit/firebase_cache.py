@@ -0,0 +1,228 @@
+"""
+Process-wide in-memory copy of the dashboard's Firebase data.
+
+LiveCache subscribes once to the latest node with
+db.reference(...).listen() and keeps in memory:
+
+  - the latest document, patched in place from the stream's put/patch
+    events (the subscriber updates it leaf by leaf);
+  - per vehicle, a ring buffer of the last history_points points. The
+    shared latest node only shows whichever vehicle wrote last, so each
+    vehicle's ring is seeded from a bounded query of its history shards
+    (history_path/<vehicle>/<day>, newest keys first) and re-read at most
+    every history_ttl_s; latest documents seen in between extend it;
+  - the newest max_alerts alert records, by key, polled every
+    alert_poll_s with order_by_key().limit_to_last(max_alerts). Admin SDK
+    queries cannot be listened to, and a listener on the whole alerts
+    node would download every alert ever written.
+
+The dashboard creates one LiveCache per server process with
+st.cache_resource and every browser session reads from it, so Firebase
+load stays the same however many sessions are open. Readers get copies.
+
+Rollups are stored by sample day, which for recorded data is not today:
+chart_day() picks the day of the latest document's sample, and
+rollup_points() turns one day of buckets into chart rows.
+"""
+
+import copy
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# Needs the subscriber's modules (Firebase/) on sys.path
+from features import sample_day
+
+ROLLUP_PATH = 'ev_battery_rollups'
+
+# Characters Firebase does not allow in a key (as the subscriber replaces them)
+_KEY_TRANSLATION = str.maketrans({c: '_' for c in '.$#[]/'})
+
+def vehicle_key(vehicle_id):
+    """Vehicle id as the subscriber stores it in database paths"""
+    return str(vehicle_id).translate(_KEY_TRANSLATION) or '_'
+
+def rollup_path(vehicle_id, resolution, day):
+    """Database path of a vehicle's rollup buckets of one day"""
+    return f"{ROLLUP_PATH}/{vehicle_key(vehicle_id)}/{resolution}/{day}"
+
+def chart_day(document):
+    """'YYYY-MM-DD' the subscriber filed a document's rollups and history under
+
+    That is its sample day, or its upload day if it has no valid timestamp
+    (as the subscriber does), or today without a document.
+    """
+    document = document if isinstance(document, dict) else {}
+    return (sample_day(document.get('timestamp'))
+            or str(document.get('upload_timestamp') or '')[:10]
+            or datetime.now().strftime('%Y-%m-%d'))
+
+def rollup_points(rollups):
+    """Chart rows (bucket start and mean values), oldest first, from one day of rollups"""
+    rows = []
+    for _, bucket in sorted((rollups or {}).items()):
+        if not isinstance(bucket, dict):
+            continue
+        rows.append({
+            'upload_timestamp': bucket.get('start'),
+            'soc': (bucket.get('soc') or {}).get('mean'),
+            'soh': (bucket.get('soh') or {}).get('mean'),
+            'temperature': (bucket.get('temperature') or {}).get('mean'),
+            'rul': (bucket.get('rul') or {}).get('mean')
+        })
+    return rows
+
+def apply_event(document, event_type, path, data):
+    """document after a listener event (put or patch at path); may return a new root"""
+    parts = [part for part in path.split('/') if part]
+    if event_type == 'patch':
+        for key, value in (data or {}).items():
+            document = _set(document, parts + [part for part in key.split('/') if part], value)
+        return document
+    return _set(document, parts, data)
+
+def _set(document, parts, value):
+    if not parts:
+        return value
+    if not isinstance(document, dict):
+        document = {}
+    node = document
+    for part in parts[:-1]:
+        child = node.get(part)
+        if not isinstance(child, dict):
+            child = node[part] = {}
+        node = child
+    if value is None:
+        node.pop(parts[-1], None)
+    else:
+        node[parts[-1]] = value
+    return document
+
+def history_point(document):
+    """The values the trend charts plot, from one latest document"""
+    battery = document.get('battery') or {}
+    rul_prediction = document.get('rul_prediction') or {}
+    return {
+        'upload_timestamp': document.get('upload_timestamp'),
+        'soc': battery.get('soc'),
+        'soh': battery.get('soh'),
+        'temperature': battery.get('temperature'),
+        'rul': rul_prediction.get('value')
+    }
+
+class LiveCache:
+    """Latest document, recent history and recent alerts, kept current by listeners"""
+
+    def __init__(self, latest_ref, alerts_ref, history_ref=None, history_points=500,
+                 max_alerts=50, alert_poll_s=5.0, history_ttl_s=60.0):
+        self.latest_ref = latest_ref
+        self.alerts_ref = alerts_ref
+        self.history_ref = history_ref
+        self.history_points = history_points
+        self.max_alerts = max_alerts
+        self.alert_poll_s = alert_poll_s
+        self.history_ttl_s = history_ttl_s
+        self.lock = threading.Lock()
+        self.document = None
+        self.histories = {}
+        # vehicle id -> time.monotonic() of its last history query
+        self.history_fetched = {}
+        self.alerts = {}
+        self.last_timestamp = None
+        self.ready = threading.Event()
+        self.stopped = threading.Event()
+        self.registrations = []
+        self.alert_thread = None
+
+    def start(self, timeout=10.0):
+        """Open the listener and the alert poller; waits up to timeout for the latest document"""
+        self.registrations.append(self.latest_ref.listen(self._on_latest))
+        self.poll_alerts()
+        self.alert_thread = threading.Thread(target=self._run_alerts, name="alert-poller", daemon=True)
+        self.alert_thread.start()
+        self.ready.wait(timeout)
+        return self
+
+    def close(self):
+        self.stopped.set()
+        for registration in self.registrations:
+            registration.close()
+        self.registrations = []
+
+    def latest(self):
+        with self.lock:
+            return copy.deepcopy(self.document)
+
+    def history(self, vehicle_id, limit=None):
+        """Oldest-first history points of a vehicle (the last `limit`, if given)"""
+        self._refresh_history(vehicle_id)
+        with self.lock:
+            points = list(self.histories.get(vehicle_id, ()))
+        return points[-limit:] if limit else points
+
+    def recent_alerts(self, limit=5):
+        """{key: alert} of the newest alerts, oldest first"""
+        with self.lock:
+            keys = sorted(self.alerts)[-limit:]
+            return {key: copy.deepcopy(self.alerts[key]) for key in keys}
+
+    def _on_latest(self, event):
+        with self.lock:
+            self.document = apply_event(self.document, event.event_type, event.path, event.data)
+            document = self.document
+            if isinstance(document, dict) and document.get('upload_timestamp') != self.last_timestamp:
+                self.last_timestamp = document.get('upload_timestamp')
+                vehicle_id = document.get('vehicle_id', 'default')
+                history = self.histories.get(vehicle_id)
+                if history is None:
+                    history = self.histories[vehicle_id] = deque(maxlen=self.history_points)
+                history.append(history_point(document))
+        self.ready.set()
+
+    def poll_alerts(self):
+        """Re-read the newest max_alerts alerts (push keys sort by creation time)"""
+        alerts = self.alerts_ref.order_by_key().limit_to_last(self.max_alerts).get()
+        alerts = {key: alert for key, alert in (alerts or {}).items() if isinstance(alert, dict)}
+        with self.lock:
+            self.alerts = alerts
+
+    def _run_alerts(self):
+        while not self.stopped.wait(self.alert_poll_s):
+            try:
+                self.poll_alerts()
+            except Exception as e:
+                print(f"✗ Alert poll error: {e}")
+
+    def _refresh_history(self, vehicle_id):
+        """Re-seed a vehicle's ring from its history shards if the last query is old"""
+        if self.history_ref is None:
+            return
+        now = time.monotonic()
+        with self.lock:
+            fetched = self.history_fetched.get(vehicle_id)
+            if fetched is not None and now - fetched < self.history_ttl_s:
+                return
+            self.history_fetched[vehicle_id] = now
+        points = [history_point(record) for record in self._query_history(vehicle_id)]
+        with self.lock:
+            history = deque(points, maxlen=self.history_points)
+            # Keep the points the listener added after the newest stored one
+            newest = points[-1]['upload_timestamp'] if points else None
+            for point in self.histories.get(vehicle_id, ()):
+                if newest is None or str(point.get('upload_timestamp')) > str(newest):
+                    history.append(point)
+            self.histories[vehicle_id] = history
+
+    def _query_history(self, vehicle_id):
+        """A vehicle's newest history_points records, oldest first"""
+        vehicle_ref = self.history_ref.child(vehicle_key(vehicle_id))
+        days = vehicle_ref.get(shallow=True)
+        records = []
+        for day in sorted(days if isinstance(days, dict) else {}, reverse=True):
+            remaining = self.history_points - len(records)
+            if remaining <= 0:
+                break
+            rows = vehicle_ref.child(day).order_by_key().limit_to_last(remaining).get() or {}
+            records[:0] = [rows[key] for key in sorted(rows) if isinstance(rows[key], dict)]
+        return records
@@ -6,8 +6,30 @@ import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime
 import numpy as np
+import os
+import sys
 import time
 
+FIREBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Firebase')
+sys.path.insert(0, FIREBASE_DIR)
+from firebase_cache import LiveCache, chart_day, rollup_path, rollup_points
+
+# Where to read telemetry from: "firebase", or "sqlite" for the local
+# database the subscriber writes with RECORD_SINK = "sqlite"
+DATA_SOURCE = os.environ.get('EV_DATA_SOURCE', 'firebase')
+SQLITE_PATH = os.environ.get('EV_SQLITE_PATH', os.path.join(FIREBASE_DIR, 'ev_battery.sqlite'))
+RESOLUTION_SECONDS = {'1m': 60, '15m': 15 * 60, '1h': 60 * 60}
+
+# Firebase is read by one listener per server process (LiveCache), shared
+# by all sessions; rollups are re-read at most every ROLLUP_CACHE_TTL_S.
+# The newest ALERT_LIMIT alerts are polled every ALERT_POLL_S, and a
+# vehicle's recent history is re-queried at most every HISTORY_TTL_S
+HISTORY_POINTS = 500
+ALERT_LIMIT = 50
+ALERT_POLL_S = 5
+HISTORY_TTL_S = 60
+ROLLUP_CACHE_TTL_S = 60
+
 # Page configuration
 st.set_page_config(
     page_title="EV Battery Digital Twin",
@@ -408,24 +430,68 @@ def create_3d_bike(color, speed):
     
     return fig
 
+@st.cache_resource
+def open_sqlite_store():
+    """Open the subscriber's local SQLite database (read side)"""
+    from sqlite_store import SqliteStore
+    return SqliteStore(SQLITE_PATH)
+
+@st.cache_resource
+def get_live_cache():
+    """Firebase listener and alert poller shared by every session of this server process"""
+    return LiveCache(db.reference('ev_battery_data/latest'), db.reference('alerts'),
+                     db.reference('ev_battery_history'), HISTORY_POINTS, ALERT_LIMIT,
+                     ALERT_POLL_S, HISTORY_TTL_S).start()
+
 def fetch_latest_data():
-    """Fetch latest data from Firebase"""
+    """Fetch latest data from the shared Firebase cache (or the local SQLite database)"""
     try:
-        ref = db.reference('ev_battery_data/latest')
-        data = ref.get()
-        return data
+        if DATA_SOURCE == 'sqlite':
+            return open_sqlite_store().latest()
+        return get_live_cache().latest()
     except Exception as e:
         st.error(f"Error fetching data: {e}")
         return None
 
-def fetch_historical_data(limit=100):
-    """Fetch historical data from Firebase"""
+@st.cache_data(ttl=ROLLUP_CACHE_TTL_S)
+def fetch_rollups(vehicle_id, resolution, day):
+    """A vehicle's closed rollup buckets of one day, shared by all sessions"""
+    return db.reference(rollup_path(vehicle_id, resolution, day)).get()
+
+def fetch_historical_data(vehicle_id='default', resolution='15m', limit=100, day=None):
+    """Fetch one day's history for a vehicle from the subscriber's rollups
+    
+    day is a 'YYYY-MM-DD' sample day (chart_day of the latest document;
+    default: today). Returns one row per closed rollup bucket (mean of each
+    value); until the first bucket closes, falls back to the last `limit`
+    points of the shared cache. From SQLite, the buckets are computed by a
+    downsample query over the day of the vehicle's newest stored sample.
+    """
+    day = day or chart_day(None)
     try:
-        ref = db.reference('ev_battery_data')
-        data = ref.order_by_key().limit_to_last(limit).get()
-        if data:
-            df = pd.DataFrame.from_dict(data, orient='index')
-            return df
+        if DATA_SOURCE == 'sqlite':
+            store = open_sqlite_store()
+            day_range = store.latest_day(vehicle_id)
+            if day_range is None:
+                return None
+            buckets = store.downsample(vehicle_id, *day_range, RESOLUTION_SECONDS[resolution])
+            if not buckets:
+                return None
+            return pd.DataFrame([{
+                'upload_timestamp': datetime.fromtimestamp(bucket['start']).isoformat(),
+                'soc': bucket.get('soc', {}).get('mean'),
+                'soh': bucket.get('soh', {}).get('mean'),
+                'temperature': bucket.get('temperature', {}).get('mean'),
+                'rul': bucket.get('rul', {}).get('mean')
+            } for bucket in buckets])
+        
+        rows = rollup_points(fetch_rollups(vehicle_id, resolution, day))
+        if rows:
+            return pd.DataFrame(rows)
+        
+        points = get_live_cache().history(vehicle_id, limit)
+        if points:
+            return pd.DataFrame(points)
         return None
     except Exception as e:
         st.error(f"Error fetching historical data: {e}")
@@ -475,7 +541,7 @@ def main():
     st.markdown('<h1 class="main-header">🔋 EV Battery Digital Twin Dashboard</h1>', unsafe_allow_html=True)
     
     # Initialize Firebase
-    if not init_firebase():
+    if DATA_SOURCE != 'sqlite' and not init_firebase():
         st.stop()
     
     # Sidebar
@@ -490,6 +556,7 @@ def main():
         show_gauges = st.checkbox("Gauge Meters", value=True)
         show_charts = st.checkbox("Time Series Charts", value=True)
         show_alerts = st.checkbox("Alert System", value=True)
+        history_resolution = st.selectbox("History Resolution", ['1m', '15m', '1h'], index=1)
         
         st.divider()
         if st.button("🔄 Manual Refresh"):
@@ -627,15 +694,10 @@ def main():
     # Time series charts
     if show_charts:
         st.subheader("📈 Historical Trends")
-        hist_data = fetch_historical_data(limit=50)
+        hist_data = fetch_historical_data(latest_data.get('vehicle_id', 'default'),
+                                          history_resolution, limit=50, day=chart_day(latest_data))
         
         if hist_data is not None and not hist_data.empty:
-            # Parse nested data
-            hist_data['soc'] = hist_data['battery'].apply(lambda x: x.get('soc', 0) if isinstance(x, dict) else 0)
-            hist_data['soh'] = hist_data['battery'].apply(lambda x: x.get('soh', 0) if isinstance(x, dict) else 0)
-            hist_data['rul'] = hist_data['rul_prediction'].apply(lambda x: x.get('value', None) if isinstance(x, dict) else None)
-            hist_data['temperature'] = hist_data['battery'].apply(lambda x: x.get('temperature', 0) if isinstance(x, dict) else 0)
-            
             chart_col1, chart_col2 = st.columns(2)
             
             with chart_col1:
@@ -655,13 +717,18 @@ def main():
         st.subheader("🚨 System Alerts")
         
         try:
-            alerts_ref = db.reference('alerts')
-            alerts = alerts_ref.order_by_key().limit_to_last(5).get()
+            if DATA_SOURCE == 'sqlite':
+                alerts = open_sqlite_store().recent_alerts(5)
+            else:
+                alerts = get_live_cache().recent_alerts(5)
             
             if alerts:
                 for alert_id, alert in reversed(list(alerts.items())):
                     severity = alert.get('severity', 'info')
-                    if severity == 'critical':
+                    # One record per vehicle alert, updated in place until it closes
+                    if alert.get('status') == 'closed':
+                        st.success(f"✅ **RESOLVED:** {alert.get('message', 'N/A')} - {alert.get('timestamp', 'N/A')}")
+                    elif severity == 'critical':
                         st.error(f"🔴 **CRITICAL:** {alert.get('message', 'N/A')} - {alert.get('timestamp', 'N/A')}")
                     else:
                         st.warning(f"⚠️ **WARNING:** {alert.get('message', 'N/A')} - {alert.get('timestamp', 'N/A')}")